@@ -1,11 +1,44 @@
 from flask import Flask, render_template, request, Response, jsonify
 from functools import wraps
+from collections import OrderedDict, deque
 import base64
+import os
+import sys
+import threading
+import time
+
+# Shared lab tooling (labkit/) lives one directory up
+LAB_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if LAB_ROOT not in sys.path:
+    sys.path.insert(0, LAB_ROOT)
+
+from labkit import compress, metrics, profiler, requestlog, scoreboard, startup, watch
+from labkit.prebuilt import static_json
+
+startup.mark('admin-app', 'imports')
 
 app = Flask(__name__)
 
 app.config['SECRET_KEY'] = 'admin-portal-secret-key-2024'
 
+metrics.init_app(app, 'admin-app')
+requestlog.init_app(app, 'admin-app')
+startup.init_app(app)
+compress.init_app(app)
+scoreboard.init_app(app, 'admin-app')
+watch.init_app(app, 'admin-app')
+profiler.init_app(app, 'admin-app')
+
+# Brute-force throttling - failed logins allowed per client IP and route
+# endpoint -> (max failures, window in seconds); 'default' applies to the rest
+# Failures are counted per worker process and the kernel spreads connections
+# over the workers, so a client gets up to LAB_WORKERS x this budget
+app.config['AUTH_RATE_LIMITS'] = {
+    'default': (100, 10.0),
+}
+app.config['AUTH_RATE_LIMIT_MAX_CLIENTS'] = 10000
+app.config['AUTH_CACHE_SIZE'] = 1024
+
 # FLAG 7 - Admin Portal
 FLAG = 'FLAG{admin_portal_found_3h4c}'
 
@@ -25,29 +58,133 @@ def check_auth(username, password):
     """
     return username in ADMIN_USERS and ADMIN_USERS[username] == password
 
+# Rejections are built from pre-encoded bodies so brute forcing stays cheap
+AUTH_REQUIRED_BODY = (
+    'Authentication Required\n\n'
+    'This is a restricted admin portal. Valid credentials are required.\n\n'
+    'Hint: Try common admin usernames and weak passwords.\n'
+    'Examples: admin, administrator, techcorp, root\n'
+).encode('utf-8')
+AUTH_REQUIRED_HEADERS = {'WWW-Authenticate': 'Basic realm="TechCorp Admin Portal - Restricted Access"'}
+
+TOO_MANY_ATTEMPTS_BODY = (
+    'Too Many Requests\n\n'
+    'Slow down - too many failed login attempts from your address.\n'
+).encode('utf-8')
+
 def authenticate():
     """
     Sends a 401 response that enables basic auth
     """
-    return Response(
-        'Authentication Required\n\n'
-        'This is a restricted admin portal. Valid credentials are required.\n\n'
-        'Hint: Try common admin usernames and weak passwords.\n'
-        'Examples: admin, administrator, techcorp, root\n',
-        401,
-        {'WWW-Authenticate': 'Basic realm="TechCorp Admin Portal - Restricted Access"'}
-    )
+    return Response(AUTH_REQUIRED_BODY, 401, AUTH_REQUIRED_HEADERS)
+
+def too_many_attempts(retry_after):
+    """
+    Sends a 429 response when a client exceeds its failed login budget
+    """
+    return Response(TOO_MANY_ATTEMPTS_BODY, 429, {'Retry-After': str(retry_after)},
+                    mimetype='text/plain')
+
+class SlidingWindowLimiter:
+    """
+    Sliding-window log of failures per (route, client)
+    Each key keeps at most `limit` timestamps; the oldest tracked keys are
+    forgotten past `max_clients` so memory stays bounded under spoofed IPs
+    """
+
+    def __init__(self, limits, max_clients):
+        self.limits = limits
+        self.max_clients = max_clients
+        self._hits = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _limit(self, route):
+        return self.limits.get(route) or self.limits['default']
+
+    def retry_after(self, route, client):
+        """Seconds until `client` may try again on `route`, 0 if not limited"""
+        limit, window = self._limit(route)
+        hits = self._hits.get((route, client))
+        if hits is None or len(hits) < limit:
+            return 0
+        remaining = hits[0] + window - time.monotonic()
+        return int(remaining) + 1 if remaining > 0 else 0
+
+    def hit(self, route, client):
+        limit, _ = self._limit(route)
+        key = (route, client)
+        with self._lock:
+            hits = self._hits.get(key)
+            if hits is None:
+                hits = self._hits[key] = deque(maxlen=limit)
+                if len(self._hits) > self.max_clients:
+                    self._hits.popitem(last=False)
+            else:
+                self._hits.move_to_end(key)
+            hits.append(time.monotonic())
+
+class AuthCache:
+    """Bounded LRU of Authorization header values already verified"""
+
+    def __init__(self, size):
+        self.size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, header):
+        return header in self._entries
+
+    def add(self, header):
+        with self._lock:
+            self._entries[header] = True
+            self._entries.move_to_end(header)
+            if len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+auth_limiter = SlidingWindowLimiter(app.config['AUTH_RATE_LIMITS'],
+                                    app.config['AUTH_RATE_LIMIT_MAX_CLIENTS'])
+auth_cache = AuthCache(app.config['AUTH_CACHE_SIZE'])
+
+def client_ip():
+    """
+    Client address, honouring X-Real-IP set by nginx
+    Same rule as the request log and scoreboard: the header is only trusted
+    behind the proxy (LAB_TRUST_PROXY=1), otherwise anyone on the lab host
+    could pick a fresh address per attempt
+    """
+    return requestlog.client_ip(request.environ)
 
 def requires_auth(f):
     """
     Decorator to require HTTP Basic Authentication
+    Verified Authorization headers skip the check. A client over its failed
+    login budget gets a cheap 429 before any credential check, so throttled
+    brute forcing costs next to nothing; within the budget passwords stay
+    crackable
     """
     @wraps(f)
     def decorated(*args, **kwargs):
+        header = request.headers.get('Authorization')
+        if header is not None and header in auth_cache:
+            return f(*args, **kwargs)
+
+        route = request.endpoint
+        client = client_ip()
+        retry_after = auth_limiter.retry_after(route, client)
+        if retry_after:
+            return too_many_attempts(retry_after)
+
         auth = request.authorization
-        if not auth or not check_auth(auth.username, auth.password):
-            return authenticate()
-        return f(*args, **kwargs)
+        if auth and check_auth(auth.username, auth.password):
+            auth_cache.add(header)
+            return f(*args, **kwargs)
+
+        auth_limiter.hit(route, client)
+        return authenticate()
     return decorated
 
 @app.route('/')
@@ -71,11 +208,12 @@ def dashboard():
 
 @app.route('/api/admin/status')
 @requires_auth
+@static_json(app, key=lambda: request.authorization.username)
 def admin_status():
     """
     Admin API endpoint - requires authentication
     """
-    return jsonify({
+    return {
         'flag': FLAG,
         'message': 'Congratulations! You found and accessed the admin portal!',
         'authenticated_as': request.authorization.username,
@@ -103,29 +241,31 @@ def admin_status():
             'Staging environment with phpinfo() exposed',
             'Admin portal with weak authentication'
         ]
-    })
+    }
 
 @app.route('/api/admin/users')
 @requires_auth
+@static_json(app)
 def admin_users():
     """
     List admin users (authenticated endpoint)
     """
-    return jsonify({
+    return {
         'users': [
             {'username': user, 'role': 'admin', 'active': True}
             for user in ADMIN_USERS.keys()
         ],
         'note': 'These users have weak passwords - major security issue!'
-    })
+    }
 
 @app.route('/api/admin/config')
 @requires_auth
+@static_json(app)
 def admin_config():
     """
     Admin configuration endpoint
     """
-    return jsonify({
+    return {
         'flag': FLAG,
         'admin_portal': {
             'version': '2.1.4',
@@ -148,7 +288,18 @@ def admin_config():
             'staging_environment': 'staging.techcorp.local:8082',
             'admin_portal': 'admin.techcorp.local:8083'
         }
-    })
+    }
+
+@app.route('/api/admin/scoreboard')
+@requires_auth
+def admin_scoreboard():
+    """
+    Which clients reached which flags, across every lab app (labkit/scoreboard.py)
+    """
+    board = scoreboard.get()
+    if board is None:
+        return jsonify({'error': 'Scoreboard disabled'}), 503
+    return jsonify(scoreboard.summary(board))
 
 # Add admin-specific headers
 @app.after_request
@@ -172,6 +323,8 @@ def unauthorized(e):
 def not_found(e):
     return render_template('404.html'), 404
 
+startup.mark('admin-app', 'app')
+
 if __name__ == '__main__':
     print("=" * 60)
     print("TechCorp Admin Portal")
@@ -192,4 +345,5 @@ if __name__ == '__main__':
     print("Access: http://admin.techcorp.local:8083")
     print("=" * 60)
 
+    startup.warm_up(app, 'admin-app')
     app.run(host='127.0.0.1', port=5003, debug=False)
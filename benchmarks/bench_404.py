@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+TechCorp CTF Lab - 404 Throughput Benchmark
+
+Replays random miss paths against an app through the Flask test client and
+reports misses/sec with its 404 cache disabled (before) and enabled (after).
+
+    main-app: pre-rendered 404.html (NOT_FOUND_CACHE)
+    dev-app:  pre-serialized route listing (ROUTE_LISTING_CACHE)
+
+Usage: python3 benchmarks/bench_404.py [main-app|dev-app] [requests]
+"""
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from labkit.apps import load_module  # noqa: E402
+
+
+def set_cache(name, module, enabled):
+    """Switch the app's 404 fast path on or off"""
+    if name == 'main-app':
+        module.app.config['NOT_FOUND_CACHE'] = enabled
+    elif name == 'dev-app':
+        module.ROUTE_LISTING_CACHE = enabled
+    else:
+        raise SystemExit("No 404 cache to compare for {}".format(name))
+
+
+def miss_paths(count, seed=1337):
+    rng = random.Random(seed)
+    alphabet = string.ascii_lowercase + string.digits
+    return ['/' + ''.join(rng.choices(alphabet, k=10)) for _ in range(count)]
+
+
+def run(client, paths):
+    start = time.perf_counter()
+    size = None
+    for path in paths:
+        response = client.get(path)
+        assert response.status_code == 404
+        size = len(response.data)
+    elapsed = time.perf_counter() - start
+    return len(paths) / elapsed, size
+
+
+def main():
+    name = sys.argv[1] if len(sys.argv) > 1 else 'main-app'
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    module = load_module(name)
+    client = module.app.test_client()
+    paths = miss_paths(count)
+
+    print("=" * 60)
+    print("{} 404 throughput ({} misses)".format(name, count))
+    print("=" * 60)
+
+    results = {}
+    for label, enabled in (('before (built per request)', False),
+                           ('after (cached)', True)):
+        set_cache(name, module, enabled)
+        run(client, paths[:200])  # warm-up
+        rate, size = run(client, paths)
+        results[enabled] = rate
+        print("  {:<30} {:>10.0f} req/s  ({} bytes)".format(label, rate, size))
+
+    print("-" * 60)
+    print("  speedup: {:.2f}x".format(results[True] / results[False]))
+
+
+if __name__ == '__main__':
+    main()
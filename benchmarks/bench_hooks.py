@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+TechCorp CTF Lab - Hook Overhead Benchmark
+
+Times staging-app's /phpinfo.php end to end through the WSGI call, with
+every labkit hook the servers run (metrics, request log, compression,
+scoreboard, template watcher) and with none of them, for both the page
+rendered per request (before) and the prebuilt bytes (after).
+
+Hooks write to a scratch directory, never to the lab's logs/ or scoreboard.
+The sampling profiler is opt-in (LAB_PROFILE) and stays off in both runs.
+Rounds are interleaved and the best round is reported, so a busy machine
+skews every configuration alike.
+
+Usage: python3 benchmarks/bench_hooks.py [requests] [rounds]
+"""
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask  # noqa: E402
+from werkzeug.test import EnvironBuilder  # noqa: E402
+
+from labkit import compress, metrics, requestlog, scoreboard, watch  # noqa: E402
+from labkit.apps import load_module  # noqa: E402
+
+PATH = '/phpinfo.php'
+ENCODINGS = (('identity', {}), ('gzip', {'Accept-Encoding': 'gzip, deflate'}))
+
+
+def load(scratch, hooks):
+    """Import a fresh staging-app with all labkit hooks on or off; returns its WSGI callable"""
+    compress.ENABLED = watch.ENABLED = hooks
+    os.environ[requestlog.LOG_DIR_ENV] = os.path.join(scratch, 'logs') if hooks else ''
+    scoreboard.use(os.path.join(scratch, 'scoreboard') if hooks else '')
+    if hooks:
+        os.environ[metrics.METRICS_DIR_ENV] = os.path.join(scratch, 'metrics')
+        os.makedirs(os.environ[metrics.METRICS_DIR_ENV], exist_ok=True)
+    module = load_module('staging-app', reload=True)
+    if hooks:
+        return module, module.app.wsgi_app
+    # Metrics has no off switch: call Flask's own wsgi_app underneath it
+    return module, Flask.wsgi_app.__get__(module.app)
+
+
+def set_prebuilt(module, enabled):
+    """Serve the prebuilt page, or render it per request as before"""
+    if enabled:
+        module.app.view_functions['phpinfo'] = module.phpinfo
+    else:
+        module.app.view_functions['phpinfo'] = module.render_phpinfo
+
+
+def start_response(status, headers, exc_info=None):
+    pass
+
+
+def request(wsgi_app, base):
+    environ = dict(base)
+    environ['wsgi.input'] = io.BytesIO()
+    app_iter = wsgi_app(environ, start_response)
+    size = sum(len(chunk) for chunk in app_iter)
+    if hasattr(app_iter, 'close'):
+        app_iter.close()
+    return size
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+
+    scratch = tempfile.mkdtemp(prefix='lab-bench-hooks-')
+    try:
+        bare_module, bare = load(scratch, False)
+        hooked_module, hooked = load(scratch, True)
+
+        configs = []
+        for encoding, headers in ENCODINGS:
+            base = EnvironBuilder(path=PATH, headers=headers,
+                                  environ_base={'REMOTE_ADDR': '10.0.0.2'}).get_environ()
+            for prebuilt in (False, True):
+                for module, wsgi_app in ((bare_module, bare), (hooked_module, hooked)):
+                    configs.append(((encoding, prebuilt, wsgi_app is hooked), module, wsgi_app, base))
+
+        best = {}
+        sizes = {}
+        for _ in range(rounds):
+            for key, module, wsgi_app, base in configs:
+                set_prebuilt(module, key[1])
+                request(wsgi_app, base)  # warm-up
+                start = time.perf_counter()
+                for _ in range(count):
+                    size = request(wsgi_app, base)
+                elapsed = (time.perf_counter() - start) / count * 1e6
+                best[key] = min(best.get(key, elapsed), elapsed)
+                sizes[key] = size
+
+        print("=" * 68)
+        print("staging-app {} ({} requests x {} rounds, best round)".format(PATH, count, rounds))
+        print("=" * 68)
+        print("  {:<30} {:>10} {:>10} {:>12}".format('', 'bare', 'all hooks', 'hook cost'))
+        for encoding, _ in ENCODINGS:
+            for prebuilt, label in ((False, 'built per request'), (True, 'prebuilt')):
+                bare_us = best[(encoding, prebuilt, False)]
+                hooked_us = best[(encoding, prebuilt, True)]
+                print("  {:<30} {:>8.1f}us {:>8.1f}us {:>+10.1f}us  ({} bytes)".format(
+                    '{}, {}'.format(label, encoding), bare_us, hooked_us,
+                    hooked_us - bare_us, sizes[(encoding, prebuilt, True)]))
+    finally:
+        requestlog.close()
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,70 @@
-from flask import Flask, render_template, jsonify
+from flask import Flask, Config, Response, render_template, jsonify
+from werkzeug.routing import Map
 import sys
 import os
 
-app = Flask(__name__)
+# Shared lab tooling (labkit/) lives one directory up
+LAB_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if LAB_ROOT not in sys.path:
+    sys.path.insert(0, LAB_ROOT)
+
+from labkit import compress, metrics, profiler, requestlog, scoreboard, startup, watch
+from labkit.prebuilt import static_json
+
+startup.mark('dev-app', 'imports')
+
+# Route listing cache
+# The 404 page lists every route. Fuzzers hit it thousands of times per
+# second, so its JSON body is serialized once and only rebuilt when a route
+# is added or a config value is assigned. /debug is built per request: it
+# also reports environment variables and mutable config values, which no
+# version counter sees change.
+class TrackedMap(Map):
+    """URL map that counts rule additions"""
+    version = 0
+
+    def add(self, rulefactory):
+        super().add(rulefactory)
+        self.version += 1
+
+class TrackedConfig(Config):
+    """Config that counts writes"""
+    version = 0
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.version += 1
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self.version += 1
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self.version += 1
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self.version += 1
+        return super().setdefault(key, default)
+
+    def pop(self, *args):
+        self.version += 1
+        return super().pop(*args)
+
+    def popitem(self):
+        self.version += 1
+        return super().popitem()
+
+    def clear(self):
+        super().clear()
+        self.version += 1
+
+class DevFlask(Flask):
+    url_map_class = TrackedMap
+    config_class = TrackedConfig
+
+app = DevFlask(__name__)
 
 # Development configuration - INTENTIONALLY INSECURE
 app.config['DEBUG'] = True
@@ -10,9 +72,51 @@ app.config['SECRET_KEY'] = 'super-secret-dev-key-123'
 app.config['ENV'] = 'development'
 app.config['TESTING'] = False
 
+metrics.init_app(app, 'dev-app')
+requestlog.init_app(app, 'dev-app')
+startup.init_app(app)
+compress.init_app(app)
+scoreboard.init_app(app, 'dev-app')
+watch.init_app(app, 'dev-app')
+profiler.init_app(app, 'dev-app')
+
 # FLAG 5 - Dev Subdomain
 FLAG = 'FLAG{dev_subdomain_pwned_5f2a}'
 
+# Set to False to rebuild the 404 bodies on every request
+ROUTE_LISTING_CACHE = True
+
+_listing_cache = {'version': None, 'bodies': {}}
+MAX_CACHED_BODIES = 32
+
+def _listing_version():
+    return (app.url_map.version, app.config.version)
+
+def cached_json(key, build, status=200):
+    """
+    Serve build() as JSON from a pre-serialized body
+    Bodies are dropped whenever the URL map or the config changes
+    """
+    global _listing_cache
+    if not ROUTE_LISTING_CACHE:
+        return jsonify(build()), status
+
+    cache = _listing_cache
+    version = _listing_version()
+    if cache['version'] != version:
+        cache = {'version': version, 'bodies': {}}
+        _listing_cache = cache
+
+    body = cache['bodies'].get(key)
+    if body is None:
+        body = app.json.response(build()).get_data()
+        if len(cache['bodies']) < MAX_CACHED_BODIES:
+            cache['bodies'][key] = body
+    return Response(body, status, mimetype=app.json.mimetype)
+
+def routes_list():
+    return [str(rule) for rule in app.url_map.iter_rules()]
+
 @app.route('/')
 def index():
     """Main development environment page with FLAG and debug info"""
@@ -39,12 +143,13 @@ def index():
 @app.route('/debug')
 def debug():
     """Debug endpoint with extensive information"""
-    routes_list = [str(rule) for rule in app.url_map.iter_rules()]
+    return jsonify(debug_payload())
 
-    return jsonify({
+def debug_payload():
+    return {
         'flag': FLAG,
         'message': 'Development environment - Debug mode ENABLED',
-        'routes': routes_list,
+        'routes': routes_list(),
         'config': {k: str(v) for k, v in app.config.items()},
         'environment_variables': {
             'FLASK_ENV': os.environ.get('FLASK_ENV', 'development'),
@@ -56,12 +161,13 @@ def debug():
             'platform': sys.platform,
             'executable': sys.executable
         }
-    })
+    }
 
 @app.route('/api/status')
+@static_json(app, key=_listing_version)
 def api_status():
     """Dev API status endpoint"""
-    return jsonify({
+    return {
         'status': 'development',
         'debug': True,
         'environment': 'dev',
@@ -70,12 +176,13 @@ def api_status():
             '/api/status',
             '/config'
         ]
-    })
+    }
 
 @app.route('/config')
+@static_json(app, key=_listing_version)
 def config():
     """Expose configuration (dangerous in production!)"""
-    return jsonify({
+    return {
         'flag': FLAG,
         'configuration': {
             'SECRET_KEY': app.config['SECRET_KEY'],
@@ -86,7 +193,7 @@ def config():
             'STAGING_URL': 'http://staging.techcorp.local:8082',
             'ADMIN_PORTAL': 'http://admin.techcorp.local:8083'
         }
-    })
+    }
 
 # Add custom headers - revealing debug mode
 @app.after_request
@@ -101,12 +208,13 @@ def add_debug_headers(response):
 # Error handlers that reveal too much information
 @app.errorhandler(404)
 def not_found(e):
-    return jsonify({
+    message = str(e)
+    return cached_json(('404', message), lambda: {
         'error': '404 Not Found',
-        'message': str(e),
-        'available_routes': [str(rule) for rule in app.url_map.iter_rules()],
+        'message': message,
+        'available_routes': routes_list(),
         'hint': 'This is a development environment - all routes are listed above'
-    }), 404
+    }, 404)
 
 @app.errorhandler(500)
 def internal_error(e):
@@ -117,6 +225,8 @@ def internal_error(e):
         'traceback': 'Full traceback would appear here in dev mode'
     }), 500
 
+startup.mark('dev-app', 'app')
+
 if __name__ == '__main__':
     print("=" * 60)
     print("TechCorp Development Environment")
@@ -130,4 +240,5 @@ if __name__ == '__main__':
     print("Access: http://dev.techcorp.local:8081")
     print("=" * 60)
 
+    startup.warm_up(app, 'dev-app')
     app.run(host='127.0.0.1', port=5001, debug=True)
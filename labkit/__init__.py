@@ -0,0 +1,6 @@
+"""
+TechCorp CTF Lab - shared tooling
+
+Helpers used to run, measure and operate the four lab applications
+(main-app, dev-app, staging-app and admin-app).
+"""
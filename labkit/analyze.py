@@ -0,0 +1,327 @@
+"""
+TechCorp CTF Lab - Incremental nginx Access Log Analyzer
+
+Follows the per-vhost access logs written by nginx.conf and reports, per
+client IP, which of the 7 flag locations were reached (a 2xx/304 response
+on the flag's URL), how fast the client was requesting and which tools it
+looked like (User-Agent fingerprints).
+
+Logs are read line by line from a byte offset saved in a state file next to
+the aggregated results, so a re-run (or a restart after a crash) picks up
+where the last checkpoint stopped instead of re-reading tens of millions of
+lines. Rotated logs (inode change) are finished from their .1 copy first.
+
+Usage:
+    python3 -m labkit.analyze
+    python3 -m labkit.analyze --follow --interval 5
+    python3 -m labkit.analyze main-app=/tmp/techcorp-access.log --json --state /tmp/state.json
+"""
+from calendar import timegm
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+from labkit import apps, validate
+
+NGINX_LOG_DIR = '/var/log/nginx'
+STATE_FILE = os.path.join(apps.ROOT, 'logs', 'analyze-state.json')
+STATE_VERSION = 1
+
+# access_log file name in nginx.conf -> app behind that server block
+LOG_FILES = {
+    'techcorp-access.log': 'main-app',
+    'dev-access.log': 'dev-app',
+    'staging-access.log': 'staging-app',
+    'admin-access.log': 'admin-app',
+}
+
+# nginx "combined" format; the time is split so minutes can be cached
+COMBINED = re.compile(
+    rb'(\S+) \S+ \S+ \[(\d\d/\w{3}/\d{4}:\d\d:\d\d):(\d\d) ([^\]]+)\] '
+    rb'"(\S+) (\S+)[^"]*" (\d{3}) (?:\d+|-) "[^"]*" "([^"]*)"')
+
+# First match wins, so more specific tools come before generic clients
+TOOLS = (
+    ('gobuster', r'gobuster'),
+    ('ffuf', r'fuzz faster u fool|\bffuf'),
+    ('feroxbuster', r'feroxbuster'),
+    ('dirbuster', r'dirbuster'),
+    ('dirb', r'\bdirb\b'),
+    ('wfuzz', r'wfuzz'),
+    ('nikto', r'nikto'),
+    ('sqlmap', r'sqlmap'),
+    ('nmap', r'nmap'),
+    ('burp', r'burp'),
+    ('curl', r'^curl/'),
+    ('wget', r'^wget/'),
+    ('python', r'python-requests|python-urllib|aiohttp|httpx'),
+    ('go', r'go-http-client'),
+    ('browser', r'mozilla/'),
+)
+TOOL_PATTERNS = [(name, re.compile(pattern, re.I)) for name, pattern in TOOLS]
+
+CHECKPOINT_LINES = 500000
+MONTHS = {name: n for n, name in enumerate(
+    ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'), 1)}
+
+
+def flag_paths():
+    """app -> {path (bytes): flag number} for the flag locations"""
+    paths = {}
+    for check in validate.CHECKS:
+        paths.setdefault(check.app, {})[check.path.encode()] = check.number
+    return paths
+
+
+def tool_for(user_agent):
+    for name, pattern in TOOL_PATTERNS:
+        if pattern.search(user_agent):
+            return name
+    return 'other' if user_agent not in ('', '-') else 'none'
+
+
+def minute_epoch(minute, zone):
+    """'18/Oct/2026:15:44', '+0200' -> UTC epoch seconds of that minute"""
+    day, month, rest = minute.split('/')
+    year, hour, mins = rest.split(':')
+    epoch = timegm((int(year), MONTHS[month], int(day), int(hour), int(mins), 0))
+    offset = int(zone[1:3]) * 3600 + int(zone[3:5]) * 60
+    return epoch - offset if zone.startswith('+') else epoch + offset
+
+
+def new_client():
+    return {
+        'requests': 0,
+        'errors': 0,           # 4xx/5xx responses, i.e. misses while fuzzing
+        'first_seen': None,
+        'last_seen': None,
+        'flags': {},           # flag number (str) -> first time reached
+        'tools': {},           # tool -> requests
+        'peak_rpm': 0,         # busiest minute
+        'minute': {},          # app -> [minute epoch, requests in it]
+    }
+
+
+class Analyzer:
+    """Aggregates parsed log lines into per-client statistics and tracks file offsets"""
+
+    def __init__(self, state=None):
+        state = state or {}
+        self.files = state.get('files', {})
+        self.clients = state.get('clients', {})
+        self.unparsed = state.get('unparsed', 0)
+        self.lines = state.get('lines', 0)
+        self._flag_paths = flag_paths()
+        self._minutes = {}
+        self._tools = {}
+
+    def state(self):
+        return {'version': STATE_VERSION, 'files': self.files, 'clients': self.clients,
+                'unparsed': self.unparsed, 'lines': self.lines}
+
+    def add(self, app, line):
+        self.lines += 1
+        match = COMBINED.match(line)
+        if match is None:
+            self.unparsed += 1
+            return
+        ip, minute, second, zone, _method, path, status, agent = match.groups()
+
+        key = (minute, zone)
+        minute_start = self._minutes.get(key)
+        if minute_start is None:
+            minute_start = self._minutes[key] = minute_epoch(minute.decode(), zone.decode())
+        ts = minute_start + int(second)
+
+        ip = ip.decode()
+        client = self.clients.get(ip)
+        if client is None:
+            client = self.clients[ip] = new_client()
+        client['requests'] += 1
+        if client['first_seen'] is None or ts < client['first_seen']:
+            client['first_seen'] = ts
+        if client['last_seen'] is None or ts > client['last_seen']:
+            client['last_seen'] = ts
+
+        status = int(status)
+        if status >= 400:
+            client['errors'] += 1
+        elif status < 300 or status == 304:
+            paths = self._flag_paths.get(app)
+            if paths:
+                number = paths.get(path.split(b'?', 1)[0])
+                if number is not None:
+                    flags = client['flags']
+                    number = str(number)
+                    if number not in flags or ts < flags[number]:
+                        flags[number] = ts
+
+        tool = self._tools.get(agent)
+        if tool is None:
+            tool = self._tools[agent] = tool_for(agent.decode('latin-1'))
+        tools = client['tools']
+        tools[tool] = tools.get(tool, 0) + 1
+
+        # Each log is read in order, so a per-app running minute is enough
+        current = client['minute'].get(app)
+        if current is None or current[0] != minute_start:
+            current = client['minute'][app] = [minute_start, 0]
+        current[1] += 1
+        if current[1] > client['peak_rpm']:
+            client['peak_rpm'] = current[1]
+
+    def process(self, app, path, checkpoint=None):
+        """Read new complete lines of one log; returns the number of lines read"""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return 0
+        position = self.files.get(path)
+        count = 0
+        if position and position['inode'] != st.st_ino:
+            # Rotated: finish the old file if it is still around as .1
+            rotated = path + '.1'
+            try:
+                if os.stat(rotated).st_ino == position['inode']:
+                    count += self._read(app, rotated, path, position['offset'], checkpoint)
+            except OSError:
+                pass
+            position = None
+        if position is None or st.st_size < position['offset']:
+            # New or truncated file
+            position = self.files[path] = {'inode': st.st_ino, 'offset': 0}
+        count += self._read(app, path, path, position['offset'], checkpoint)
+        return count
+
+    def _read(self, app, source, path, offset, checkpoint):
+        count = 0
+        inode = os.stat(source).st_ino
+        with open(source, 'rb') as f:
+            f.seek(offset)
+            try:
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break  # still being written, pick it up next time
+                    self.add(app, line)
+                    offset += len(line)
+                    count += 1
+                    if checkpoint and self.lines % CHECKPOINT_LINES == 0:
+                        self.files[path] = {'inode': inode, 'offset': offset}
+                        checkpoint(self)
+            finally:
+                self.files[path] = {'inode': inode, 'offset': offset}
+        return count
+
+
+def load_state(path):
+    try:
+        with open(path) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return state if state.get('version') == STATE_VERSION else None
+
+
+def save_state(analyzer, path):
+    """Write offsets and aggregates together, atomically, so they always match"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(analyzer.state(), f, separators=(',', ':'))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def report(analyzer):
+    clients = []
+    for ip, client in analyzer.clients.items():
+        duration = (client['last_seen'] or 0) - (client['first_seen'] or 0)
+        clients.append({
+            'ip': ip,
+            'flags': sorted(int(number) for number in client['flags']),
+            'flags_reached_at': {number: time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(ts))
+                                 for number, ts in sorted(client['flags'].items())},
+            'requests': client['requests'],
+            'errors': client['errors'],
+            'avg_rps': round(client['requests'] / duration, 2) if duration else None,
+            'peak_rpm': client['peak_rpm'],
+            'tools': dict(sorted(client['tools'].items(), key=lambda item: -item[1])),
+        })
+    clients.sort(key=lambda c: (-len(c['flags']), -c['requests']))
+    return {'lines': analyzer.lines, 'unparsed': analyzer.unparsed, 'clients': clients}
+
+
+def print_report(summary):
+    print("{:<16} {:<9} {:<16} {:>10} {:>8} {:>8} {:>6}  {}".format(
+        'client', 'flags', 'found', 'requests', 'errors', 'avg r/s', 'peak/m', 'tools'))
+    for client in summary['clients']:
+        found = ','.join(str(number) for number in client['flags']) or '-'
+        tools = ' '.join('{}:{}'.format(name, count) for name, count in client['tools'].items())
+        print("{:<16} {:<9} {:<16} {:>10} {:>8} {:>8} {:>6}  {}".format(
+            client['ip'], '{}/{}'.format(len(client['flags']), len(validate.CHECKS)), found,
+            client['requests'], client['errors'],
+            client['avg_rps'] if client['avg_rps'] is not None else '-',
+            client['peak_rpm'], tools))
+    print("{} lines analyzed, {} unparsed".format(summary['lines'], summary['unparsed']))
+
+
+def parse_log_spec(spec):
+    """'APP=PATH', a log file named as in nginx.conf, or a directory holding them"""
+    if '=' in spec:
+        app, path = spec.split('=', 1)
+        apps.get(app)
+        return [(app, path)]
+    if os.path.isdir(spec):
+        return [(app, os.path.join(spec, name)) for name, app in LOG_FILES.items()]
+    app = LOG_FILES.get(os.path.basename(spec))
+    if app is None:
+        raise SystemExit("Unknown log {}: use APP=PATH (apps: {})".format(
+            spec, ', '.join(apps.APPS)))
+    return [(app, spec)]
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Per-client flag progress from nginx access logs')
+    parser.add_argument('logs', nargs='*', default=[NGINX_LOG_DIR],
+                        help='log directory, log files or APP=PATH (default {})'.format(NGINX_LOG_DIR))
+    parser.add_argument('--state', default=STATE_FILE, help='offsets and aggregates (resume point)')
+    parser.add_argument('--reset', action='store_true', help='ignore the saved state, start from zero')
+    parser.add_argument('-f', '--follow', action='store_true', help='keep tailing the logs')
+    parser.add_argument('--interval', type=float, default=5.0, help='seconds between polls with --follow')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    return parser
+
+
+def main(argv=None):
+    options = build_parser().parse_args(argv)
+    logs = [item for spec in options.logs for item in parse_log_spec(spec)]
+    analyzer = Analyzer(None if options.reset else load_state(options.state))
+
+    def checkpoint(current):
+        save_state(current, options.state)
+
+    try:
+        while True:
+            read = sum(analyzer.process(app, path, checkpoint) for app, path in logs)
+            if read or not options.follow:
+                save_state(analyzer, options.state)
+                summary = report(analyzer)
+                if options.json:
+                    json.dump(summary, sys.stdout, indent=2)
+                    print()
+                else:
+                    print_report(summary)
+            if not options.follow:
+                return 0
+            time.sleep(options.interval)
+    except KeyboardInterrupt:
+        save_state(analyzer, options.state)
+        return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,106 @@
+"""
+Registry of the four lab applications and helpers to import them
+
+Each app lives in its own directory as a standalone `app.py`, so they are
+imported from their file path under a unique module name.
+"""
+from collections import namedtuple
+import importlib.util
+import os
+import sys
+
+from labkit import startup
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Base domain of the lab, every app's virtual host lives under it
+DOMAIN = 'techcorp.local'
+
+# name, directory, module name, backend port, virtual host, nginx port
+LabApp = namedtuple('LabApp', 'name directory module port host public_port')
+
+APPS = {
+    'main-app': LabApp('main-app', 'main-app', 'main_app', 5000, 'techcorp.local', 8080),
+    'dev-app': LabApp('dev-app', 'dev-app', 'dev_app', 5001, 'dev.techcorp.local', 8081),
+    'staging-app': LabApp('staging-app', 'staging-app', 'staging_app', 5002, 'staging.techcorp.local', 8082),
+    'admin-app': LabApp('admin-app', 'admin-app', 'admin_app', 5003, 'admin.techcorp.local', 8083),
+}
+
+
+def get(name):
+    """Look up an app by name, raising a readable error for unknown names"""
+    try:
+        return APPS[name]
+    except KeyError:
+        raise ValueError("Unknown app '{}' (expected one of: {})".format(
+            name, ', '.join(APPS))) from None
+
+
+def load_module(name, reload=False):
+    """
+    Import <directory>/app.py and return the module
+    The module is cached in sys.modules unless `reload` is set
+    """
+    lab_app = get(name)
+    if not reload and lab_app.module in sys.modules:
+        return sys.modules[lab_app.module]
+
+    path = os.path.join(ROOT, lab_app.directory, 'app.py')
+    spec = importlib.util.spec_from_file_location(lab_app.module, path)
+    module = importlib.util.module_from_spec(spec)
+    # Flask resolves root_path (templates, static) through sys.modules
+    sys.modules[lab_app.module] = module
+    startup.begin(name)
+    try:
+        spec.loader.exec_module(module)
+    except BaseException:
+        del sys.modules[lab_app.module]
+        raise
+    return module
+
+
+def load_app(name, reload=False):
+    """Return the Flask application object of a lab app"""
+    return load_module(name, reload=reload).app
+
+
+def subdomain(name):
+    """Host prefix of an app relative to DOMAIN ('' for main-app, 'dev' for dev-app)"""
+    host = get(name).host
+    return host[:-len(DOMAIN)].rstrip('.')
+
+
+def wsgi_app(app):
+    """
+    WSGI callable to serve for a Flask app outside of app.run()
+    Debug apps keep their leaky traceback pages; the interactive console is
+    disabled since its state cannot be shared across worker processes
+    """
+    if app.debug:
+        from werkzeug.debug import DebuggedApplication
+        return DebuggedApplication(app, evalex=False)
+    return app
+
+
+def warm_up(name):
+    """
+    Run the app's optional warm_up() hook (DB init, cache priming), then
+    precompile its templates and print the startup timings
+    Called once in the parent process before any worker is forked
+    """
+    module = load_module(name)
+    hook = getattr(module, 'warm_up', None)
+    if hook is not None:
+        hook()
+    return startup.warm_up(module.app, name)
+
+
+def isolate(name, directory):
+    """
+    Run the app's optional isolate(directory) hook, which moves its writable
+    state (main-app's database) into `directory`
+    Called in each forked lab-farm instance (see labkit.farm)
+    """
+    hook = getattr(load_module(name), 'isolate', None)
+    if hook is not None:
+        hook(directory)
@@ -0,0 +1,403 @@
+"""
+TechCorp CTF Lab - Load / Regression Benchmark
+
+Replays wordlists/directories.txt against every app and
+wordlists/subdomains.txt against the virtual hosts (Host header fuzzing), the
+way gobuster/ffuf would, and reports throughput and latency percentiles per
+app and per route class (hit, 404, 401, 403, other), and memory per app.
+
+Modes:
+    in-process  Flask test client, no sockets (default); each app runs in a
+                forked process of its own, whose RSS (and growth during the
+                run) is reported
+    live        HTTP against running services (start_all_services.sh); RSS
+                of the app's master and workers
+
+Usage:
+    python3 -m labkit.bench --expand 100000 --output bench.json
+    python3 -m labkit.bench --live --concurrency 32 --output bench.json
+    python3 -m labkit.bench --baseline previous.json --max-regression 0.15
+"""
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+import argparse
+import http.client
+import itertools
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import traceback
+
+from werkzeug.wrappers import Response
+
+from labkit import apps, procstats, requestlog, scoreboard, vhosts, wordlist
+
+WORDLIST_DIR = os.path.join(apps.ROOT, 'wordlists')
+DIRECTORIES = os.path.join(WORDLIST_DIR, 'directories.txt')
+SUBDOMAINS = os.path.join(WORDLIST_DIR, 'subdomains.txt')
+PID_DIR = os.path.join(apps.ROOT, 'logs')
+
+ROUTE_CLASSES = ('hit', '404', '401', '403', 'other')
+
+# Affixes used to grow the shipped lists into realistic synthetic ones
+EXPANSION_SUFFIXES = ('', '1', '2', '01', '2023', '2024', '-old', '-new', '_bak',
+                      '-dev', '-test', '-v2', '.bak', '.old', '.zip', '.php')
+EXPANSION_PREFIXES = ('', 'old-', 'new-', 'test-', 'dev-', 'backup-', 'api-', 'my')
+
+
+def read_wordlist(path):
+    """Words of a list, memory-mapped when it has an index (labkit.wordlist)"""
+    return wordlist.load(path)
+
+
+def expand(words, count):
+    """
+    Deterministically grow `words` to `count` entries by combining them with
+    common prefixes, suffixes and numeric tails (0 keeps the list as is)
+    """
+    if count <= len(words):
+        return list(words) if count <= 0 else list(words[:count])
+    result = []
+    seen = set()
+    for n in itertools.count():
+        tail = '' if n == 0 else str(n)
+        for prefix, suffix in itertools.product(EXPANSION_PREFIXES, EXPANSION_SUFFIXES):
+            for word in words:
+                candidate = prefix + word + suffix + tail
+                if candidate not in seen:
+                    seen.add(candidate)
+                    result.append(candidate)
+                    if len(result) == count:
+                        return result
+
+
+def known_paths(app):
+    """Concrete routes of an app, so every run also measures real hits"""
+    return sorted(rule.rule for rule in app.url_map.iter_rules()
+                  if not rule.arguments and 'GET' in rule.methods)
+
+
+def route_class(status):
+    if status < 400:
+        return 'hit'
+    key = str(status)
+    return key if key in ROUTE_CLASSES else 'other'
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies, elapsed):
+    """Count, throughput over `elapsed` seconds and latency percentiles"""
+    values = sorted(latencies)
+    return {
+        'requests': len(values),
+        'req_per_sec': round(len(values) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(values, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(values, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(values, 0.99) * 1000, 3),
+        'max_ms': round(values[-1] * 1000, 3) if values else 0.0,
+    }
+
+
+class Recorder:
+    """Collects (route class, latency) samples from one or many threads"""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def add(self, status, latency):
+        with self._lock:
+            self.samples[route_class(status)].append(latency)
+
+    def error(self):
+        with self._lock:
+            self.errors += 1
+
+    def report(self, elapsed, concurrency=1):
+        """
+        Totals over the wall-clock `elapsed`; each route class is timed on
+        its own: its throughput is over the time spent serving it (summed
+        latencies spread over `concurrency` clients), `share` is its part
+        of all requests
+        """
+        everything = [latency for values in self.samples.values() for latency in values]
+        classes = {}
+        for name, values in sorted(self.samples.items()):
+            stats = classes[name] = summarize(values, sum(values) / concurrency)
+            stats['share'] = round(len(values) / len(everything), 4)
+        return {
+            'total': summarize(everything, elapsed),
+            'classes': classes,
+            'errors': self.errors,
+            'elapsed_s': round(elapsed, 3),
+        }
+
+
+def run_in_process(client, requests):
+    """Replay (path, headers) pairs through a Flask/Werkzeug test client"""
+    recorder = Recorder()
+    clock = time.perf_counter
+    start = clock()
+    for path, headers in requests:
+        t0 = clock()
+        response = client.get(path, headers=headers)
+        response.close()
+        recorder.add(response.status_code, clock() - t0)
+    return recorder.report(clock() - start)
+
+
+def run_live(base_url, requests, concurrency, timeout):
+    """Replay (path, headers) pairs over keep-alive HTTP connections"""
+    parts = urlsplit(base_url)
+    recorder = Recorder()
+    local = threading.local()
+    clock = time.perf_counter
+
+    def connection():
+        conn = getattr(local, 'conn', None)
+        if conn is None:
+            conn = local.conn = http.client.HTTPConnection(parts.hostname, parts.port or 80,
+                                                            timeout=timeout)
+        return conn
+
+    def send(item):
+        path, headers = item
+        t0 = clock()
+        for _ in range(2):
+            try:
+                conn = connection()
+                conn.request('GET', path, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                if response.will_close:
+                    conn.close()
+                    local.conn = None
+                recorder.add(response.status, clock() - t0)
+                return
+            except (OSError, http.client.HTTPException):
+                # Stale keep-alive connection: reconnect once, then give up
+                local.conn = None
+        recorder.error()
+
+    start = clock()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in pool.map(send, requests, chunksize=64):
+            pass
+    return recorder.report(clock() - start, concurrency)
+
+
+def path_requests(app, words):
+    paths = known_paths(app) + ['/' + word for word in words]
+    return [(path, {}) for path in paths]
+
+
+def host_requests(words, domain=apps.DOMAIN):
+    hosts = [vhosts.host_for(name, domain) for name in apps.APPS]
+    hosts += ['{}.{}'.format(word, domain) for word in words]
+    return [('/', {'Host': host}) for host in hosts]
+
+
+def read_pid(name):
+    try:
+        with open(os.path.join(PID_DIR, name + '.pid')) as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+
+def in_child(func, *args):
+    """
+    Return func(*args) (JSON-serializable) computed in a forked process, so
+    the memory it measures belongs to that run alone
+    """
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            os.close(read_end)
+            with os.fdopen(write_end, 'wb') as pipe:
+                pipe.write(json.dumps(func(*args)).encode())
+            code = 0
+        except BaseException:
+            traceback.print_exc()
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(code)
+    os.close(write_end)
+    with os.fdopen(read_end, 'rb') as pipe:
+        data = pipe.read()
+    _, status = os.waitpid(pid, 0)
+    if procstats.exit_code(status) != 0 or not data:
+        raise RuntimeError('{} failed in process {}'.format(func.__name__, pid))
+    return json.loads(data)
+
+
+def bench_app_in_process(name, words):
+    """In-process replay of `words` against one app, in a process that loads only that app"""
+    rss_before = procstats.rss()
+    app = apps.warm_up(name)
+    requests = path_requests(app, words)
+    # Unhandled errors are counted as 'other', don't log every traceback
+    app.logger.disabled = True
+    report = run_in_process(app.test_client(), requests)
+    report['rss_bytes'] = procstats.rss()
+    report['rss_delta_bytes'] = report['rss_bytes'] - rss_before
+    return report
+
+
+def bench_vhosts_in_process(words):
+    rss_before = procstats.rss()
+    from werkzeug.test import Client
+    report = run_in_process(Client(vhosts.warm_up(), Response), host_requests(words))
+    report['rss_bytes'] = procstats.rss()
+    report['rss_delta_bytes'] = report['rss_bytes'] - rss_before
+    return report
+
+
+def benchmark(options):
+    directories = expand(read_wordlist(options.directories), options.expand)
+    subdomains = expand(read_wordlist(options.subdomains), options.expand)
+    results = {}
+
+    for name in options.apps:
+        if options.live:
+            # Routes only: warm_up() would initialize (write) the database
+            requests = path_requests(apps.load_app(name), directories)
+            lab_app = apps.get(name)
+            url = 'http://{}:{}'.format(options.host, lab_app.port)
+            report = run_live(url, requests, options.concurrency, options.timeout)
+            pid = read_pid(name)
+            report['rss_bytes'] = procstats.tree_rss(pid) if pid else None
+        else:
+            report = in_child(bench_app_in_process, name, directories)
+        results[name] = report
+        print_report(name, report)
+
+    if 'vhosts' not in options.skip:
+        requests = host_requests(subdomains)
+        if options.live:
+            report = run_live(options.vhost_url, requests, options.concurrency, options.timeout)
+            report['rss_bytes'] = None
+        else:
+            report = in_child(bench_vhosts_in_process, subdomains)
+        results['vhosts'] = report
+        print_report('vhosts', report)
+
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'mode': 'live' if options.live else 'in-process',
+        'python': platform.python_version(),
+        'wordlist_entries': {'directories': len(directories), 'subdomains': len(subdomains)},
+        'concurrency': options.concurrency if options.live else 1,
+        'results': results,
+    }
+
+
+def print_report(name, report):
+    total = report['total']
+    rss = report.get('rss_bytes')
+    rss = '{:.1f}MB'.format(rss / 1048576) if rss else 'n/a'
+    if report.get('rss_delta_bytes') is not None:
+        rss += ' (+{:.1f}MB)'.format(report['rss_delta_bytes'] / 1048576)
+    print("{:<12} {:>8} req  {:>9.1f} req/s  p50 {:>7.3f}ms  p95 {:>7.3f}ms  p99 {:>7.3f}ms  rss {}".format(
+        name, total['requests'], total['req_per_sec'], total['p50_ms'], total['p95_ms'],
+        total['p99_ms'], rss))
+    for route, stats in report['classes'].items():
+        print("  {:<10} {:>8} req  {:>9.1f} req/s  p50 {:>7.3f}ms  p95 {:>7.3f}ms  p99 {:>7.3f}ms  {:>5.1f}%".format(
+            route, stats['requests'], stats['req_per_sec'], stats['p50_ms'],
+            stats['p95_ms'], stats['p99_ms'], stats['share'] * 100))
+
+
+def compare(current, baseline, max_regression):
+    """
+    List regressions between two result files: throughput lower, or p95
+    latency higher, than the baseline by more than `max_regression`
+    """
+    problems = []
+    for name, report in current['results'].items():
+        previous = baseline.get('results', {}).get(name)
+        if previous is None:
+            continue
+        for route, stats in report['classes'].items():
+            before = previous['classes'].get(route)
+            if before is None or before['requests'] < 100:
+                continue
+            if stats['req_per_sec'] < before['req_per_sec'] * (1 - max_regression):
+                problems.append('{} {}: {:.1f} req/s (baseline {:.1f})'.format(
+                    name, route, stats['req_per_sec'], before['req_per_sec']))
+            if stats['p95_ms'] > before['p95_ms'] * (1 + max_regression) + 0.05:
+                problems.append('{} {}: p95 {:.3f}ms (baseline {:.3f}ms)'.format(
+                    name, route, stats['p95_ms'], before['p95_ms']))
+    return problems
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Benchmark the lab apps with the shipped wordlists')
+    parser.add_argument('--apps', nargs='+', default=list(apps.APPS), choices=list(apps.APPS))
+    parser.add_argument('--skip', nargs='*', default=[], choices=['vhosts'],
+                        help='skip the subdomain (Host header) replay')
+    parser.add_argument('--directories', default=DIRECTORIES)
+    parser.add_argument('--subdomains', default=SUBDOMAINS)
+    parser.add_argument('--expand', type=int, default=0,
+                        help='grow each wordlist to N synthetic entries (e.g. 100000)')
+    parser.add_argument('--live', action='store_true', help='benchmark running services over HTTP')
+    parser.add_argument('--host', default='127.0.0.1', help='backend host for --live')
+    parser.add_argument('--vhost-url', default='http://127.0.0.1:8080',
+                        help='nginx or `labkit.server all` address for the subdomain replay')
+    parser.add_argument('-c', '--concurrency', type=int, default=16)
+    parser.add_argument('--timeout', type=float, default=10.0)
+    parser.add_argument('-o', '--output', help='write results as JSON')
+    parser.add_argument('--baseline', help='previous JSON results to compare against')
+    parser.add_argument('--max-regression', type=float, default=0.10,
+                        help='allowed relative drop in req/s / rise in p95 (default 0.10)')
+    return parser
+
+
+def main(argv=None):
+    options = build_parser().parse_args(argv)
+    # Apps loaded here must not write benchmark traffic to the running lab's
+    # request logs or scoreboard
+    os.environ[requestlog.LOG_DIR_ENV] = ''
+    scratch = tempfile.mkdtemp(prefix='lab-bench-')
+    os.environ[scoreboard.PATH_ENV] = os.path.join(scratch, 'scoreboard')
+    try:
+        results = benchmark(options)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print("Results written to {}".format(options.output))
+
+    if options.baseline:
+        with open(options.baseline) as f:
+            baseline = json.load(f)
+        problems = compare(results, baseline, options.max_regression)
+        if problems:
+            print("Regressions against {}:".format(options.baseline))
+            for problem in problems:
+                print("  - " + problem)
+            return 1
+        print("No regressions against {}".format(options.baseline))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
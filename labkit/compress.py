@@ -0,0 +1,239 @@
+"""
+TechCorp CTF Lab - Response Compression
+
+WSGI middleware compressing text responses (HTML pages, CSS/JS, JSON, the
+staging phpinfo page) for clients that send Accept-Encoding, which matters
+when a whole classroom shares one slow link to the lab VM:
+
+    from labkit import compress
+    compress.init_app(app)
+
+- brotli is used when the `brotli` package is installed and the client
+  prefers it, gzip otherwise
+- compressed bodies are kept in an LRU (bounded in bytes) keyed by a hash of
+  the body, so identical pages are compressed once per worker
+- only complete 200 responses with a Content-Length between MIN_SIZE and
+  MAX_SIZE and a compressible type are touched: streamed bodies, error pages
+  (fuzzers compare their sizes), already encoded responses (labkit.prebuilt),
+  images and archives go out unchanged
+- the ETag of a compressed response is made weak, like nginx does, so
+  conditional requests keep matching the uncompressed representation
+
+Settings (environment):
+    LAB_COMPRESS              '0' disables compression
+    LAB_COMPRESS_CACHE_BYTES  size of the compressed-variant cache (default 16MB)
+"""
+from collections import OrderedDict
+from functools import lru_cache
+import gzip
+import hashlib
+import os
+import threading
+
+from werkzeug.http import parse_accept_header
+
+try:
+    import brotli
+except ImportError:  # optional: pip install brotli
+    brotli = None
+
+ENABLED = os.environ.get('LAB_COMPRESS', '1') != '0'
+CACHE_BYTES = int(os.environ.get('LAB_COMPRESS_CACHE_BYTES', 16 * 1024 * 1024))
+
+MIN_SIZE = 512                  # smaller bodies barely shrink and cost a round of CPU
+MAX_SIZE = 4 * 1024 * 1024      # bodies are buffered whole to be compressed
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript',
+                      'application/xml', 'application/xhtml+xml', 'image/svg+xml')
+
+
+class VariantCache:
+    """
+    LRU of compressed bodies keyed by (body hash, encoding)
+    The oldest entries are evicted once the stored bytes exceed `max_bytes`
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def put(self, key, body):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.total_bytes -= len(old)
+            self._entries[key] = body
+            self.total_bytes += len(body)
+            while self.total_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.total_bytes -= len(evicted)
+
+
+cache = VariantCache(CACHE_BYTES)
+
+
+@lru_cache(maxsize=256)
+def negotiate(accept_encoding):
+    """
+    Encoding to use for an Accept-Encoding header value, None for identity
+    Cached: clients resend the same few values and parsing costs ~6us
+    """
+    accept = parse_accept_header(accept_encoding)
+    gzip_q = accept['gzip']
+    if brotli is not None:
+        br_q = accept['br']
+        if br_q > 0 and br_q >= gzip_q:
+            return 'br'
+    return 'gzip' if gzip_q > 0 else None
+
+
+def encode(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, GZIP_LEVEL, mtime=0)
+
+
+def compressed(body, encoding, cacheable=True):
+    """Compressed `body`, served from the variant cache when possible"""
+    if not cacheable:
+        return encode(body, encoding)
+    key = (hashlib.sha1(body).digest(), encoding)
+    data = cache.get(key)
+    if data is None:
+        data = encode(body, encoding)
+        cache.put(key, data)
+    return data
+
+
+def _compressible(status, headers):
+    """Header dict (lower-case names) if the response may be compressed, else None"""
+    if not status.startswith('200'):
+        return None
+    fields = {name.lower(): value for name, value in headers}
+    if 'content-encoding' in fields or 'content-range' in fields:
+        return None
+    if 'no-transform' in fields.get('cache-control', ''):
+        return None
+    try:
+        length = int(fields.get('content-length', ''))
+    except ValueError:
+        return None  # streamed, keep it streaming
+    if not MIN_SIZE <= length <= MAX_SIZE:
+        return None
+    if not fields.get('content-type', '').startswith(COMPRESSIBLE_TYPES):
+        return None
+    return fields
+
+
+def _close(app_iter):
+    close = getattr(app_iter, 'close', None)
+    if close is not None:
+        close()
+
+
+class CompressMiddleware:
+    """
+    Compresses eligible responses of `wsgi_app` (see module docstring)
+    Flask responses call start_response before returning their body; a
+    response that does not is passed through unchanged
+    """
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        accept_encoding = environ.get('HTTP_ACCEPT_ENCODING')
+        if not accept_encoding or environ.get('REQUEST_METHOD') == 'HEAD':
+            return self.wsgi_app(environ, start_response)
+        encoding = negotiate(accept_encoding)
+        if encoding is None:
+            return self.wsgi_app(environ, start_response)
+
+        captured = []
+        written = []
+
+        def capture(status, headers, exc_info=None):
+            captured[:] = [status, headers, exc_info]
+            return written.append
+
+        app_iter = self.wsgi_app(environ, capture)
+        if not captured:
+            return self._relay(app_iter, captured, start_response)
+        status, headers, exc_info = captured
+        fields = None if exc_info else _compressible(status, headers)
+        if fields is None:
+            start_response(status, headers, exc_info)
+            if written:
+                return self._relay(app_iter, None, start_response, written)
+            return app_iter
+
+        try:
+            body = b''.join(written) + b''.join(app_iter)
+        finally:
+            _close(app_iter)
+        cache_control = fields.get('cache-control', '')
+        cacheable = ('set-cookie' not in fields and 'no-store' not in cache_control
+                     and 'private' not in cache_control)
+        data = compressed(body, encoding, cacheable)
+        if len(data) >= len(body):
+            data, encoding = body, None
+
+        vary = fields.get('vary')
+        new_headers = []
+        for name, value in headers:
+            lower = name.lower()
+            if lower == 'content-length':
+                value = str(len(data))
+            elif lower == 'vary' and 'accept-encoding' not in value.lower():
+                value += ', Accept-Encoding'
+            elif encoding is not None and lower == 'etag' and not value.startswith('W/'):
+                value = 'W/' + value
+            elif encoding is not None and lower == 'accept-ranges':
+                continue  # byte ranges would apply to the compressed body
+            new_headers.append((name, value))
+        if vary is None:
+            new_headers.append(('Vary', 'Accept-Encoding'))
+        if encoding is not None:
+            new_headers.append(('Content-Encoding', encoding))
+        start_response(status, new_headers)
+        return [data]
+
+    @staticmethod
+    def _relay(app_iter, captured, start_response, written=()):
+        """Pass a body through, calling start_response once it is known"""
+        try:
+            yield from written
+            for chunk in app_iter:
+                if captured:
+                    start_response(*captured)
+                    captured = None
+                yield chunk
+            if captured:
+                start_response(*captured)
+        finally:
+            _close(app_iter)
+
+
+def init_app(app):
+    """Compress the responses of `app` (no-op when LAB_COMPRESS=0)"""
+    if ENABLED:
+        app.wsgi_app = CompressMiddleware(app.wsgi_app)
+    return app
@@ -0,0 +1,148 @@
+"""
+TechCorp CTF Lab - SQLite Setup
+
+Settings and helpers for the SQLite database of main-app, which is read by
+every worker of every lab instance and written almost never:
+
+- WAL journal, so readers never wait for a writer (no `database is locked`)
+  plus a busy timeout for the rare concurrent writes
+- memory-mapped reads and a larger page cache
+- a pooled, read-only engine per worker for the read paths
+- a seeded snapshot file: the database is seeded once, new lab instances
+  start from a copy of the snapshot instead of re-running the ORM seeding
+- relocation: a forked lab-farm instance (labkit.farm) points the engines it
+  inherited at its own copy of the database
+
+Usage (see main-app/app.py):
+
+    from labkit import database
+    database.tune(engine)
+    readonly = database.readonly_engine(path)
+    if not database.restore(snapshot_path, path):
+        ...seed..., then database.snapshot(path, snapshot_path)
+"""
+import os
+import shutil
+import sqlite3
+import weakref
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+
+# Applied to every new connection; journal_mode is stored in the file itself
+PRAGMAS = (
+    ('busy_timeout', 5000),          # ms to wait for a lock instead of failing
+    ('synchronous', 'NORMAL'),       # safe with WAL, no fsync per commit
+    ('cache_size', -32768),          # 32MB page cache per connection
+    ('mmap_size', 256 * 1024 * 1024),
+    ('temp_store', 'MEMORY'),
+)
+
+READ_POOL_SIZE = int(os.environ.get('LAB_THREADS', 8))
+
+# Absolute database path -> the path connections of this process open instead
+_relocations = {}
+
+# Engines passed to tune(); a forked child drops their inherited pools
+_tuned = weakref.WeakSet()
+
+
+def _apply_pragmas(dbapi_connection, readonly):
+    cursor = dbapi_connection.cursor()
+    try:
+        if not readonly:
+            cursor.execute('PRAGMA journal_mode=WAL')
+        for name, value in PRAGMAS:
+            cursor.execute('PRAGMA {}={}'.format(name, value))
+        if readonly:
+            cursor.execute('PRAGMA query_only=1')
+    finally:
+        cursor.close()
+
+
+def tune(engine, readonly=False):
+    """Apply PRAGMAS (and WAL unless `readonly`) to every connection of `engine`"""
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        _apply_pragmas(dbapi_connection, readonly)
+
+    @event.listens_for(engine, 'do_connect')
+    def relocate_database(dialect, connection_record, cargs, cparams):
+        if _relocations and cargs:
+            cargs[0] = _relocated(cargs[0])
+
+    _tuned.add(engine)
+    return engine
+
+
+def _dispose_after_fork():
+    # Forked workers must not reuse the parent's connections
+    for engine in list(_tuned):
+        engine.dispose(close=False)
+
+
+os.register_at_fork(after_in_child=_dispose_after_fork)
+
+
+def _relocated(target):
+    """Connect target ('/path' or 'file:/path?mode=ro') with relocate() applied"""
+    prefix = 'file:' if target.startswith('file:') else ''
+    path, separator, query = target[len(prefix):].partition('?')
+    new = _relocations.get(path)
+    return target if new is None else prefix + new + separator + query
+
+
+def relocate(path, new_path):
+    """
+    Make every engine tuned in this process open `new_path` instead of `path`
+    Only affects new connections: dispose() the engines' pools first
+    """
+    _relocations[os.path.abspath(path)] = os.path.abspath(new_path)
+
+
+def database_path(engine):
+    return make_url(engine.url).database
+
+
+def readonly_engine(path, pool_size=READ_POOL_SIZE):
+    """Pooled engine opening `path` read-only (one connection per serving thread)"""
+    url = 'sqlite:///file:{}?mode=ro&uri=true'.format(os.path.abspath(path))
+    engine = create_engine(url, pool_size=pool_size, max_overflow=pool_size,
+                           connect_args={'check_same_thread': False})
+    return tune(engine, readonly=True)
+
+
+def snapshot(path, snapshot_path):
+    """
+    Write a consistent single-file copy of the database at `path`
+    Uses the SQLite backup API, so it is safe while the database is in use
+    """
+    tmp = snapshot_path + '.tmp'
+    if os.path.exists(tmp):
+        os.unlink(tmp)
+    source = sqlite3.connect(path)
+    target = sqlite3.connect(tmp)
+    try:
+        source.backup(target)
+        # A snapshot is copied around as one file: no WAL sidecars
+        target.execute('PRAGMA journal_mode=DELETE')
+    finally:
+        target.close()
+        source.close()
+    os.replace(tmp, snapshot_path)
+    return snapshot_path
+
+
+def restore(snapshot_path, path):
+    """Create the database at `path` as a copy of the snapshot; False if there is none"""
+    if not os.path.exists(snapshot_path):
+        return False
+    tmp = path + '.tmp'
+    shutil.copyfile(snapshot_path, tmp)
+    # WAL files left over from a previous database would be replayed into the copy
+    for suffix in ('-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.unlink(path + suffix)
+    os.replace(tmp, path)
+    return True
@@ -0,0 +1,246 @@
+"""
+TechCorp CTF Lab - Local DNS Responder
+
+A small authoritative UDP DNS server for the lab domain, so subdomain brute
+forcing can be done with DNS tools (massdns, puredns, dnsx, gobuster dns)
+instead of only the names setup.sh writes to /etc/hosts:
+
+    techcorp.local, dev/staging/admin.techcorp.local  -> A <address>
+    any other name under techcorp.local               -> NXDOMAIN
+    names outside techcorp.local                      -> REFUSED
+
+With --wildcard ADDRESS every unknown name under the domain resolves to
+ADDRESS instead, like a wildcard record (e.g. the nginx default_server that
+answers "Subdomain not found"), to practise wildcard detection/filtering.
+
+Answers come from a dict built once from labkit.apps, keyed on the query
+name in wire format, and are assembled from pre-encoded pieces, so one core
+handles tens of thousands of queries per second.
+
+Usage:
+    sudo python3 -m labkit.dns
+    python3 -m labkit.dns --port 5053 --wildcard 127.0.0.1
+    dig @127.0.0.1 -p 5053 dev.techcorp.local
+"""
+import argparse
+import asyncio
+import socket
+import struct
+import sys
+
+from labkit import apps
+
+DEFAULT_PORT = 53
+TTL = 60
+
+TYPE_A = 1
+TYPE_ANY = 255
+CLASS_IN = 1
+
+RCODE_NOERROR = 0
+RCODE_FORMERR = 1
+RCODE_NXDOMAIN = 3
+RCODE_NOTIMP = 4
+RCODE_REFUSED = 5
+
+# QR + AA; RD is copied from the query, RA stays clear (not a resolver)
+FLAGS_AUTHORITATIVE = 0x8400
+FLAGS_REFUSED = 0x8000
+
+
+def encode_name(name):
+    """'dev.techcorp.local' -> wire format labels (lower case)"""
+    labels = name.strip('.').lower().split('.')
+    return b''.join(bytes([len(label)]) + label.encode('ascii') for label in labels) + b'\x00'
+
+
+def a_record(address, ttl=TTL):
+    """A record pointing at the question name (compression pointer to offset 12)"""
+    return struct.pack('!HHHIH', 0xC00C, TYPE_A, CLASS_IN, ttl, 4) + socket.inet_aton(address)
+
+
+def soa_record(domain, ttl=TTL):
+    """SOA of the zone, sent with negative answers so resolvers cache them for `ttl`"""
+    apex = encode_name(domain)
+    rdata = (encode_name('ns.' + domain) + encode_name('hostmaster.' + domain)
+             + struct.pack('!IIIII', 1, 3600, 600, 86400, ttl))
+    return apex + struct.pack('!HHIH', 6, CLASS_IN, ttl, len(rdata)) + rdata
+
+
+class Zone:
+    """
+    In-memory zone: wire-format name -> A record (pre-encoded)
+    Lookups are a dict get on the lower-cased query name
+    """
+
+    def __init__(self, domain, records, wildcard=None):
+        self.domain = domain
+        self.suffix = encode_name(domain)
+        self.records = {encode_name(name): a_record(address) for name, address in records.items()}
+        self.wildcard = a_record(wildcard) if wildcard else None
+        self.soa = soa_record(domain)
+
+    def in_zone(self, name):
+        """Whether a wire-format name is the domain or below it"""
+        offset = 0
+        while offset < len(name):
+            if name[offset:] == self.suffix:
+                return True
+            offset += name[offset] + 1
+        return False
+
+    @classmethod
+    def from_apps(cls, address='127.0.0.1', domain=apps.DOMAIN, extra=None, wildcard=None):
+        """Every lab vhost (apex, dev, staging, admin) under `domain` -> `address`"""
+        records = {}
+        for name in apps.APPS:
+            prefix = apps.subdomain(name)
+            records['{}.{}'.format(prefix, domain) if prefix else domain] = address
+        records.update(extra or {})
+        return cls(domain, records, wildcard)
+
+
+def header(query_id, flags, rcode, answers, authority):
+    return query_id + struct.pack('!HHHHH', flags | rcode, 1, answers, authority, 0)
+
+
+def error(query_id, rd, rcode):
+    """Bare error response without the question"""
+    return query_id + struct.pack('!HHHHH', 0x8000 | rd | rcode, 0, 0, 0, 0)
+
+
+def respond(zone, data):
+    """Response to one query datagram, None to drop it"""
+    if len(data) < 17 or data[2] & 0x80:
+        return None  # truncated, or a response sent to us
+    query_id = data[:2]
+    rd = (data[2] & 0x01) << 8
+    if data[2] & 0x78:
+        return error(query_id, rd, RCODE_NOTIMP)  # only standard queries
+    if data[4:6] != b'\x00\x01':
+        return error(query_id, rd, RCODE_FORMERR)
+
+    # Walk the QNAME labels (no compression in questions)
+    end = 12
+    length = data[end]
+    while length:
+        if length > 63:
+            return error(query_id, rd, RCODE_FORMERR)
+        end += length + 1
+        if end >= len(data):
+            return None
+        length = data[end]
+    end += 1
+    question = data[12:end + 4]
+    if len(question) != end - 8:
+        return None
+    name = data[12:end].lower()
+    qtype, qclass = struct.unpack_from('!HH', data, end)
+
+    flags = FLAGS_AUTHORITATIVE | rd
+    record = zone.records.get(name)
+    if record is None:
+        if not zone.in_zone(name):
+            return header(query_id, FLAGS_REFUSED | rd, RCODE_REFUSED, 0, 0) + question
+        record = zone.wildcard
+        if record is None:
+            return header(query_id, flags, RCODE_NXDOMAIN, 0, 1) + question + zone.soa
+    if qclass != CLASS_IN or qtype not in (TYPE_A, TYPE_ANY):
+        # The name exists but has no record of that type (NODATA)
+        return header(query_id, flags, RCODE_NOERROR, 0, 1) + question + zone.soa
+    return header(query_id, flags, RCODE_NOERROR, 1, 0) + question + record
+
+
+class DNSServer:
+    """
+    UDP socket served from the asyncio loop
+    Unlike a DatagramProtocol transport (one datagram per wake-up), each
+    wake-up drains up to BATCH queued datagrams, which is what keeps up with
+    massdns-style bursts
+    """
+
+    BATCH = 256
+
+    def __init__(self, zone, host, port):
+        self.zone = zone
+        self.queries = 0
+        self.dropped = 0
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        # Bursts overflow the default buffers
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4 * 1024 * 1024)
+        self.sock.bind((host, port))
+        self.sock.setblocking(False)
+
+    def _read_ready(self):
+        recvfrom, sendto, zone = self.sock.recvfrom, self.sock.sendto, self.zone
+        for _ in range(self.BATCH):
+            try:
+                data, addr = recvfrom(512)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                continue  # e.g. ICMP port unreachable from an earlier reply
+            self.queries += 1
+            response = respond(zone, data)
+            if response is not None:
+                try:
+                    sendto(response, addr)
+                except OSError:
+                    self.dropped += 1  # send buffer full: the client will retry
+
+    async def serve_forever(self):
+        loop = asyncio.get_running_loop()
+        loop.add_reader(self.sock.fileno(), self._read_ready)
+        try:
+            await asyncio.Event().wait()
+        finally:
+            loop.remove_reader(self.sock.fileno())
+            self.sock.close()
+
+
+async def serve(zone, host, port):
+    server = DNSServer(zone, host, port)
+    print("DNS for {} on {}:{} ({} names{})".format(
+        zone.domain, host, port, len(zone.records),
+        ', wildcard' if zone.wildcard else ''), flush=True)
+    try:
+        await server.serve_forever()
+    finally:
+        print("{} queries answered, {} replies dropped".format(server.queries, server.dropped))
+
+
+def parse_record(spec):
+    name, _, address = spec.partition('=')
+    socket.inet_aton(address)
+    return name, address
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Authoritative DNS for the lab domain')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--domain', default=apps.DOMAIN)
+    parser.add_argument('--address', default='127.0.0.1', help='address of the lab vhosts')
+    parser.add_argument('--record', action='append', type=parse_record, default=[],
+                        metavar='NAME=ADDRESS', help='extra A record (repeatable)')
+    parser.add_argument('--wildcard', metavar='ADDRESS',
+                        help='resolve every unknown name in the domain to ADDRESS')
+    return parser
+
+
+def main(argv=None):
+    options = build_parser().parse_args(argv)
+    zone = Zone.from_apps(options.address, options.domain, dict(options.record), options.wildcard)
+    try:
+        asyncio.run(serve(zone, options.host, options.port))
+    except PermissionError:
+        print("Cannot bind port {}: run as root or use --port 5053".format(options.port))
+        return 1
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
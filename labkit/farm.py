@@ -0,0 +1,508 @@
+"""
+TechCorp CTF Lab - Lab Farm
+
+One lab per student without a separate set of Python processes per student.
+The farm imports the four apps once and warms them up (database seeded,
+templates compiled, caches primed). It then freezes the heap (gc.freeze) and
+forks one process per student instance. Instances share the interpreter,
+the imported modules and the warm caches copy-on-write; each one only pays
+for the pages it writes to (its USS).
+
+- every instance serves the apps on its own range of ports:
+      s01: main-app 6000, dev-app 6001, staging-app 6002, admin-app 6003
+      s02: 6004-6007, ...
+  or, with --vhosts, all apps on a single port per instance, routed on a
+  Host suffix of its own (s01.techcorp.local, dev.s01.techcorp.local, ...)
+- writable state is per instance: apps.isolate() gives main-app its own
+  copy of the seeded SQLite snapshot in logs/farm/<instance>/
+- the farm binds every listener itself, so an instance that is reset or
+  restarted never closes its ports: new connections wait in the backlog
+- reset: SIGUSR1 to an instance (`farm reset s07`) ends it on the spot and
+  the farm forks a fresh one from the warm parent with a fresh database
+  copy, which takes milliseconds; SIGHUP to the farm resets every instance
+- an instance that crashes is forked again after RESTART_DELAY
+- request logs stay lab-wide; each instance records flag discoveries in
+  its own scoreboard, logs/farm/<instance>/scoreboard, which its admin-app
+  serves (`python3 -m labkit.scoreboard --path ...` reads it too)
+
+Usage:
+    python3 -m labkit.farm run --instances 40
+    python3 -m labkit.farm run --instances 40 --vhosts --base-port 9000
+    python3 -m labkit.farm status      (RSS/USS per instance, to size the VM)
+    python3 -m labkit.farm reset s07
+    python3 -m labkit.farm stop
+"""
+import argparse
+import gc
+import http.client
+import json
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+
+from labkit import apps, metrics, procstats, profiler, requestlog, scoreboard, server, vhosts
+
+FARM_DIR = os.path.join(apps.ROOT, 'logs', 'farm')
+STATE_FILE = 'farm.json'
+
+RESET_EXIT = 75          # exit status of an instance ending on a reset
+RESTART_DELAY = 1.0      # before forking again an instance that crashed
+PROBE_TIMEOUT = 1.0
+
+# Blocked in the farm and so in every instance, which waits for its own
+FARM_SIGNALS = (signal.SIGCHLD, signal.SIGTERM, signal.SIGINT, signal.SIGHUP, signal.SIGUSR1)
+INSTANCE_SIGNALS = (signal.SIGTERM, signal.SIGINT, signal.SIGUSR1)
+
+
+def instance_name(n):
+    return 's{:02d}'.format(n + 1)
+
+
+def megabytes(size):
+    return '{:.1f}MB'.format(size / (1024 * 1024))
+
+
+def probe(port, host_header=None, timeout=PROBE_TIMEOUT):
+    """Whether an instance answers the health endpoint on `port`"""
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+    try:
+        headers = {'Host': host_header} if host_header else {}
+        connection.request('GET', metrics.HEALTH_PATH, headers=headers)
+        return connection.getresponse().status == 200
+    except (OSError, http.client.HTTPException):
+        return False
+    finally:
+        connection.close()
+
+
+def read_pid(path):
+    """PID stored in `path` if that process is still alive, else None"""
+    try:
+        with open(path) as f:
+            pid = int(f.read().strip())
+        os.kill(pid, 0)
+    except (OSError, ValueError):
+        return None
+    return pid
+
+
+def write_file(path, data):
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def remove(path):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+class Instance:
+    """One student's lab: its listeners, its directory and the process serving it"""
+
+    def __init__(self, name, listeners, wsgi_apps, directory, domain=None):
+        self.name = name
+        self.listeners = listeners   # [(app name or vhosts.NAME, socket)]
+        self.wsgi_apps = wsgi_apps   # what each listener serves, built in the farm
+        self.directory = directory
+        self.domain = domain         # Host suffix in --vhosts mode
+        self.pid = None
+        self.forked = 0.0
+        self.restart_at = None
+
+    @property
+    def pid_path(self):
+        return os.path.join(self.directory, 'instance.pid')
+
+    @property
+    def ports(self):
+        return {target: listener.getsockname()[1] for target, listener in self.listeners}
+
+    def close(self):
+        for _, listener in self.listeners:
+            listener.close()
+
+
+def serve(instance, instances, options):
+    """Body of a forked instance process: serve until reset or stopped, never returns"""
+    code = 1
+    try:
+        for other in instances:
+            if other is not instance:
+                other.close()
+        os.makedirs(instance.directory, exist_ok=True)
+        for name in options.apps:
+            apps.isolate(name, instance.directory)
+        if scoreboard.board_path():
+            scoreboard.use(os.path.join(instance.directory, 'scoreboard'))
+
+        servers = []
+        for (target, listener), wsgi in zip(instance.listeners, instance.wsgi_apps):
+            httpd = server.PooledWSGIServer(options.host, listener.getsockname()[1], wsgi,
+                                            options.threads, fd=listener.fileno())
+            servers.append(httpd)
+            threading.Thread(target=httpd.serve_forever, daemon=True,
+                             name='lab-farm-{}'.format(target)).start()
+        print("[farm {}] {} ready in {:.1f}ms".format(
+            os.getpid(), instance.name, (time.monotonic() - instance.forked) * 1000), flush=True)
+
+        # Signals stay blocked (inherited from the farm) and are taken here
+        sig = signal.sigwait(INSTANCE_SIGNALS)
+        if sig == signal.SIGUSR1:
+            code = RESET_EXIT
+            return
+        # Same graceful stop as a worker of labkit.server
+        for httpd in servers:
+            httpd.draining = True
+            httpd.shutdown()
+        server.drain(servers, options.graceful_timeout)
+        metrics.flush()
+        profiler.flush()
+        requestlog.close()
+        code = 0
+    except BaseException:
+        import traceback
+        traceback.print_exc()
+    finally:
+        os._exit(code)
+
+
+class Farm:
+    """Warm parent process forking and re-forking the instances"""
+
+    def __init__(self, options):
+        self.options = options
+        self.instances = []
+        self.wsgi_apps = {}
+        self.by_pid = {}
+        self.stopping = False
+        self.state_path = os.path.join(options.dir, STATE_FILE)
+
+    def log(self, message):
+        print("[farm {}] {}".format(os.getpid(), message), flush=True)
+
+    def prepare(self):
+        """Import and warm up every app"""
+        began = time.monotonic()
+        for name in self.options.apps:
+            apps.warm_up(name)
+            self.wsgi_apps[name] = apps.wsgi_app(apps.load_app(name))
+        self.log("{} apps loaded in {:.0f}ms, parent RSS {}".format(
+            len(self.options.apps), (time.monotonic() - began) * 1000, megabytes(procstats.rss())))
+
+    def listen(self, port):
+        options = self.options
+        family = socket.AF_INET6 if ':' in options.host else socket.AF_INET
+        listener = socket.socket(family, socket.SOCK_STREAM)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        listener.bind((options.host, port))
+        listener.listen(options.backlog)
+        listener.set_inheritable(True)
+        return listener
+
+    def bind(self):
+        options = self.options
+        port = options.base_port
+        for n in range(options.instances):
+            name = instance_name(n)
+            directory = os.path.join(options.dir, name)
+            if options.vhosts:
+                domain = '{}.{}'.format(name, apps.DOMAIN)
+                listeners = [(vhosts.NAME, self.listen(port))]
+                wsgi_apps = [vhosts.build(domain, options.apps)]
+                port += 1
+            else:
+                domain = None
+                listeners = []
+                for app_name in options.apps:
+                    listeners.append((app_name, self.listen(port)))
+                    port += 1
+                wsgi_apps = [self.wsgi_apps[app_name] for app_name in options.apps]
+            self.instances.append(Instance(name, listeners, wsgi_apps, directory, domain))
+
+    def spawn(self, instance):
+        instance.forked = time.monotonic()
+        pid = os.fork()
+        if pid == 0:
+            serve(instance, self.instances, self.options)
+        instance.pid = pid
+        instance.restart_at = None
+        self.by_pid[pid] = instance
+        os.makedirs(instance.directory, exist_ok=True)
+        write_file(instance.pid_path, '{}\n'.format(pid))
+        return pid
+
+    def reset(self, instances=None):
+        for instance in instances or self.instances:
+            if instance.pid is not None:
+                try:
+                    os.kill(instance.pid, signal.SIGUSR1)
+                except ProcessLookupError:
+                    pass
+
+    def reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            instance = self.by_pid.pop(pid, None)
+            if instance is None or self.stopping:
+                continue
+            instance.pid = None
+            code = procstats.exit_code(status)
+            if code == RESET_EXIT:
+                began = time.monotonic()
+                self.spawn(instance)
+                self.log("{} reset, forked again in {:.1f}ms".format(
+                    instance.name, (time.monotonic() - began) * 1000))
+            else:
+                self.log("{} exited with status {}, restarting in {:.0f}s".format(
+                    instance.name, code, RESTART_DELAY))
+                instance.restart_at = time.monotonic() + RESTART_DELAY
+
+    def restart_due(self):
+        now = time.monotonic()
+        for instance in self.instances:
+            if instance.pid is None and instance.restart_at is not None and now >= instance.restart_at:
+                self.spawn(instance)
+
+    def write_state(self):
+        state = {
+            'pid': os.getpid(),
+            'vhosts': self.options.vhosts,
+            'instances': {instance.name: {'ports': instance.ports, 'directory': instance.directory,
+                                          'domain': instance.domain}
+                          for instance in self.instances},
+        }
+        write_file(self.state_path, json.dumps(state, indent=2))
+
+    def run(self):
+        signal.pthread_sigmask(signal.SIG_BLOCK, FARM_SIGNALS)
+        os.makedirs(self.options.dir, exist_ok=True)
+        requestlog.enable()
+        self.prepare()
+        self.bind()
+        gc.collect()
+        # Objects created so far are never scanned again: a collection in an
+        # instance would otherwise write to (and so copy) every shared page
+        gc.freeze()
+        self.write_state()
+        began = time.monotonic()
+        for instance in self.instances:
+            self.spawn(instance)
+        self.log("forked {} instances in {:.0f}ms".format(
+            len(self.instances), (time.monotonic() - began) * 1000))
+        for instance in self.instances:
+            self.log("{}: {}".format(instance.name, ', '.join(
+                '{} {}'.format(instance.domain or target, port) for target, port in instance.ports.items())))
+        try:
+            while True:
+                info = signal.sigtimedwait(FARM_SIGNALS, 1.0)
+                sig = info.si_signo if info else None
+                if sig in (signal.SIGTERM, signal.SIGINT):
+                    break
+                if sig in (signal.SIGHUP, signal.SIGUSR1):
+                    self.log("resetting every instance")
+                    self.reset()
+                self.reap()
+                self.restart_due()
+        finally:
+            self.shutdown()
+        return 0
+
+    def shutdown(self):
+        self.stopping = True
+        running = [instance for instance in self.instances if instance.pid is not None]
+        self.log("stopping {} instances".format(len(running)))
+        for instance in running:
+            try:
+                os.kill(instance.pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + self.options.graceful_timeout + 1
+        while self.by_pid and time.monotonic() < deadline:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid:
+                self.by_pid.pop(pid, None)
+            else:
+                time.sleep(0.05)
+        for pid in list(self.by_pid):
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        for instance in self.instances:
+            instance.close()
+            remove(instance.pid_path)
+        remove(self.state_path)
+
+
+# Commands
+
+def load_state(options):
+    """The running farm's state file, None (with a message) when there is none"""
+    try:
+        with open(os.path.join(options.dir, STATE_FILE)) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        state = None
+    if state is None or read_pid(os.path.join(options.dir, 'farm.pid')) != state['pid']:
+        print("Farm not running")
+        return None
+    return state
+
+
+def run(options):
+    farm = Farm(options)
+    pid_path = os.path.join(options.dir, 'farm.pid')
+    pid = read_pid(pid_path)
+    if pid is not None:
+        print("Farm already running (PID: {})".format(pid))
+        return 1
+    os.makedirs(options.dir, exist_ok=True)
+    write_file(pid_path, '{}\n'.format(os.getpid()))
+    try:
+        return farm.run()
+    finally:
+        remove(pid_path)
+
+
+def status(options):
+    state = load_state(options)
+    if state is None:
+        return 1
+    parent_rss = procstats.rss(state['pid'])
+    print("{:<10} {:<8} {:<24} {:>10} {:>10}".format('instance', 'pid', 'ports', 'rss', 'uss'))
+    print("{:<10} {:<8} {:<24} {:>10} {:>10}".format(
+        'farm', state['pid'], '', megabytes(parent_rss), megabytes(procstats.uss(state['pid']))))
+    total_rss = total_uss = 0
+    for name, instance in sorted(state['instances'].items()):
+        pid = read_pid(os.path.join(instance['directory'], 'instance.pid'))
+        ports = sorted(instance['ports'].values())
+        ports = '{}-{}'.format(ports[0], ports[-1]) if len(ports) > 1 else str(ports[0])
+        rss = procstats.rss(pid) if pid else 0
+        uss = procstats.uss(pid) if pid else 0
+        total_rss += rss
+        total_uss += uss
+        print("{:<10} {:<8} {:<24} {:>10} {:>10}".format(
+            name, pid or '-', ports, megabytes(rss), megabytes(uss)))
+    count = len(state['instances'])
+    print("{} instances: farm RSS + instance USS = {} ({} per instance); "
+          "the instances' summed RSS would be {}".format(
+              count, megabytes(parent_rss + total_uss), megabytes(total_uss / max(count, 1)),
+              megabytes(total_rss)))
+    return 0
+
+
+def reset(options):
+    state = load_state(options)
+    if state is None:
+        return 1
+    names = options.instances or sorted(state['instances'])
+    failed = 0
+    for name in names:
+        instance = state['instances'].get(name)
+        if instance is None:
+            print("Unknown instance '{}' (expected one of: {})".format(
+                name, ', '.join(sorted(state['instances']))))
+            failed += 1
+            continue
+        pid_path = os.path.join(instance['directory'], 'instance.pid')
+        old = read_pid(pid_path)
+        began = time.monotonic()
+        if old is not None:
+            os.kill(old, signal.SIGUSR1)
+        port = min(instance['ports'].values())
+        deadline = began + options.timeout
+        while time.monotonic() < deadline:
+            pid = read_pid(pid_path)
+            if pid is not None and pid != old and probe(port, instance['domain']):
+                print("{} reset in {:.1f}ms (PID: {})".format(name, (time.monotonic() - began) * 1000, pid))
+                break
+            time.sleep(0.002)
+        else:
+            print("{} not serving again after {:.0f}s".format(name, options.timeout))
+            failed += 1
+    return 1 if failed else 0
+
+
+def stop(options):
+    pid = read_pid(os.path.join(options.dir, 'farm.pid'))
+    if pid is None:
+        print("Farm not running")
+        return 0
+    os.kill(pid, signal.SIGTERM)
+    deadline = time.monotonic() + options.graceful_timeout + 5
+    while time.monotonic() < deadline:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            print("Stopped (PID: {})".format(pid))
+            return 0
+        time.sleep(0.1)
+    print("Farm (PID: {}) still running after {:.0f}s".format(pid, options.graceful_timeout + 5))
+    return 1
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Serve one lab instance per student from forks of a warm parent')
+    parser.add_argument('--dir', default=FARM_DIR, help='state and instance data (default {})'.format(FARM_DIR))
+    parser.add_argument('--graceful-timeout', type=float, default=10.0,
+                        help='seconds for instances to finish their requests when stopping')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='start the farm in the foreground')
+    run_parser.add_argument('apps', nargs='*', default=list(apps.APPS), help='apps per instance (default: all)')
+    run_parser.add_argument('-n', '--instances', type=int, default=2)
+    run_parser.add_argument('--base-port', type=int, default=6000,
+                            help='first port; each instance takes one per app (one with --vhosts)')
+    run_parser.add_argument('--vhosts', action='store_true',
+                            help='one port per instance, apps routed on <instance>.{} hosts'.format(apps.DOMAIN))
+    run_parser.add_argument('--host', default='127.0.0.1')
+    run_parser.add_argument('-t', '--threads', type=int, default=int(os.environ.get('LAB_THREADS', 8)),
+                            help='serving threads per app and instance')
+    run_parser.add_argument('--backlog', type=int, default=1024)
+    run_parser.set_defaults(run=run)
+
+    status_parser = commands.add_parser('status', help='memory of the farm and of every instance')
+    status_parser.set_defaults(run=status)
+
+    reset_parser = commands.add_parser('reset', help='re-fork instances from the warm parent')
+    reset_parser.add_argument('instances', nargs='*', help='instances to reset (default: all)')
+    reset_parser.add_argument('--timeout', type=float, default=10.0)
+    reset_parser.set_defaults(run=reset)
+
+    stop_parser = commands.add_parser('stop', help='stop the farm and every instance')
+    stop_parser.set_defaults(run=stop)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    options = parser.parse_args(argv)
+    for name in getattr(options, 'apps', ()):
+        try:
+            apps.get(name)
+        except ValueError as e:
+            parser.error(str(e))
+    try:
+        return options.run(options)
+    except OSError as e:
+        print("Error: {}".format(e), file=sys.stderr)
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
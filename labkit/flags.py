@@ -0,0 +1,27 @@
+"""
+The 7 flag locations of the lab
+
+Kept apart from labkit.validate so the apps can import them without the
+HTTP client (asyncio) that validate needs.
+"""
+from collections import namedtuple
+
+# number, name, app, path, basic auth credentials, expected flag
+FlagCheck = namedtuple('FlagCheck', 'number name app path auth expected')
+
+CHECKS = (
+    FlagCheck(1, 'robots.txt Discovery', 'main-app', '/robots.txt', None,
+              'FLAG{robots_txt_exposed_7a3f}'),
+    FlagCheck(2, 'Backup File Discovery', 'main-app', '/backup/database_backup.sql.old', None,
+              'FLAG{backup_files_found_9b2e}'),
+    FlagCheck(3, 'Git Directory Exposure', 'main-app', '/.git/config', None,
+              'FLAG{git_folder_leaked_4c8d}'),
+    FlagCheck(4, 'Undocumented API Endpoint', 'main-app', '/api/v2/admin/users', None,
+              'FLAG{api_v2_discovered_1e9f}'),
+    FlagCheck(5, 'Dev Subdomain Discovery', 'dev-app', '/', None,
+              'FLAG{dev_subdomain_pwned_5f2a}'),
+    FlagCheck(6, 'Staging Environment phpinfo', 'staging-app', '/phpinfo.php', None,
+              'FLAG{staging_env_exposed_8g3b}'),
+    FlagCheck(7, 'Admin Portal Access', 'admin-app', '/dashboard', ('admin', 'admin123'),
+              'FLAG{admin_portal_found_3h4c}'),
+)
@@ -0,0 +1,270 @@
+"""
+TechCorp CTF Lab - Per-route Request Metrics
+
+Counts requests and records latency histograms per (app, endpoint, status)
+with fixed buckets. Recording is one bisect and a few list increments under
+an uncontended lock, cheap enough to leave on while students fuzz.
+
+Each app hooks in with:
+
+    from labkit import metrics
+    metrics.init_app(app, 'main-app')
+
+which wraps app.wsgi_app, and nothing else: the wrapper times the call,
+takes the status from start_response and the endpoint from the request
+Flask routed, and counts requests that raised as 500s. The Prometheus-style
+text output is served on METRICS_PATH to loopback clients only (it never
+goes through the app's URL map, so it does not show up in route listings or
+fuzzing results). HEALTH_PATH answers `ok` the same way; labkit.supervisor
+polls it to know when a freshly started app is serving.
+
+Across worker processes: when LAB_METRICS_DIR is set (labkit.server sets it
+before forking), every process periodically writes a snapshot there, named
+after its PID and start time, and the metrics endpoint sums all snapshots.
+Snapshots of processes that exited (recycled workers) are folded into one
+retired.json, so totals survive recycling without the directory growing.
+"""
+from bisect import bisect_left
+import fcntl
+import json
+import os
+import threading
+import time
+
+from labkit import procstats
+
+METRICS_PATH = os.environ.get('LAB_METRICS_PATH', '/__lab/metrics')
+HEALTH_PATH = os.environ.get('LAB_HEALTH_PATH', '/__lab/health')
+HEALTH_BODY = b'ok\n'
+METRICS_DIR_ENV = 'LAB_METRICS_DIR'
+FLUSH_INTERVAL = 1.0
+
+# Upper bounds in seconds; the last bucket is +Inf
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+RETIRED = 'retired.json'
+UNMATCHED = '<unmatched>'
+LOCAL_ADDRS = ('127.0.0.1', '::1')
+
+
+class Registry:
+    """
+    Histogram series keyed by (app, endpoint, status)
+    A series is a list: one count per bucket (+Inf last), then the latency sum
+    """
+
+    def __init__(self):
+        self._reset()
+        # Forked workers start empty: inherited numbers were counted by the parent
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self.series = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._flusher = None
+        # PID plus start time: a reused PID never overwrites an earlier process's counts
+        self.snapshot_name = '{}-{}.json'.format(os.getpid(), procstats.start_time())
+
+    def observe(self, app, endpoint, status, seconds):
+        index = bisect_left(BUCKETS, seconds)
+        key = (app, endpoint, status)
+        with self._lock:
+            if self._flusher is None:
+                self._start_flusher()
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [0] * (len(BUCKETS) + 2)
+            series[index] += 1
+            series[-1] += seconds
+            self._dirty = True
+
+    def snapshot(self):
+        with self._lock:
+            return {key: list(series) for key, series in self.series.items()}
+
+    # Cross-process aggregation
+
+    def _start_flusher(self):
+        directory = os.environ.get(METRICS_DIR_ENV)
+        if not directory:
+            self._flusher = False
+            return
+        self._flusher = threading.Thread(target=self._flush_loop, args=(directory,),
+                                         name='lab-metrics-flush', daemon=True)
+        self._flusher.start()
+
+    def _flush_loop(self, directory):
+        while True:
+            time.sleep(FLUSH_INTERVAL)
+            if self._dirty:
+                self._dirty = False
+                self.flush(directory)
+
+    def flush(self, directory):
+        _write_snapshot(os.path.join(directory, self.snapshot_name), self.snapshot())
+
+    def collect(self):
+        """Merged series of this process and every snapshot in LAB_METRICS_DIR"""
+        merged = self.snapshot()
+        directory = os.environ.get(METRICS_DIR_ENV)
+        if not directory:
+            return merged
+        retire(directory)
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            return merged
+        for name in names:
+            if name.endswith('.json') and name != self.snapshot_name:
+                _merge(merged, _read_snapshot(os.path.join(directory, name)))
+        return merged
+
+
+def _read_snapshot(path):
+    try:
+        with open(path) as f:
+            return {tuple(key): series for key, series in json.load(f)}
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_snapshot(path, series):
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump([[list(key), values] for key, values in series.items()], f)
+    os.replace(tmp, path)
+
+
+def _merge(merged, series):
+    for key, values in series.items():
+        current = merged.get(key)
+        merged[key] = values if current is None else [a + b for a, b in zip(current, values)]
+
+
+def _exited(name):
+    """Whether the process that wrote snapshot `name` ('<pid>-<start>.json') is gone"""
+    pid, _, start = name[:-len('.json')].partition('-')
+    try:
+        return procstats.start_time(int(pid)) != int(start)
+    except ValueError:
+        return False
+
+
+def retire(directory=None):
+    """Fold the snapshots of exited processes into RETIRED and delete them"""
+    directory = directory or os.environ.get(METRICS_DIR_ENV)
+    if not directory:
+        return
+    try:
+        with open(os.path.join(directory, '.lock'), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            exited = [name for name in os.listdir(directory)
+                      if name.endswith('.json') and name != RETIRED and _exited(name)]
+            if not exited:
+                return
+            retired_path = os.path.join(directory, RETIRED)
+            retired = _read_snapshot(retired_path)
+            for name in exited:
+                _merge(retired, _read_snapshot(os.path.join(directory, name)))
+            _write_snapshot(retired_path, retired)
+            for name in exited:
+                os.unlink(os.path.join(directory, name))
+    except OSError:
+        pass
+
+
+registry = Registry()
+
+
+def flush():
+    """Write this process's snapshot now (workers call it before exiting)"""
+    directory = os.environ.get(METRICS_DIR_ENV)
+    if directory:
+        registry.flush(directory)
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"')
+
+
+def render(series):
+    """Prometheus text exposition of merged series"""
+    lines = [
+        '# HELP lab_requests_total Requests handled, by app, endpoint and status.',
+        '# TYPE lab_requests_total counter',
+    ]
+    items = sorted(series.items())
+    for (app, endpoint, status), values in items:
+        lines.append('lab_requests_total{{app="{}",endpoint="{}",status="{}"}} {}'.format(
+            _label(app), _label(endpoint), status, sum(values[:-1])))
+
+    lines += [
+        '# HELP lab_request_duration_seconds Request latency, by app, endpoint and status.',
+        '# TYPE lab_request_duration_seconds histogram',
+    ]
+    for (app, endpoint, status), values in items:
+        labels = 'app="{}",endpoint="{}",status="{}"'.format(_label(app), _label(endpoint), status)
+        cumulative = 0
+        for bound, count in zip(BUCKETS + ('+Inf',), values[:-1]):
+            cumulative += count
+            lines.append('lab_request_duration_seconds_bucket{{{},le="{}"}} {}'.format(
+                labels, bound, cumulative))
+        lines.append('lab_request_duration_seconds_sum{{{}}} {:.6f}'.format(labels, values[-1]))
+        lines.append('lab_request_duration_seconds_count{{{}}} {}'.format(labels, cumulative))
+    return '\n'.join(lines) + '\n'
+
+
+def _endpoint(environ):
+    """
+    Endpoint of the request Flask routed, UNMATCHED if none
+    Werkzeug keeps the request in the environ until Flask pops its context
+    """
+    rule = getattr(environ.get('werkzeug.request'), 'url_rule', None)
+    return UNMATCHED if rule is None else rule.endpoint
+
+
+class MetricsMiddleware:
+    """Times every request, and serves METRICS_PATH/HEALTH_PATH to loopback clients"""
+
+    def __init__(self, wsgi_app, name):
+        self.wsgi_app = wsgi_app
+        self.name = name
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO')
+        if (path in (METRICS_PATH, HEALTH_PATH)
+                and environ.get('REMOTE_ADDR') in LOCAL_ADDRS
+                and 'HTTP_X_REAL_IP' not in environ):
+            if path == HEALTH_PATH:
+                start_response('200 OK', [('Content-Type', 'text/plain'),
+                                          ('Content-Length', str(len(HEALTH_BODY)))])
+                return [HEALTH_BODY]
+            body = render(registry.collect()).encode('utf-8')
+            start_response('200 OK', [('Content-Type', 'text/plain; version=0.0.4'),
+                                      ('Content-Length', str(len(body)))])
+            return [body]
+
+        labels = []
+
+        def capture_status(status, headers, exc_info=None):
+            # Called by the response while the request context is still pushed
+            labels.append((_endpoint(environ), int(status[:3])))
+            return start_response(status, headers, exc_info)
+
+        start = time.perf_counter()
+        try:
+            app_iter = self.wsgi_app(environ, capture_status)
+        except BaseException:
+            # Raised out of the app (debug mode propagates exceptions)
+            registry.observe(self.name, UNMATCHED, 500, time.perf_counter() - start)
+            raise
+        endpoint, status = labels[-1] if labels else (UNMATCHED, 500)
+        registry.observe(self.name, endpoint, status, time.perf_counter() - start)
+        return app_iter
+
+
+def init_app(app, name):
+    """Record metrics for every request of `app`, labelled with `name`"""
+    app.wsgi_app = MetricsMiddleware(app.wsgi_app, name)
+    return app
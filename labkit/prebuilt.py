@@ -0,0 +1,104 @@
+"""
+TechCorp CTF Lab - Pre-serialized Constant Responses
+
+Many lab endpoints return the same page or JSON document on every call.
+Declaring them static serializes the body once and serves ready-made bytes
+with an ETag, a gzip variant and conditional request (304) support:
+
+    from labkit.prebuilt import PrebuiltResponse, static_json
+
+    @app.route('/api/v1/status')
+    @static_json(app)
+    def api_v1_status():
+        return {'status': 'operational'}
+
+static_json bodies are produced by the app's own JSON provider on the first
+call, so they are byte-identical to what jsonify() returned per request.
+"""
+from functools import lru_cache, wraps
+import gzip
+import hashlib
+
+from flask import Response, request
+from werkzeug.http import parse_accept_header
+
+MAX_VARIANTS = 32
+
+
+@lru_cache(maxsize=256)
+def accepts_gzip(accept_encoding):
+    """Whether an Accept-Encoding value allows gzip; clients resend the same few values"""
+    return parse_accept_header(accept_encoding)['gzip'] > 0
+
+
+class PrebuiltResponse:
+    """
+    Constant response body built once
+    200 responses carry ETags and a gzip variant; error statuses are served
+    as plain bytes so fuzzers see exactly the same size as before
+    """
+
+    def __init__(self, body, mimetype, status=200):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self.body = body
+        self.mimetype = mimetype
+        self.status = status
+        self.cacheable = status == 200
+        if not self.cacheable:
+            return
+        gzip_body = gzip.compress(body, mtime=0)
+        # Not worth it for tiny bodies that gzip would make bigger
+        self.gzip_body = gzip_body if len(gzip_body) < len(body) else None
+        digest = hashlib.sha1(body).hexdigest()[:16]
+        self.etag = digest
+        self.gzip_etag = digest + '-gzip'
+        self.headers = [('ETag', '"{}"'.format(digest)), ('Vary', 'Accept-Encoding')]
+        self.gzip_headers = [('Content-Encoding', 'gzip'),
+                             ('ETag', '"{}"'.format(self.gzip_etag)),
+                             ('Vary', 'Accept-Encoding')]
+
+    def response(self):
+        if not self.cacheable:
+            return Response(self.body, self.status, mimetype=self.mimetype)
+
+        environ = request.environ
+        accept_encoding = environ.get('HTTP_ACCEPT_ENCODING', '')
+        use_gzip = (self.gzip_body is not None and 'gzip' in accept_encoding
+                    and accepts_gzip(accept_encoding))
+        etag = self.gzip_etag if use_gzip else self.etag
+        headers = self.gzip_headers if use_gzip else self.headers
+
+        if 'HTTP_IF_NONE_MATCH' in environ and request.if_none_match.contains_weak(etag):
+            # Like make_conditional: no body, no Content-Encoding
+            return Response(status=304, headers=[h for h in headers if h[0] != 'Content-Encoding'])
+        return Response(self.gzip_body if use_gzip else self.body, mimetype=self.mimetype,
+                        headers=headers)
+
+
+def static_json(app, status=200, key=None):
+    """
+    Decorator for views returning a constant JSON-serializable value
+    The value is serialized on the first call and reused afterwards. `key`
+    (called per request) keeps one body per key for values that only vary
+    with a few inputs, e.g. the authenticated user
+    """
+
+    def decorator(view):
+        variants = {}
+
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            variant = key() if key is not None else None
+            prebuilt = variants.get(variant)
+            if prebuilt is None:
+                body = app.json.response(view(*args, **kwargs)).get_data()
+                prebuilt = PrebuiltResponse(body, app.json.mimetype, status)
+                if len(variants) >= MAX_VARIANTS:
+                    variants.clear()
+                variants[variant] = prebuilt
+            return prebuilt.response()
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,81 @@
+"""
+Process memory statistics read from /proc (Linux), and exit status decoding
+
+RSS counts every resident page, including pages shared copy-on-write with a
+parent; USS (unique set size) only counts pages private to the process, which
+is what a forked worker really costs.
+"""
+import os
+
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def rss(pid='self'):
+    """Resident set size in bytes, 0 if the process is gone"""
+    try:
+        with open('/proc/{}/statm'.format(pid)) as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return 0
+
+
+def uss(pid='self'):
+    """Unique set size in bytes (private clean + private dirty pages)"""
+    total = 0
+    try:
+        with open('/proc/{}/smaps_rollup'.format(pid)) as f:
+            for line in f:
+                if line.startswith(('Private_Clean:', 'Private_Dirty:')):
+                    total += int(line.split()[1]) * 1024
+    except (OSError, IndexError, ValueError):
+        return 0
+    return total
+
+
+def start_time(pid='self'):
+    """Start time of a process in clock ticks since boot, 0 if it is gone"""
+    try:
+        with open('/proc/{}/stat'.format(pid)) as f:
+            # Fields after the command name, which may itself contain ')'
+            return int(f.read().rpartition(')')[2].split()[19])
+    except (OSError, IndexError, ValueError):
+        return 0
+
+
+def children(pid):
+    """Direct children of a process"""
+    found = []
+    try:
+        tasks = os.listdir('/proc/{}/task'.format(pid))
+    except OSError:
+        return found
+    for task in tasks:
+        try:
+            with open('/proc/{}/task/{}/children'.format(pid, task)) as f:
+                found.extend(int(child) for child in f.read().split())
+        except OSError:
+            continue
+    return found
+
+
+def tree(pid):
+    """The process and all of its descendants"""
+    pids = [pid]
+    for child in children(pid):
+        pids.extend(tree(child))
+    return pids
+
+
+def tree_rss(pid):
+    """Summed RSS of a process tree (shared pages counted once per process)"""
+    return sum(rss(p) for p in tree(pid))
+
+
+def exit_code(status):
+    """
+    Exit code of an os.waitpid() status, -N for a process killed by signal N
+    Same as os.waitstatus_to_exitcode, which only exists from Python 3.9
+    """
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
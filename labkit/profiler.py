@@ -0,0 +1,284 @@
+"""
+TechCorp CTF Lab - Sampling Profiler
+
+Opt-in view of where request time goes when an app gets slow during a
+class. Each app hooks in with:
+
+    from labkit import profiler
+    profiler.init_app(app, 'main-app')
+
+With LAB_PROFILE=N, one request in N is followed: before_request registers
+the serving thread under the request's endpoint, teardown_request removes
+it. A sampler thread (one per worker, started by the first sampled request)
+takes the stack of every followed thread LAB_PROFILE_HZ times per second,
+keeps only the frames above Flask's dispatch, and counts identical stacks
+per endpoint. Every LAB_PROFILE_DUMP seconds (and when the worker exits)
+the counts are written as collapsed stacks, the input format of
+flamegraph.pl, speedscope and inferno:
+
+    logs/profiles/<app>.<pid>.collapsed
+    index;main-app/app.py:index;flask/templating.py:render_template;... 42
+
+Without LAB_PROFILE nothing is registered, so requests run exactly as before.
+
+Settings (environment):
+    LAB_PROFILE        sample 1 request in N ('' or '0' disables, the default)
+    LAB_PROFILE_HZ     stack samples per second of a followed request (default 200)
+    LAB_PROFILE_DUMP   seconds between dumps (default 30)
+    LAB_PROFILE_DIR    output directory (default logs/profiles)
+
+Usage:
+    LAB_PROFILE=10 ./start_all_services.sh
+    python3 -m labkit.profiler main-app > main-app.collapsed   (all workers merged)
+    python3 -m labkit.profiler --summary
+    flamegraph.pl main-app.collapsed > main-app.svg
+"""
+import argparse
+import atexit
+import glob
+import itertools
+import os
+import sys
+import threading
+import time
+
+from flask import Flask, request
+
+from labkit import apps
+
+EVERY = int(os.environ.get('LAB_PROFILE', '0') or 0)
+HZ = float(os.environ.get('LAB_PROFILE_HZ', 200))
+DUMP_INTERVAL = float(os.environ.get('LAB_PROFILE_DUMP', 30))
+PROFILE_DIR = os.environ.get('LAB_PROFILE_DIR', os.path.join(apps.ROOT, 'logs', 'profiles'))
+
+SUFFIX = '.collapsed'
+UNMATCHED = '<unmatched>'   # requests that matched no route (404/405)
+
+# Stacks are cut at the frame dispatching the request: server and WSGI
+# frames below it are the same for every request
+DISPATCH_CODE = Flask.full_dispatch_request.__code__
+
+_labels = {}   # code object -> frame label
+
+
+def frame_label(code):
+    """'main-app/app.py:index', 'flask/app.py:Flask.dispatch_request', ..."""
+    label = _labels.get(code)
+    if label is None:
+        filename = code.co_filename
+        if os.sep + 'site-packages' + os.sep in filename:
+            filename = filename.split(os.sep + 'site-packages' + os.sep, 1)[1]
+        elif filename.startswith(apps.ROOT + os.sep):
+            filename = os.path.relpath(filename, apps.ROOT)
+        else:
+            filename = os.path.basename(filename)
+        # co_qualname (Class.method) is new in Python 3.11
+        label = '{}:{}'.format(filename, getattr(code, 'co_qualname', code.co_name))
+        # ';' separates frames and ' ' the count in the collapsed format
+        label = _labels[code] = label.replace(';', '_').replace(' ', '_')
+    return label
+
+
+def collapse(frame):
+    """Labels of `frame` and its callers down to the request dispatch, root first"""
+    labels = []
+    while frame is not None:
+        code = frame.f_code
+        if code is DISPATCH_CODE:
+            break
+        labels.append(frame_label(code))
+        frame = frame.f_back
+    labels.reverse()
+    return ';'.join(labels)
+
+
+class Profiler:
+    """Stack samples of the followed requests of one app in this process"""
+
+    def __init__(self, name, every=EVERY, hz=HZ, dump_interval=DUMP_INTERVAL, directory=PROFILE_DIR):
+        self.name = name
+        self.every = every
+        self.interval = 1.0 / hz
+        self.dump_interval = dump_interval
+        self.directory = directory
+        self._reset()
+        # Forked workers start with no samples and no thread of their own
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self.counts = {}           # 'endpoint;frame;frame' -> samples
+        self.active = {}           # thread ident -> endpoint of its followed request
+        self._counter = itertools.count()
+        self._busy = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._dumped = 0
+
+    @property
+    def path(self):
+        return os.path.join(self.directory, '{}.{}{}'.format(self.name, os.getpid(), SUFFIX))
+
+    def begin(self, endpoint):
+        """Follow the current request if it is the 1 in N"""
+        if next(self._counter) % self.every:
+            return
+        if self._thread is None:
+            self._start()
+        self.active[threading.get_ident()] = endpoint or UNMATCHED
+        if not self._busy.is_set():
+            self._busy.set()
+
+    def end(self):
+        self.active.pop(threading.get_ident(), None)
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True,
+                                                name='lab-profiler-{}'.format(self.name))
+                self._thread.start()
+
+    def _run(self):
+        counts = self.counts
+        next_dump = time.monotonic() + self.dump_interval
+        while True:
+            active = self.active.copy()
+            if active:
+                frames = sys._current_frames()
+                for ident, endpoint in active.items():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        key = endpoint + ';' + collapse(frame)
+                        counts[key] = counts.get(key, 0) + 1
+                del frames, frame
+                time.sleep(self.interval)
+            else:
+                # Idle until a followed request starts or the next dump is due
+                self._busy.clear()
+                if not self.active:
+                    self._busy.wait(max(0.0, next_dump - time.monotonic()))
+            if time.monotonic() >= next_dump:
+                self.dump()
+                next_dump = time.monotonic() + self.dump_interval
+
+    def dump(self):
+        """Write the samples so far (if any new) to self.path"""
+        counts = self.counts.copy()
+        total = sum(counts.values())
+        if total == self._dumped:
+            return
+        path = self.path
+        tmp = path + '.tmp'
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(tmp, 'w') as f:
+                f.writelines('{} {}\n'.format(stack, n) for stack, n in sorted(counts.items()))
+            os.replace(tmp, path)
+            self._dumped = total
+        except OSError:
+            pass
+
+
+_profilers = []
+
+
+@atexit.register
+def flush():
+    """Dump the samples of every profiler of this process (workers call it before exiting)"""
+    for profiler in _profilers:
+        profiler.dump()
+
+
+def init_app(app, name):
+    """Profile 1 in LAB_PROFILE requests of `app` (no-op when unset)"""
+    if EVERY <= 0:
+        return app
+    profiler = Profiler(name)
+    _profilers.append(profiler)
+
+    @app.before_request
+    def start_profiling():
+        profiler.begin(request.endpoint)
+
+    @app.teardown_request
+    def stop_profiling(exc=None):
+        profiler.end()
+
+    return app
+
+
+# Reading the dumps
+
+def read(paths):
+    """Merged 'stack' -> samples of collapsed-stack files"""
+    counts = {}
+    for path in paths:
+        with open(path) as f:
+            for line in f:
+                stack, _, n = line.rstrip('\n').rpartition(' ')
+                if stack and n.isdigit():
+                    counts[stack] = counts.get(stack, 0) + int(n)
+    return counts
+
+
+def dump_paths(directory, names):
+    paths = []
+    for name in names:
+        paths += glob.glob(os.path.join(glob.escape(directory), '{}.*{}'.format(name, SUFFIX)))
+    return sorted(paths)
+
+
+def print_summary(counts, top):
+    """Samples per endpoint, then the frames with the most samples on top of the stack"""
+    total = sum(counts.values()) or 1
+    endpoints = {}
+    leaves = {}
+    for stack, n in counts.items():
+        frames = stack.split(';')
+        endpoints[frames[0]] = endpoints.get(frames[0], 0) + n
+        leaves[frames[-1]] = leaves.get(frames[-1], 0) + n
+    print("{:>8} {:>6}  {}".format('samples', '%', 'endpoint'))
+    for endpoint, n in sorted(endpoints.items(), key=lambda item: -item[1])[:top]:
+        print("{:>8} {:>6.1f}  {}".format(n, 100.0 * n / total, endpoint))
+    print()
+    print("{:>8} {:>6}  {}".format('samples', '%', 'innermost frame'))
+    for leaf, n in sorted(leaves.items(), key=lambda item: -item[1])[:top]:
+        print("{:>8} {:>6.1f}  {}".format(n, 100.0 * n / total, leaf))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Merge the sampling profiler dumps of the lab apps')
+    parser.add_argument('apps', nargs='*', default=list(apps.APPS), help='apps to include (default: all)')
+    parser.add_argument('--dir', default=PROFILE_DIR, help='dump directory (default {})'.format(PROFILE_DIR))
+    parser.add_argument('--endpoint', help='only stacks of this endpoint')
+    parser.add_argument('--summary', action='store_true',
+                        help='print the busiest endpoints and frames instead of collapsed stacks')
+    parser.add_argument('--top', type=int, default=20, help='rows per --summary table')
+    parser.add_argument('--clear', action='store_true', help='delete the dumps')
+    return parser
+
+
+def main(argv=None):
+    options = build_parser().parse_args(argv)
+    paths = dump_paths(options.dir, options.apps)
+    if options.clear:
+        for path in paths:
+            os.unlink(path)
+        print("Removed {} profile dumps".format(len(paths)))
+        return 0
+    if not paths:
+        print("No profile dumps in {} (is LAB_PROFILE set?)".format(options.dir), file=sys.stderr)
+        return 1
+    counts = read(paths)
+    if options.endpoint:
+        prefix = options.endpoint + ';'
+        counts = {stack: n for stack, n in counts.items() if stack.startswith(prefix)}
+    if options.summary:
+        print_summary(counts, options.top)
+    else:
+        sys.stdout.writelines('{} {}\n'.format(stack, n) for stack, n in sorted(counts.items()))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
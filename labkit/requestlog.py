@@ -0,0 +1,326 @@
+"""
+TechCorp CTF Lab - Structured Request Log
+
+Writes one JSON line per request (time, app, client IP, host, method, path,
+status, bytes, latency) so progress can be followed without parsing nginx
+logs. Each app hooks in with:
+
+    from labkit import requestlog
+    requestlog.init_app(app, 'main-app')
+
+Requests never touch the disk: init_app wraps app.wsgi_app, and the wrapper
+only appends a tuple to a bounded deque (status and size are taken from
+start_response, so requests that raise are logged too, as 500s). A
+background thread drains the deque every FLUSH_INTERVAL, serializes a batch
+and writes it with a single write() call. When the deque is full the record
+is dropped and counted; the count is written to the log as a `dropped` line.
+
+Files are logs/<app>.requests.jsonl, rotated by size and age. Rotated
+segments get a timestamp suffix and, one rotation later (so workers still
+holding the old file can finish their last batch), are gzipped. Workers of
+the same app share a file: writes are O_APPEND and rotation is serialized
+with a lock file.
+
+Only labkit.server and labkit.farm turn the writer on (enable()); apps
+imported anywhere else (test clients, in-process benchmarks) log nothing
+unless LAB_REQUEST_LOG_DIR is set.
+
+Environment:
+    LAB_REQUEST_LOG_DIR        directory for the logs ('' disables; enable() makes
+                               it default to logs/)
+    LAB_REQUEST_LOG_MAX_BYTES  rotate above this size (default 64MB)
+    LAB_REQUEST_LOG_MAX_AGE    rotate after this many seconds (default 3600, 0 = never)
+    LAB_REQUEST_LOG_BACKUPS    rotated segments kept (default 10)
+    LAB_REQUEST_LOG_GZIP       compress rotated segments (default 1)
+    LAB_TRUST_PROXY            '1' when the apps are served behind the nginx proxy:
+                               X-Real-IP from loopback is then the client address
+                               (default 0, see client_ip())
+"""
+from collections import deque
+import atexit
+import fcntl
+import glob
+import gzip
+import json
+import os
+import shutil
+import threading
+import time
+
+from labkit import apps
+
+LOG_DIR_ENV = 'LAB_REQUEST_LOG_DIR'
+DEFAULT_LOG_DIR = os.path.join(apps.ROOT, 'logs')
+MAX_BYTES = int(os.environ.get('LAB_REQUEST_LOG_MAX_BYTES', 64 * 1024 * 1024))
+MAX_AGE = float(os.environ.get('LAB_REQUEST_LOG_MAX_AGE', 3600))
+BACKUPS = int(os.environ.get('LAB_REQUEST_LOG_BACKUPS', 10))
+COMPRESS = os.environ.get('LAB_REQUEST_LOG_GZIP', '1') not in ('', '0', 'false', 'no')
+
+QUEUE_SIZE = 10000
+BATCH_SIZE = 512
+FLUSH_INTERVAL = 0.5
+
+FIELDS = ('ts', 'app', 'ip', 'host', 'method', 'path', 'status', 'bytes', 'latency_ms')
+LOCAL_ADDRS = ('127.0.0.1', '::1')
+# Only behind the proxy does a loopback peer speak for the client; otherwise
+# anyone on the lab host could pick any address by setting X-Real-IP
+TRUSTED_PROXIES = LOCAL_ADDRS if os.environ.get('LAB_TRUST_PROXY', '0') != '0' else ()
+
+_quote = json.encoder.encode_basestring_ascii
+LINE = ('{{"ts":{:.3f},"app":{},"ip":{},"host":{},"method":{},"path":{},'
+        '"status":{},"bytes":{},"latency_ms":{:.3f}}}')
+
+
+def format_record(ts, app, ip, host, method, path, status, size, latency):
+    """One JSON line; same output as json.dumps of the fields, a few times faster"""
+    # WSGI paths are latin-1 decoded bytes; log what the client actually sent
+    path = path.encode('latin-1', 'replace').decode('utf-8', 'replace')
+    return LINE.format(ts, _quote(app), 'null' if ip is None else _quote(ip), _quote(host), _quote(method),
+                       _quote(path), status, 'null' if size is None else size, latency)
+
+
+class RequestLog:
+    """Bounded deque of request records drained to a rotating file by a background thread"""
+
+    def __init__(self, path, max_bytes=MAX_BYTES, max_age=MAX_AGE, backups=BACKUPS,
+                 compress=COMPRESS, queue_size=QUEUE_SIZE, batch_size=BATCH_SIZE):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.backups = backups
+        self.compress = compress
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self._reset()
+        # Forked workers get their own queue, thread and file handle
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self.records = deque()
+        self.dropped = 0
+        self._reported = 0
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._file = None
+        self._opened_at = 0.0
+
+    def log(self, record):
+        """Queue a record (a tuple in FIELDS order); never blocks"""
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='lab-request-log',
+                                                    daemon=True)
+                    self._thread.start()
+        # deque.append is atomic: no lock on the request path
+        if len(self.records) < self.queue_size:
+            self.records.append(record)
+        else:
+            with self._lock:
+                self.dropped += 1
+
+    def close(self):
+        """Write everything still queued and close the file"""
+        thread = self._thread
+        if thread is None:
+            return
+        self._stopping.set()
+        thread.join(5)
+
+    # Writer thread
+
+    def _run(self):
+        records = self.records
+        while True:
+            stopping = self._stopping.is_set()
+            batch = []
+            while records and len(batch) < self.batch_size:
+                batch.append(records.popleft())
+            if not batch:
+                if stopping:
+                    break
+                self._stopping.wait(FLUSH_INTERVAL)
+                continue
+            try:
+                self._write(batch)
+            except (OSError, ValueError):
+                # Disk full or log dir removed: lose the batch, keep serving
+                with self._lock:
+                    self.dropped += len(batch)
+                self._close_file()
+        self._close_file()
+
+    def _write(self, batch):
+        lines = [format_record(*record) for record in batch]
+        dropped = self.dropped
+        if dropped != self._reported:
+            lines.append(json.dumps({'ts': round(time.time(), 3), 'event': 'dropped',
+                                     'count': dropped - self._reported}))
+            self._reported = dropped
+
+        f = self._current_file()
+        f.write(('\n'.join(lines) + '\n').encode('utf-8'))
+        f.flush()
+        if f.tell() >= self.max_bytes or (
+                self.max_age and time.time() - self._opened_at >= self.max_age):
+            self._rotate()
+
+    def _current_file(self):
+        """The open log file, reopened if another worker rotated it"""
+        f = self._file
+        if f is not None:
+            try:
+                if os.stat(self.path).st_ino == os.fstat(f.fileno()).st_ino:
+                    return f
+            except OSError:
+                pass
+            self._close_file()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        f = self._file = open(self.path, 'ab', buffering=0)
+        self._opened_at = time.time()
+        return f
+
+    def _close_file(self):
+        if self._file is not None:
+            try:
+                self._file.close()
+            except OSError:
+                pass
+            self._file = None
+
+    # Rotation
+
+    def _rotate(self):
+        with open(self.path + '.lock', 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                # Another worker may have rotated while we waited for the lock
+                if os.stat(self.path).st_ino == os.fstat(self._file.fileno()).st_ino:
+                    os.rename(self.path, self._segment_name())
+                    self._compress_and_prune()
+            except OSError:
+                pass
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+        self._close_file()
+
+    def _segment_name(self):
+        base = '{}.{}'.format(self.path, time.strftime('%Y%m%d-%H%M%S'))
+        name, n = base, 0
+        while os.path.exists(name) or os.path.exists(name + '.gz'):
+            n += 1
+            name = '{}.{}'.format(base, n)
+        return name
+
+    def segments(self):
+        """Rotated segments, oldest first"""
+        found = [path for path in glob.glob(glob.escape(self.path) + '.*')
+                 if not path.endswith('.lock')]
+        return sorted(found, key=os.path.getmtime)
+
+    def _compress_and_prune(self):
+        segments = self.segments()
+        if self.compress:
+            # The newest segment may still get a late batch from another worker
+            for path in segments[:-1]:
+                if not path.endswith('.gz'):
+                    with open(path, 'rb') as src, gzip.open(path + '.gz', 'wb') as dst:
+                        shutil.copyfileobj(src, dst)
+                    # Keep the segment's age so ordering and pruning stay right
+                    shutil.copystat(path, path + '.gz')
+                    os.unlink(path)
+            segments = self.segments()
+        for path in segments[:max(0, len(segments) - self.backups)]:
+            os.unlink(path)
+
+
+# path -> RequestLog, so every app in a process (see labkit.vhosts) gets one writer
+_logs = {}
+
+
+def enable():
+    """Log the apps loaded from now on to DEFAULT_LOG_DIR, unless LAB_REQUEST_LOG_DIR is set"""
+    os.environ.setdefault(LOG_DIR_ENV, DEFAULT_LOG_DIR)
+
+
+def log_dir():
+    """Directory the request logs go to, '' when logging is off"""
+    return os.environ.get(LOG_DIR_ENV, '')
+
+
+def get_log(name, directory=None):
+    directory = log_dir() if directory is None else directory
+    path = os.path.join(directory, '{}.requests.jsonl'.format(name))
+    log = _logs.get(path)
+    if log is None:
+        log = _logs[path] = RequestLog(path)
+    return log
+
+
+@atexit.register
+def close():
+    """Flush every request log of this process (workers call it before exiting)"""
+    for log in list(_logs.values()):
+        log.close()
+
+
+def client_ip(environ):
+    """Client address, honouring X-Real-IP set by nginx when LAB_TRUST_PROXY is on"""
+    remote = environ.get('REMOTE_ADDR')
+    if remote in TRUSTED_PROXIES:
+        return environ.get('HTTP_X_REAL_IP', remote)
+    return remote
+
+
+class RequestLogMiddleware:
+    """Queues one record per request of the wrapped app"""
+
+    def __init__(self, wsgi_app, name, log):
+        self.wsgi_app = wsgi_app
+        self.name = name
+        self.log = log
+
+    def __call__(self, environ, start_response):
+        responses = []
+
+        def capture_response(status, headers, exc_info=None):
+            responses.append((status, headers))
+            return start_response(status, headers, exc_info)
+
+        start = time.perf_counter()
+        try:
+            app_iter = self.wsgi_app(environ, capture_response)
+        except BaseException:
+            self.record(environ, 500, None, start)
+            raise
+        if responses:
+            status, headers = responses[-1]
+            size = None
+            for key, value in headers:
+                if key == 'Content-Length':
+                    size = int(value)
+                    break
+            self.record(environ, int(status[:3]), size, start)
+        else:
+            self.record(environ, 500, None, start)
+        return app_iter
+
+    def record(self, environ, status, size, start):
+        latency = (time.perf_counter() - start) * 1000
+        path = environ.get('SCRIPT_NAME', '') + environ.get('PATH_INFO', '')
+        query = environ.get('QUERY_STRING')
+        if query:
+            path += '?' + query
+        self.log.log((time.time(), self.name, client_ip(environ),
+                      environ.get('HTTP_HOST') or environ.get('SERVER_NAME', ''),
+                      environ.get('REQUEST_METHOD', ''), path, status, size, latency))
+
+
+def init_app(app, name, directory=None):
+    """Log every request of `app` to <directory>/<name>.requests.jsonl (see enable())"""
+    directory = log_dir() if directory is None else directory
+    if not directory:
+        return app
+    app.wsgi_app = RequestLogMiddleware(app.wsgi_app, name, get_log(name, directory))
+    return app
@@ -0,0 +1,317 @@
+"""
+TechCorp CTF Lab - Flag Discovery Scoreboard
+
+Live record of which clients reached which of the 7 flag locations
+(labkit.flags), shared by every worker process of all four apps through one
+fixed-size memory-mapped table instead of a database:
+
+    header  magic, version, slot count, generation (bumped by a reset)
+    slot    client address (16 bytes) | family | 7-bit flag mask | first | last
+
+A client's slot is found by hashing its address (crc32, open addressing)
+and then remembered per process, so recording a flag that client already has
+is a dict lookup and one byte read: no lock, no allocation. Only setting a
+new bit (at most 7 times per client) or claiming a slot takes a lock.
+
+Each app hooks in with:
+
+    from labkit import scoreboard
+    scoreboard.init_app(app, 'main-app')
+
+which wraps app.wsgi_app: a request to any other path than the app's flag
+locations costs one dict lookup. admin-app serves the table on
+/api/admin/scoreboard.
+
+Settings (environment):
+    LAB_SCOREBOARD   table file ('' disables recording), default
+                     /dev/shm/techcorp-lab-scoreboard-<uid>-<hash of the lab
+                     directory>, so separate checkouts keep separate tables;
+                     created 0600 and only used when it is a regular file
+                     owned by the lab's user
+
+Each labkit.farm instance switches to a table in its own directory (use()),
+and labkit.bench to a throwaway one.
+
+Usage:
+    python3 -m labkit.scoreboard
+    python3 -m labkit.scoreboard --json
+    python3 -m labkit.scoreboard --reset
+"""
+import argparse
+import fcntl
+import json
+import mmap
+import os
+import socket
+import stat
+import struct
+import sys
+import tempfile
+import threading
+import time
+import zlib
+
+from labkit import apps
+from labkit.flags import CHECKS
+from labkit.requestlog import client_ip
+
+SHM_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+PATH_ENV = 'LAB_SCOREBOARD'
+DEFAULT_PATH = os.path.join(SHM_DIR, 'techcorp-lab-scoreboard-{}-{:08x}'.format(
+    os.getuid(), zlib.crc32(apps.ROOT.encode('utf-8'))))
+
+MAGIC = b'LABSCORE'
+VERSION = 1
+SLOTS = 4096                      # power of two, a few classrooms' worth of clients
+
+HEADER = struct.Struct('<8sIIB')  # magic, version, slots, generation
+HEADER_SIZE = 64
+GENERATION = 16                   # offset of the generation byte
+SLOT = struct.Struct('<16sBBxxII4x')  # address, family, mask, first, last
+MASK = 17                         # offset of the mask byte within a slot
+TIMES = struct.Struct('<I')
+LAST = 24                         # offset of `last` within a slot
+SIZE = HEADER_SIZE + SLOTS * SLOT.size
+
+FAMILIES = {4: socket.AF_INET, 6: socket.AF_INET6}
+MAX_CACHED = 4 * SLOTS
+
+
+def _pack_address(ip):
+    """'10.0.0.5' -> (16 byte key, family), None for anything that is not an address"""
+    try:
+        if ':' in ip:
+            return socket.inet_pton(socket.AF_INET6, ip), 6
+        return socket.inet_pton(socket.AF_INET, ip).ljust(16, b'\0'), 4
+    except (OSError, TypeError):
+        return None
+
+
+def _unpack_address(key, family):
+    return socket.inet_ntop(FAMILIES[family], key if family == 6 else key[:4])
+
+
+class Scoreboard:
+    """
+    The shared table, mapped from `path` (created and initialized on first use)
+    Safe to share with forked children: the mapping is MAP_SHARED
+    """
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        # SHM_DIR is world-writable: never follow a planted symlink or
+        # resize a file somebody else created
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_NOFOLLOW, 0o600)
+        info = os.fstat(fd)
+        if not stat.S_ISREG(info.st_mode) or info.st_uid != os.getuid():
+            os.close(fd)
+            raise PermissionError("{} is not a regular file owned by uid {}".format(path, os.getuid()))
+        self._fd = fd
+        self._reset_locks()
+        with self._locked():
+            if os.fstat(fd).st_size != SIZE:
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, SIZE)
+            self.mm = mmap.mmap(fd, SIZE)
+            magic, version, slots, _ = HEADER.unpack_from(self.mm, 0)
+            if (magic, version, slots) != (MAGIC, VERSION, SLOTS):
+                self.mm[:] = bytes(SIZE)
+                HEADER.pack_into(self.mm, 0, MAGIC, VERSION, SLOTS, 0)
+        os.register_at_fork(after_in_child=self._reset_locks)
+
+    def _reset_locks(self):
+        self._lock = threading.Lock()
+        self._slots = {}  # client ip -> slot offset, valid for self._generation
+        self._generation = None
+
+    def _locked(self):
+        return _FileLock(self._fd, self._lock)
+
+    def _claim(self, ip):
+        """Offset of the slot for `ip`, taking a free one if needed; None when full"""
+        packed = _pack_address(ip)
+        if packed is None:
+            return None
+        key, family = packed
+        mm = self.mm
+        index = zlib.crc32(key) & (SLOTS - 1)
+        with self._locked():
+            for probe in range(SLOTS):
+                offset = HEADER_SIZE + ((index + probe) & (SLOTS - 1)) * SLOT.size
+                slot_family = mm[offset + 16]
+                if slot_family == 0:
+                    now = int(time.time())
+                    SLOT.pack_into(mm, offset, key, family, 0, now, now)
+                    return offset
+                if slot_family == family and mm[offset:offset + 16] == key:
+                    return offset
+        return None
+
+    def record(self, ip, bit):
+        """Note that client `ip` reached the flag with mask `bit`"""
+        mm = self.mm
+        generation = mm[GENERATION]
+        if generation != self._generation:
+            self._slots.clear()
+            self._generation = generation
+        offset = self._slots.get(ip)
+        if offset is None:
+            offset = self._claim(ip)
+            if offset is None:
+                return
+            if len(self._slots) >= MAX_CACHED:
+                self._slots.clear()
+            self._slots[ip] = offset
+        if mm[offset + MASK] & bit:
+            return  # the hot path: already known
+        with self._locked():
+            mm[offset + MASK] |= bit
+            TIMES.pack_into(mm, offset + LAST, int(time.time()))
+
+    def clients(self):
+        """[(ip, mask, first, last)] of every client in the table"""
+        found = []
+        for key, family, mask, first, last in SLOT.iter_unpack(self.mm[HEADER_SIZE:SIZE]):
+            if family:
+                found.append((_unpack_address(key, family), mask, first, last))
+        return found
+
+    def reset(self):
+        """Forget every client; other processes drop their cached slots"""
+        with self._locked():
+            self.mm[HEADER_SIZE:SIZE] = bytes(SIZE - HEADER_SIZE)
+            self.mm[GENERATION] = (self.mm[GENERATION] + 1) & 0xFF
+
+
+class _FileLock:
+    """Thread lock plus flock on the table file, for writes from any process"""
+
+    def __init__(self, fd, lock):
+        self.fd = fd
+        self.lock = lock
+
+    def __enter__(self):
+        self.lock.acquire()
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+
+    def __exit__(self, *exc):
+        fcntl.flock(self.fd, fcntl.LOCK_UN)
+        self.lock.release()
+
+
+_board = None
+
+
+def board_path():
+    """Table file of this process, '' when recording is disabled"""
+    return os.environ.get(PATH_ENV, DEFAULT_PATH)
+
+
+def get():
+    """The process-wide Scoreboard, None when disabled or unavailable"""
+    global _board
+    if _board is None:
+        path = board_path()
+        if path:
+            try:
+                _board = Scoreboard(path)
+            except OSError:
+                return None
+    return _board
+
+
+def use(path):
+    """Switch this process (and its future children) to the table at `path`"""
+    global _board
+    os.environ[PATH_ENV] = path
+    _board = None
+    return get()
+
+
+def summary(board):
+    """JSON-ready scoreboard: clients with the most flags first"""
+    clients = []
+    for ip, mask, first, last in board.clients():
+        numbers = [check.number for check in CHECKS if mask & (1 << (check.number - 1))]
+        clients.append({
+            'ip': ip,
+            'flags': numbers,
+            'found': len(numbers),
+            'first_seen': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(first)),
+            'last_found': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(last)),
+        })
+    clients.sort(key=lambda c: (-c['found'], c['last_found']))
+    flags = [{'number': check.number, 'name': check.name,
+              'clients': sum(check.number in c['flags'] for c in clients)} for check in CHECKS]
+    return {'flags': flags, 'clients': clients}
+
+
+class DiscoveryMiddleware:
+    """Records successful responses to the flag locations served by the wrapped app"""
+
+    def __init__(self, wsgi_app, paths):
+        self.wsgi_app = wsgi_app
+        self.paths = paths
+
+    def __call__(self, environ, start_response):
+        bit = self.paths.get(environ.get('PATH_INFO'))
+        if bit is None:
+            # Every other route: one dict lookup, no hook
+            return self.wsgi_app(environ, start_response)
+
+        def record_discovery(status, headers, exc_info=None):
+            code = int(status[:3])
+            board = get()
+            if board is not None and (code < 300 or code == 304):
+                board.record(client_ip(environ), bit)
+            return start_response(status, headers, exc_info)
+
+        return self.wsgi_app(environ, record_discovery)
+
+
+def init_app(app, name):
+    """Record successful requests to the flag locations served by `app`"""
+    paths = {check.path: 1 << (check.number - 1) for check in CHECKS if check.app == name}
+    if not paths or get() is None:
+        return app
+    app.wsgi_app = DiscoveryMiddleware(app.wsgi_app, paths)
+    return app
+
+
+def print_summary(data):
+    print("{:<40} {:<8} {:<16} {}".format('client', 'flags', 'found', 'last found'))
+    for client in data['clients']:
+        print("{:<40} {:<8} {:<16} {}".format(
+            client['ip'], '{}/{}'.format(client['found'], len(CHECKS)),
+            ','.join(str(number) for number in client['flags']), client['last_found']))
+    print("{} clients; per flag: {}".format(len(data['clients']), ', '.join(
+        '{}:{}'.format(flag['number'], flag['clients']) for flag in data['flags'])))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Show which clients reached which flags')
+    path = board_path()
+    parser.add_argument('--path', default=path, help='scoreboard file (default {})'.format(path))
+    parser.add_argument('--json', action='store_true', help='print the scoreboard as JSON')
+    parser.add_argument('--reset', action='store_true', help='forget every client')
+    return parser
+
+
+def main(argv=None):
+    options = build_parser().parse_args(argv)
+    board = Scoreboard(options.path)
+    if options.reset:
+        board.reset()
+        print("Scoreboard reset")
+        return 0
+    data = summary(board)
+    if options.json:
+        json.dump(data, sys.stdout, indent=2)
+        print()
+    else:
+        print_summary(data)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,417 @@
+"""
+TechCorp CTF Lab - Pre-forked Multi-worker Server
+
+Serves one of the lab apps from a pool of forked worker processes, each
+handling requests on a fixed-size thread pool. The app is imported (and its
+warm_up() hook run) in the master before forking, so workers share the
+loaded code and caches copy-on-write.
+
+Usage:
+    python3 -m labkit.server main-app --workers 4 --threads 8
+    python3 -m labkit.server dev-app --port 5001 --max-requests 10000
+    python3 -m labkit.server all --port 8080   (every vhost, see labkit/vhosts.py)
+
+Signals (sent to the master):
+    SIGHUP           graceful restart - re-import the app, replace workers
+    SIGTERM/SIGINT   graceful shutdown - finish in-flight requests, then exit
+    SIGTTIN/SIGTTOU  add/remove one worker
+"""
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import os
+import random
+import select
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+from werkzeug.wsgi import ClosingIterator
+
+from labkit import apps, metrics, procstats, profiler, requestlog, vhosts
+
+MASTER_SIGNALS = (signal.SIGCHLD, signal.SIGHUP, signal.SIGTERM, signal.SIGINT,
+                  signal.SIGTTIN, signal.SIGTTOU)
+
+
+class KeepAliveRequestHandler(WSGIRequestHandler):
+    """
+    HTTP/1.1 handler that drops connections idle for `timeout`, or for
+    `busy_timeout` while other connections are waiting for a thread
+    Werkzeug ends every response with `Connection: close`, so in practice
+    the wait is the one before a connection's first request (port scanners,
+    clients that connect ahead of time)
+    """
+    protocol_version = 'HTTP/1.1'
+    timeout = 5
+    busy_timeout = 0.5
+
+    def handle_one_request(self):
+        if not self.wait_for_request():
+            self.close_connection = True
+            return
+        super().handle_one_request()
+        if self.server.draining:
+            # Recycling or stopping: answer the current request, then hang up
+            self.close_connection = True
+
+    def wait_for_request(self):
+        """
+        Wait until the client sends something; False to hang up
+        An idle connection holds a pool thread, so it is given up early when
+        the pool is saturated or the server is draining
+        """
+        sock = self.connection
+        # A pipelined request may already be buffered; the socket would not show it
+        sock.settimeout(0.0)
+        try:
+            if self.rfile.peek(1):
+                return True
+        finally:
+            sock.settimeout(self.timeout)
+        poller = select.poll()  # not select(): the farm serves far more than 1024 sockets
+        poller.register(sock, select.POLLIN)
+        idle = 0.0
+        while True:
+            if poller.poll(self.busy_timeout * 1000):
+                return True
+            idle += self.busy_timeout
+            if idle >= self.timeout or self.server.draining or self.server.saturated():
+                return False
+
+    def log_request(self, code='-', size='-'):
+        # No werkzeug access line on stderr per request: labkit.requestlog records
+        # requests off the request path. Errors are still logged
+        pass
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """
+    Werkzeug server that hands accepted connections to a fixed thread pool
+    instead of starting one thread per connection. At most `max_queued`
+    connections wait for a thread (default: one per thread); beyond that it
+    stops accepting, leaving connections in the listen backlog for whichever
+    worker frees up first
+    """
+    multithread = True
+    daemon_threads = True
+    draining = False
+
+    def __init__(self, host, port, app, threads, fd=None, handler=KeepAliveRequestHandler,
+                 max_queued=None):
+        self.threads = threads
+        self.pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='lab-worker')
+        queued = threads if max_queued is None else max_queued
+        self.slots = threading.BoundedSemaphore(threads + queued)
+        self.connections = 0
+        self._lock = threading.Lock()
+        super().__init__(host, port, app, handler=handler, fd=fd)
+
+    def saturated(self):
+        """Whether accepted connections are waiting for a pool thread"""
+        return self.connections > self.threads
+
+    def process_request(self, request, client_address):
+        # Blocks while the queue is full; idle connections give up their
+        # threads within busy_timeout then
+        self.slots.acquire()
+        with self._lock:
+            self.connections += 1
+        self.pool.submit(self._process_request_thread, request, client_address)
+
+    def _process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            with self._lock:
+                self.connections -= 1
+            self.slots.release()
+
+
+class RequestCounter:
+    """
+    WSGI middleware counting requests for worker recycling and tracking
+    in-flight requests for graceful shutdown
+    """
+
+    def __init__(self, app, max_requests, on_limit):
+        self.app = app
+        self.max_requests = max_requests
+        self.on_limit = on_limit
+        self.handled = 0
+        self.active = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, environ, start_response):
+        with self._lock:
+            self.handled += 1
+            self.active += 1
+            limit_reached = self.max_requests and self.handled == self.max_requests
+        try:
+            app_iter = self.app(environ, start_response)
+        except BaseException:
+            self._finished(limit_reached)
+            raise
+        # A request is only done once its body is written: the server calls close() then
+        return ClosingIterator(app_iter, lambda: self._finished(limit_reached))
+
+    def _finished(self, limit_reached):
+        with self._lock:
+            self.active -= 1
+        if limit_reached:
+            self.on_limit()
+
+
+def drain(servers, timeout):
+    """
+    Let `servers` (already shut down, so no longer accepting) finish every
+    connection they accepted: queued ones are still served, keep-alive ones
+    are closed after their current request. Gives up after `timeout` seconds
+    """
+    deadline = time.monotonic() + timeout
+    for httpd in servers:
+        httpd.draining = True
+    for httpd in servers:
+        waiter = threading.Thread(target=httpd.pool.shutdown, daemon=True)
+        waiter.start()
+        waiter.join(max(0.0, deadline - time.monotonic()))
+
+
+class Worker:
+    """A forked worker process serving the shared listening socket"""
+
+    def __init__(self, app, listener, options):
+        self.app = app
+        self.listener = listener
+        self.options = options
+        self.server = None
+        self.counter = None
+        self._stopping = threading.Event()
+
+    def stop(self, *_):
+        if self._stopping.is_set():
+            return
+        self._stopping.set()
+        self.server.draining = True
+        # shutdown() blocks until serve_forever() returns, so never call it inline
+        threading.Thread(target=self.server.shutdown, daemon=True).start()
+
+    def run(self):
+        options = self.options
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        signal.pthread_sigmask(signal.SIG_UNBLOCK, MASTER_SIGNALS)
+
+        max_requests = options.max_requests
+        if max_requests and options.max_requests_jitter:
+            # Spread recycling so workers don't all restart at once
+            max_requests += random.randint(0, options.max_requests_jitter)
+
+        self.counter = RequestCounter(self.app, max_requests, self.stop)
+
+        self.server = PooledWSGIServer(options.host, options.port, self.counter,
+                                       options.threads, fd=self.listener.fileno())
+        try:
+            self.server.serve_forever()
+        finally:
+            self._drain()
+            metrics.flush()
+            profiler.flush()
+            requestlog.close()
+        os._exit(0)
+
+    def _drain(self):
+        drain([self.server], self.options.graceful_timeout)
+
+
+class Master:
+    """
+    Owns the listening socket and keeps `workers` processes running,
+    replacing workers that exit (recycled or crashed)
+    """
+
+    def __init__(self, name, options):
+        self.name = name
+        self.options = options
+        self.num_workers = options.workers
+        self.workers = {}  # pid -> generation
+        self.generation = 0
+        self.app = None
+        self.listener = None
+        self.stopping = False
+
+    def log(self, message):
+        print("[{}] [master {}] {}".format(self.name, os.getpid(), message), flush=True)
+
+    def load(self, reload=False):
+        if self.name == vhosts.NAME:
+            self.app = vhosts.warm_up(reload=reload)
+            return
+        if reload:
+            apps.load_module(self.name, reload=True)
+        self.app = apps.wsgi_app(apps.warm_up(self.name))
+
+    def bind(self):
+        family = socket.AF_INET6 if ':' in self.options.host else socket.AF_INET
+        listener = socket.socket(family, socket.SOCK_STREAM)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        listener.bind((self.options.host, self.options.port))
+        listener.listen(self.options.backlog)
+        listener.set_inheritable(True)
+        self.listener = listener
+        self.options.port = listener.getsockname()[1]
+
+    def spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                Worker(self.app, self.listener, self.options).run()
+            except BaseException:
+                import traceback
+                traceback.print_exc()
+            finally:
+                os._exit(1)
+        self.workers[pid] = self.generation
+        return pid
+
+    def kill_workers(self, pids, sig=signal.SIGTERM):
+        for pid in pids:
+            try:
+                os.kill(pid, sig)
+            except ProcessLookupError:
+                self.workers.pop(pid, None)
+
+    def reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            generation = self.workers.pop(pid, None)
+            if generation is not None:
+                # Its final snapshot is written: fold it into the retired totals
+                metrics.retire()
+            if generation is not None and not self.stopping:
+                code = procstats.exit_code(status)
+                if code != 0:
+                    self.log("worker {} exited with status {}".format(pid, code))
+                    # Avoid a tight fork loop when the app keeps crashing
+                    time.sleep(0.5)
+
+    def manage(self):
+        """Spawn missing workers and retire workers from older generations"""
+        current = [pid for pid, gen in self.workers.items() if gen == self.generation]
+        for _ in range(self.num_workers - len(current)):
+            self.spawn()
+        old = [pid for pid, gen in self.workers.items() if gen != self.generation]
+        self.kill_workers(old)
+        extra = current[self.num_workers:]
+        self.kill_workers(extra)
+
+    def restart(self):
+        self.log("graceful restart (reloading {})".format(self.name))
+        try:
+            self.load(reload=True)
+        except Exception as e:
+            self.log("reload failed, keeping current workers: {}".format(e))
+            return
+        self.generation += 1
+        # Old workers are only told to stop after replacements are forked
+        self.manage()
+
+    def shutdown(self):
+        self.stopping = True
+        self.log("shutting down {} workers".format(len(self.workers)))
+        self.kill_workers(list(self.workers))
+        deadline = time.monotonic() + self.options.graceful_timeout + 1
+        while self.workers and time.monotonic() < deadline:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid:
+                self.workers.pop(pid, None)
+            else:
+                time.sleep(0.05)
+        self.kill_workers(list(self.workers), signal.SIGKILL)
+        self.listener.close()
+
+    def run(self):
+        signal.pthread_sigmask(signal.SIG_BLOCK, MASTER_SIGNALS)
+        requestlog.enable()
+        # Workers write metrics snapshots here so any of them can report totals
+        metrics_dir = None
+        if metrics.METRICS_DIR_ENV not in os.environ:
+            metrics_dir = tempfile.mkdtemp(prefix='lab-metrics-{}-'.format(self.name))
+            os.environ[metrics.METRICS_DIR_ENV] = metrics_dir
+        try:
+            self._run()
+        finally:
+            if metrics_dir:
+                shutil.rmtree(metrics_dir, ignore_errors=True)
+
+    def _run(self):
+        self.load()
+        self.bind()
+        self.log("serving on http://{}:{} with {} workers x {} threads".format(
+            self.options.host, self.options.port, self.num_workers, self.options.threads))
+        self.manage()
+
+        while True:
+            info = signal.sigtimedwait(MASTER_SIGNALS, 1.0)
+            sig = info.si_signo if info else None
+            if sig in (signal.SIGTERM, signal.SIGINT):
+                break
+            if sig == signal.SIGHUP:
+                self.restart()
+            elif sig == signal.SIGTTIN:
+                self.num_workers += 1
+            elif sig == signal.SIGTTOU and self.num_workers > 1:
+                self.num_workers -= 1
+            self.reap()
+            self.manage()
+
+        self.shutdown()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Serve a lab app from pre-forked workers')
+    parser.add_argument('app', choices=sorted(apps.APPS) + [vhosts.NAME],
+                        help="app to serve ('{}' for every vhost by Host header)".format(vhosts.NAME))
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=None,
+                        help="listen port (default: the app's usual port)")
+    parser.add_argument('-w', '--workers', type=int,
+                        default=int(os.environ.get('LAB_WORKERS', os.cpu_count() or 2)))
+    parser.add_argument('-t', '--threads', type=int,
+                        default=int(os.environ.get('LAB_THREADS', 8)))
+    parser.add_argument('--max-requests', type=int, default=0,
+                        help='recycle a worker after N requests (0 = never)')
+    parser.add_argument('--max-requests-jitter', type=int, default=0)
+    parser.add_argument('--graceful-timeout', type=float, default=30.0)
+    parser.add_argument('--backlog', type=int, default=1024)
+    return parser
+
+
+def main(argv=None):
+    options = build_parser().parse_args(argv)
+    if options.port is None:
+        if options.app == vhosts.NAME:
+            options.port = vhosts.DEFAULT_PORT
+        else:
+            options.port = apps.get(options.app).port
+    Master(options.app, options).run()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
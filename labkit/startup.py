@@ -0,0 +1,109 @@
+"""
+TechCorp CTF Lab - Cold Start
+
+Fresh lab containers all get their first wave of students at once, so the
+template compile cost is moved out of the first requests:
+
+- every app stores compiled templates in a shared on-disk Jinja bytecode
+  cache (LAB_JINJA_CACHE, default .cache/jinja in the repo), so a new
+  process only unmarshals them
+- warm_up() compiles every template of an app before it serves
+- each app records a startup timing breakdown (imports, app, db,
+  templates) that is printed once it is warmed up
+
+Usage:
+    python3 -m labkit.startup            (precompile all apps, e.g. at image build)
+"""
+import os
+import sys
+import time
+
+from jinja2 import FileSystemBytecodeCache
+
+# labkit.apps imports this module, so the repo root is worked out here
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_DIR = os.environ.get('LAB_JINJA_CACHE', os.path.join(ROOT, '.cache', 'jinja'))
+
+# app name -> [(phase, seconds)] and time of the last mark
+_phases = {}
+_last = {}
+
+
+def _process_start():
+    """Wall-clock start of this process (Linux), so imports before labkit count too"""
+    try:
+        with open('/proc/self/stat') as f:
+            start_ticks = int(f.read().rpartition(')')[2].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return time.time() - uptime + start_ticks / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError):
+        return time.time()
+
+
+def begin(name):
+    """Start timing an app (called right before its module is executed)"""
+    _phases[name] = []
+    _last[name] = time.time()
+
+
+def mark(name, phase):
+    """Record the time spent since the previous mark (or process start) as `phase`"""
+    now = time.time()
+    start = _last.get(name)
+    if start is None:
+        start = _process_start()
+    _phases.setdefault(name, []).append((phase, max(0.0, now - start)))
+    _last[name] = now
+
+
+def timings(name):
+    return list(_phases.get(name, ()))
+
+
+def report(name):
+    phases = timings(name)
+    total = sum(seconds for _, seconds in phases)
+    parts = ['{} {:.1f}ms'.format(phase, seconds * 1000) for phase, seconds in phases]
+    print("[{}] startup: {}, total {:.1f}ms".format(name, ', '.join(parts), total * 1000),
+          flush=True)
+
+
+def init_app(app):
+    """Keep the app's compiled templates in the shared bytecode cache"""
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+    except OSError:
+        return app  # read-only checkout: compile in memory as before
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(CACHE_DIR)
+    return app
+
+
+def precompile(app):
+    """Compile every template of the app into the environment's cache"""
+    env = app.jinja_env
+    names = env.list_templates()
+    for template in names:
+        env.get_template(template)
+    return names
+
+
+def warm_up(app, name):
+    """Precompile the templates, then print the startup breakdown"""
+    precompile(app)
+    mark(name, 'templates')
+    report(name)
+    return app
+
+
+def main(argv=None):
+    from labkit import apps
+    for name in apps.APPS:
+        app = apps.load_app(name)
+        count = len(precompile(app))
+        print("{}: {} templates compiled into {}".format(name, count, CACHE_DIR))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
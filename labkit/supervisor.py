@@ -0,0 +1,370 @@
+"""
+TechCorp CTF Lab - Service Supervisor
+
+Starts the lab apps (each one a labkit.server master with its workers) all
+at once and keeps them running:
+
+- readiness: an app counts as up once it answers the health endpoint
+  (metrics.HEALTH_PATH), polled every PROBE_INTERVAL, so bringing up the lab
+  takes as long as the slowest app instead of a fixed sleep per service;
+  an app that is not ready within --timeout is killed and restarted
+- an app that exits is restarted with exponential backoff (1s, 2s, 4s, ...
+  up to BACKOFF_MAX); the backoff resets once it has stayed up STABLE_AFTER
+- SIGTERM/SIGINT stop every app gracefully (each master drains its workers),
+  SIGHUP is forwarded to every app for a graceful reload
+
+App output goes to logs/<app>.log and the master PIDs to logs/<app>.pid as
+before; the supervisor itself writes logs/supervisor.{log,pid}.
+
+Usage:
+    python3 -m labkit.supervisor start       (background, returns once every app is ready)
+    python3 -m labkit.supervisor stop
+    python3 -m labkit.supervisor status
+    python3 -m labkit.supervisor run main-app dev-app --timeout 60   (foreground)
+"""
+import argparse
+import http.client
+import os
+import select
+import signal
+import subprocess
+import sys
+import time
+
+from labkit import apps, metrics, procstats
+
+LOG_DIR = os.path.join(apps.ROOT, 'logs')
+
+PROBE_INTERVAL = 0.1
+PROBE_TIMEOUT = 1.0
+BACKOFF_MIN = 1.0
+BACKOFF_MAX = 30.0
+STABLE_AFTER = 60.0
+
+SIGNALS = (signal.SIGCHLD, signal.SIGTERM, signal.SIGINT, signal.SIGHUP)
+
+
+def probe(port, host='127.0.0.1', timeout=PROBE_TIMEOUT):
+    """Whether the app listening on `port` answers its health endpoint"""
+    connection = http.client.HTTPConnection(host, port, timeout=timeout)
+    try:
+        connection.request('GET', metrics.HEALTH_PATH)
+        return connection.getresponse().status == 200
+    except (OSError, http.client.HTTPException):
+        return False
+    finally:
+        connection.close()
+
+
+def read_pid(path):
+    """PID stored in `path` if that process is still alive, else None"""
+    try:
+        with open(path) as f:
+            pid = int(f.read().strip())
+        os.kill(pid, 0)
+    except (OSError, ValueError):
+        return None
+    return pid
+
+
+def write_pid(path, pid):
+    with open(path, 'w') as f:
+        f.write('{}\n'.format(pid))
+
+
+def remove(path):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+def _unblock_signals():
+    # Children must not inherit the supervisor's blocked signal mask
+    signal.pthread_sigmask(signal.SIG_UNBLOCK, SIGNALS)
+
+
+class Service:
+    """One supervised app: its labkit.server master process and restart state"""
+
+    def __init__(self, name, options):
+        self.name = name
+        self.port = apps.get(name).port
+        self.options = options
+        self.log_path = os.path.join(options.log_dir, name + '.log')
+        self.pid_path = os.path.join(options.log_dir, name + '.pid')
+        self.process = None
+        self.started = 0.0
+        self.ready = False
+        self.failures = 0
+        self.restart_at = 0.0
+
+    def command(self):
+        options = self.options
+        return [sys.executable, '-m', 'labkit.server', self.name, '--port', str(self.port),
+                '--workers', str(options.workers), '--threads', str(options.threads),
+                '--max-requests', str(options.max_requests)]
+
+    def start(self):
+        with open(self.log_path, 'ab') as log:
+            # Own session, so a forced kill takes the workers down with the master
+            self.process = subprocess.Popen(self.command(), cwd=apps.ROOT, stdin=subprocess.DEVNULL,
+                                            stdout=log, stderr=subprocess.STDOUT,
+                                            start_new_session=True, preexec_fn=_unblock_signals)
+        write_pid(self.pid_path, self.process.pid)
+        self.started = time.monotonic()
+        self.ready = False
+
+    @property
+    def running(self):
+        return self.process is not None and self.process.poll() is None
+
+    def signal(self, sig):
+        try:
+            self.process.send_signal(sig)
+        except ProcessLookupError:
+            pass
+
+    def kill(self):
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        self.process.wait()
+
+    def stopped(self):
+        self.process = None
+        self.ready = False
+        remove(self.pid_path)
+
+
+class Supervisor:
+    """
+    Runs the services and reacts to signals and child exits from one loop
+    `notify` is an optional file descriptor that receives every log line
+    until all services are ready for the first time, then gets closed
+    """
+
+    def __init__(self, names, options, notify=None):
+        self.services = [Service(name, options) for name in names]
+        self.options = options
+        self.notify = notify
+        self.pid_path = os.path.join(options.log_dir, 'supervisor.pid')
+
+    def log(self, message):
+        line = "[supervisor {}] {}".format(os.getpid(), message)
+        print(line, flush=True)
+        if self.notify is not None:
+            try:
+                os.write(self.notify, (line + '\n').encode())
+            except OSError:
+                self._close_notify()
+
+    def _close_notify(self):
+        if self.notify is not None:
+            os.close(self.notify)
+            self.notify = None
+
+    def start(self, service):
+        service.start()
+        self.log("started {} (pid {}, port {})".format(service.name, service.process.pid, service.port))
+
+    def crashed(self, service, reason):
+        delay = min(BACKOFF_MAX, BACKOFF_MIN * 2 ** service.failures)
+        service.failures += 1
+        service.stopped()
+        service.restart_at = time.monotonic() + delay
+        self.log("{} {}, restarting in {:.0f}s".format(service.name, reason, delay))
+
+    def check(self):
+        """Restart due services, notice exits and probe services that are not ready yet"""
+        now = time.monotonic()
+        for service in self.services:
+            if service.process is None:
+                if now >= service.restart_at:
+                    self.start(service)
+                continue
+            code = service.process.poll()
+            if code is not None:
+                # Workers of a dead master still hold the socket: take them down too
+                service.kill()
+                self.crashed(service, "exited with status {}".format(code))
+            elif not service.ready:
+                if probe(service.port):
+                    service.ready = True
+                    self.log("{} ready in {:.2f}s".format(service.name, time.monotonic() - service.started))
+                elif now - service.started > self.options.timeout:
+                    service.kill()
+                    self.crashed(service, "not ready after {:.0f}s".format(self.options.timeout))
+            elif service.failures and now - service.started > STABLE_AFTER:
+                service.failures = 0
+
+        if self.notify is not None and all(service.ready for service in self.services):
+            self.log("all {} apps ready in {:.2f}s".format(len(self.services), time.monotonic() - self.began))
+            self._close_notify()
+
+    def run(self):
+        signal.pthread_sigmask(signal.SIG_BLOCK, SIGNALS)
+        os.makedirs(self.options.log_dir, exist_ok=True)
+        write_pid(self.pid_path, os.getpid())
+        self.began = time.monotonic()
+        try:
+            for service in self.services:
+                self.start(service)
+            while True:
+                waiting = any(service.process is not None and not service.ready
+                              for service in self.services)
+                info = signal.sigtimedwait(SIGNALS, PROBE_INTERVAL if waiting else 1.0)
+                sig = info.si_signo if info else None
+                if sig in (signal.SIGTERM, signal.SIGINT):
+                    break
+                if sig == signal.SIGHUP:
+                    self.log("reloading all apps")
+                    for service in self.services:
+                        if service.running:
+                            service.signal(signal.SIGHUP)
+                self.check()
+        finally:
+            self.shutdown()
+            remove(self.pid_path)
+            self._close_notify()
+        return 0
+
+    def shutdown(self):
+        running = [service for service in self.services if service.running]
+        self.log("stopping {}".format(', '.join(service.name for service in running) or 'nothing'))
+        for service in running:
+            service.signal(signal.SIGTERM)
+        deadline = time.monotonic() + self.options.graceful_timeout
+        for service in running:
+            try:
+                service.process.wait(max(0.0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                self.log("{} did not stop in time, killing it".format(service.name))
+                service.kill()
+            service.stopped()
+
+
+# Commands
+
+def run(options):
+    return Supervisor(options.apps, options).run()
+
+
+def start(options):
+    """Run the supervisor in the background, relaying its log until every app is ready"""
+    pid_path = os.path.join(options.log_dir, 'supervisor.pid')
+    pid = read_pid(pid_path)
+    if pid is not None:
+        print("Supervisor already running (PID: {})".format(pid))
+        return 0
+    os.makedirs(options.log_dir, exist_ok=True)
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            os.close(read_end)
+            os.setsid()
+            log = os.open(os.path.join(options.log_dir, 'supervisor.log'),
+                          os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+            devnull = os.open(os.devnull, os.O_RDONLY)
+            os.dup2(devnull, 0)
+            os.dup2(log, 1)
+            os.dup2(log, 2)
+            code = Supervisor(options.apps, options, notify=write_end).run()
+        finally:
+            os._exit(code)
+
+    os.close(write_end)
+    # The child closes the pipe once everything is ready (or when it exits)
+    deadline = time.monotonic() + options.timeout + 1
+    buffer = b''
+    closed = False
+    with os.fdopen(read_end, 'rb', buffering=0) as pipe:
+        while not closed and time.monotonic() < deadline:
+            ready, _, _ = select.select([pipe], [], [], max(0.0, deadline - time.monotonic()))
+            if not ready:
+                break
+            data = pipe.read(4096)
+            closed = not data
+            buffer += data
+            *lines, buffer = buffer.split(b'\n')
+            for line in lines:
+                print(line.decode(errors='replace').partition('] ')[2], flush=True)
+
+    exited, status = os.waitpid(pid, os.WNOHANG)
+    if exited:
+        print("Supervisor exited with status {}, see {}".format(
+            procstats.exit_code(status), options.log_dir))
+        return 1
+    if not closed:
+        print("Not every app is ready after {:.0f}s, still retrying in the background "
+              "(PID: {}), see {}".format(options.timeout, pid, options.log_dir))
+        return 1
+    return 0
+
+
+def stop(options):
+    pid_path = os.path.join(options.log_dir, 'supervisor.pid')
+    pid = read_pid(pid_path)
+    if pid is None:
+        print("Supervisor not running")
+        return 0
+    os.kill(pid, signal.SIGTERM)
+    deadline = time.monotonic() + options.graceful_timeout + 5
+    while time.monotonic() < deadline:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            print("Stopped (PID: {})".format(pid))
+            return 0
+        time.sleep(0.1)
+    print("Supervisor (PID: {}) still running after {:.0f}s".format(pid, options.graceful_timeout + 5))
+    return 1
+
+
+def status(options):
+    pid = read_pid(os.path.join(options.log_dir, 'supervisor.pid'))
+    print("supervisor   {}".format('running (PID: {})'.format(pid) if pid else 'not running'))
+    down = 0
+    for name in options.apps:
+        up = probe(apps.get(name).port)
+        down += not up
+        print("{:<12} {} (port {})".format(name, 'ready' if up else 'down', apps.get(name).port))
+    return 1 if down else 0
+
+
+COMMANDS = {'run': run, 'start': start, 'stop': stop, 'status': status}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Start, watch and stop the lab apps')
+    parser.add_argument('command', choices=COMMANDS)
+    parser.add_argument('apps', nargs='*', default=list(apps.APPS),
+                        help='apps to supervise (default: all)')
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('LAB_WORKERS', 4)))
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('LAB_THREADS', 8)))
+    parser.add_argument('--max-requests', type=int,
+                        default=int(os.environ.get('LAB_MAX_REQUESTS', 10000)))
+    parser.add_argument('--timeout', type=float, default=30.0,
+                        help='seconds for an app to become ready')
+    parser.add_argument('--graceful-timeout', type=float, default=35.0,
+                        help='seconds to wait for apps to stop before killing them')
+    parser.add_argument('--log-dir', default=LOG_DIR)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    options = parser.parse_args(argv)
+    for name in options.apps:
+        try:
+            apps.get(name)
+        except ValueError as e:
+            parser.error(str(e))
+    return COMMANDS[options.command](options)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,296 @@
+"""
+TechCorp CTF Lab - Flag Validation
+
+Runs the same 7 checks as test_flags.sh, concurrently, against one or many
+lab instances. Requests go over pooled keep-alive connections (asyncio, no
+external dependencies) and every check has its own timeout.
+
+An instance is HOST or HOST:BASE_PORT; its four services listen on
+BASE_PORT..BASE_PORT+3 (default 127.0.0.1:5000, i.e. ports 5000-5003).
+
+Usage:
+    python3 -m labkit.validate
+    python3 -m labkit.validate 10.0.0.11 10.0.0.12:6000 --json
+    python3 -m labkit.validate --instances-file lab-hosts.txt --output report.json
+
+Exit status: 0 when every flag is reachable on every instance, 1 otherwise
+(including when a service is not running).
+"""
+from collections import defaultdict
+import argparse
+import asyncio
+import base64
+import json
+import sys
+import time
+
+from labkit import apps
+from labkit.flags import CHECKS
+
+BASE_PORT = 5000
+
+GREEN = '\033[0;32m'
+RED = '\033[0;31m'
+YELLOW = '\033[1;33m'
+NC = '\033[0m'
+
+
+class HTTPError(Exception):
+    pass
+
+
+class Connection:
+    """A single HTTP/1.1 connection that can be reused while the server keeps it alive"""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.reusable = True
+
+    async def request(self, host, port, path, headers):
+        lines = ['GET {} HTTP/1.1'.format(path), 'Host: {}:{}'.format(host, port),
+                 'User-Agent: techcorp-lab-validate', 'Accept: */*']
+        lines += ['{}: {}'.format(key, value) for key, value in headers.items()]
+        self.writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise HTTPError('connection closed')
+        parts = status_line.decode('latin-1').split(None, 2)
+        if len(parts) < 2 or not parts[0].startswith('HTTP/'):
+            raise HTTPError('bad status line: {!r}'.format(status_line[:80]))
+        version, status = parts[0], int(parts[1])
+
+        response_headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            key, _, value = line.decode('latin-1').partition(':')
+            response_headers[key.strip().lower()] = value.strip()
+
+        connection = response_headers.get('connection', '').lower()
+        self.reusable = (version == 'HTTP/1.1' and connection != 'close') or connection == 'keep-alive'
+
+        if response_headers.get('transfer-encoding', '').lower() == 'chunked':
+            body = await self._read_chunked()
+        elif 'content-length' in response_headers:
+            body = await self.reader.readexactly(int(response_headers['content-length']))
+        else:
+            body = await self.reader.read()
+            self.reusable = False
+        return status, body
+
+    async def _read_chunked(self):
+        chunks = []
+        while True:
+            size = int((await self.reader.readline()).split(b';')[0], 16)
+            if size == 0:
+                await self.reader.readline()
+                return b''.join(chunks)
+            chunks.append(await self.reader.readexactly(size))
+            await self.reader.readline()
+
+    def close(self):
+        self.writer.close()
+
+
+class ConnectionPool:
+    """Idle keep-alive connections per (host, port)"""
+
+    def __init__(self):
+        self._idle = defaultdict(list)
+
+    async def get(self, host, port, timeout):
+        idle = self._idle[(host, port)]
+        if idle:
+            return idle.pop()
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+        return Connection(reader, writer)
+
+    async def probe(self, host, port, timeout):
+        """Open a connection to check the port, keeping it idle for later requests"""
+        try:
+            connection = await self.get(host, port, timeout)
+        except (OSError, asyncio.TimeoutError):
+            return False
+        self.release(host, port, connection)
+        return True
+
+    def release(self, host, port, connection):
+        if connection.reusable:
+            self._idle[(host, port)].append(connection)
+        else:
+            connection.close()
+
+    async def fetch(self, host, port, path, headers, timeout):
+        connection = await self.get(host, port, timeout)
+        try:
+            status, body = await asyncio.wait_for(
+                connection.request(host, port, path, headers), timeout)
+        except BaseException:
+            connection.close()
+            raise
+        self.release(host, port, connection)
+        return status, body
+
+    def close(self):
+        for connections in self._idle.values():
+            for connection in connections:
+                connection.close()
+        self._idle.clear()
+
+
+def parse_instance(spec):
+    """'HOST' or 'HOST:BASE_PORT' -> (host, base_port)"""
+    host, sep, port = spec.rpartition(':')
+    if not sep:
+        return spec, BASE_PORT
+    return host, int(port)
+
+
+def service_port(base_port, name):
+    return base_port + apps.get(name).port - BASE_PORT
+
+
+async def run_check(pool, host, base_port, check, timeout):
+    port = service_port(base_port, check.app)
+    headers = {}
+    if check.auth:
+        token = base64.b64encode('{}:{}'.format(*check.auth).encode()).decode()
+        headers['Authorization'] = 'Basic ' + token
+
+    start = time.perf_counter()
+    result = {'flag': check.number, 'name': check.name, 'expected': check.expected,
+              'url': 'http://{}:{}{}'.format(host, port, check.path)}
+    try:
+        status, body = await pool.fetch(host, port, check.path, headers, timeout)
+    except asyncio.TimeoutError:
+        result.update(passed=False, error='timeout after {}s'.format(timeout))
+    except (OSError, HTTPError, ValueError, asyncio.IncompleteReadError) as e:
+        result.update(passed=False, error=str(e) or e.__class__.__name__)
+    else:
+        passed = check.expected.encode() in body
+        result.update(passed=passed, status=status)
+        if not passed:
+            result['got'] = body[:100].decode('utf-8', 'replace')
+    result['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 2)
+    return result
+
+
+async def validate_instance(host, base_port, options):
+    pool = ConnectionPool()
+    try:
+        ports = {name: service_port(base_port, name) for name in apps.APPS}
+        up = await asyncio.gather(*(pool.probe(host, port, options.connect_timeout)
+                                    for port in ports.values()))
+        down = [port for port, is_up in zip(ports.values(), up) if not is_up]
+        report = {'instance': '{}:{}'.format(host, base_port), 'services_down': down,
+                  'checks': []}
+        if down:
+            report.update(passed=0, failed=len(CHECKS), ok=False)
+            return report
+
+        checks = await asyncio.gather(*(run_check(pool, host, base_port, check, options.timeout)
+                                        for check in CHECKS))
+        passed = sum(1 for check in checks if check['passed'])
+        report.update(checks=list(checks), passed=passed, failed=len(CHECKS) - passed,
+                      ok=passed == len(CHECKS))
+        return report
+    finally:
+        pool.close()
+
+
+async def validate(instances, options):
+    semaphore = asyncio.Semaphore(options.concurrency)
+
+    async def bounded(host, base_port):
+        async with semaphore:
+            return await validate_instance(host, base_port, options)
+
+    return await asyncio.gather(*(bounded(host, port) for host, port in instances))
+
+
+def print_instance(report, color):
+    green, red, yellow, nc = (GREEN, RED, YELLOW, NC) if color else ('', '', '', '')
+    print("=" * 42)
+    print("Instance {}".format(report['instance']))
+    print("=" * 42)
+    if report['services_down']:
+        for port in report['services_down']:
+            print("{}✗{} Service on port {} is not running".format(red, nc, port))
+        print()
+        return
+    for check in report['checks']:
+        label = "{}[FLAG {}/7]{} Testing {}... ".format(yellow, check['flag'], nc, check['name'])
+        if check['passed']:
+            print(label + "{}✓ PASS{} ({}ms)".format(green, nc, check['elapsed_ms']))
+        else:
+            print(label + "{}✗ FAIL{}".format(red, nc))
+            print("  Expected: {}".format(check['expected']))
+            print("  URL: {}".format(check['url']))
+            if check.get('error'):
+                print("  Got: ({})".format(check['error']))
+            else:
+                print("  Got: {}...".format(check.get('got', '')))
+    print()
+    print("  {}Passed:{} {}/7".format(green, nc, report['passed']))
+    print("  {}Failed:{} {}/7".format(red, nc, report['failed']))
+    print()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Validate that all 7 flags are reachable')
+    parser.add_argument('instances', nargs='*', help='HOST or HOST:BASE_PORT (default 127.0.0.1:5000)')
+    parser.add_argument('-f', '--instances-file', help='file with one instance per line')
+    parser.add_argument('--timeout', type=float, default=5.0, help='per-check timeout in seconds')
+    parser.add_argument('--connect-timeout', type=float, default=2.0)
+    parser.add_argument('-c', '--concurrency', type=int, default=50,
+                        help='instances validated at the same time')
+    parser.add_argument('--json', action='store_true', help='print the JSON report instead of text')
+    parser.add_argument('-o', '--output', help='also write the JSON report to this file')
+    return parser
+
+
+def main(argv=None):
+    options = build_parser().parse_args(argv)
+    specs = list(options.instances)
+    if options.instances_file:
+        with open(options.instances_file) as f:
+            specs += [line.strip() for line in f if line.strip() and not line.startswith('#')]
+    instances = [parse_instance(spec) for spec in specs or ['127.0.0.1']]
+
+    start = time.perf_counter()
+    reports = asyncio.run(validate(instances, options))
+    summary = {
+        'instances': len(reports),
+        'instances_ok': sum(1 for report in reports if report['ok']),
+        'elapsed_s': round(time.perf_counter() - start, 3),
+        'ok': all(report['ok'] for report in reports),
+        'reports': reports,
+    }
+
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump(summary, f, indent=2)
+    if options.json:
+        json.dump(summary, sys.stdout, indent=2)
+        print()
+    else:
+        color = sys.stdout.isatty()
+        for report in reports:
+            print_instance(report, color)
+        print("{}/{} instances ready ({}s)".format(
+            summary['instances_ok'], summary['instances'], summary['elapsed_s']))
+        if not summary['ok']:
+            print()
+            print("Troubleshooting:")
+            print("  1. Ensure all services are running: ./start_all_services.sh")
+            print("  2. Check logs in ./logs/ directory")
+            print("  3. Verify /etc/hosts entries for subdomains")
+    return 0 if summary['ok'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,74 @@
+"""
+TechCorp CTF Lab - Single-process Virtual Host Dispatcher
+
+Mounts the four lab apps in one WSGI application and routes each request on
+its Host header, the way the nginx `server` blocks in nginx.conf do:
+
+    techcorp.local          -> main-app
+    dev.techcorp.local      -> dev-app
+    staging.techcorp.local  -> staging-app
+    admin.techcorp.local    -> admin-app
+    anything else           -> 404 "Subdomain not found" (nginx default_server)
+
+Usage:
+    python3 -m labkit.server all --port 8080 --workers 4
+    curl -H 'Host: dev.techcorp.local' http://127.0.0.1:8080/
+"""
+from labkit import apps
+
+# App name accepted by labkit.server for the combined dispatcher
+NAME = 'all'
+DEFAULT_PORT = 8080
+
+# Same body as the nginx catch-all `return 404 "..."`
+NOT_FOUND_BODY = b'Subdomain not found. Try enumerating other subdomains!\n'
+NOT_FOUND_HEADERS = [
+    ('Content-Type', 'text/plain'),
+    ('Content-Length', str(len(NOT_FOUND_BODY))),
+]
+
+
+def unknown_host(environ, start_response):
+    """Catch-all for Host headers that match no lab app"""
+    start_response('404 Not Found', NOT_FOUND_HEADERS)
+    return [NOT_FOUND_BODY]
+
+
+class HostDispatcher:
+    """
+    WSGI application dispatching on the Host header (port and case ignored)
+    `hosts` maps a lower-case host name to a WSGI application
+    """
+
+    def __init__(self, hosts, default=unknown_host):
+        self.hosts = dict(hosts)
+        self.default = default
+
+    def __call__(self, environ, start_response):
+        host = environ.get('HTTP_HOST', '').lower()
+        if ':' in host:
+            host = host.rpartition(':')[0]
+        return self.hosts.get(host, self.default)(environ, start_response)
+
+
+def host_for(name, domain=apps.DOMAIN):
+    """Virtual host of an app under `domain` (e.g. dev.<domain>)"""
+    prefix = apps.subdomain(name)
+    return '{}.{}'.format(prefix, domain) if prefix else domain
+
+
+def build(domain=apps.DOMAIN, names=None):
+    """Create a dispatcher for the given apps (all four by default) under `domain`"""
+    hosts = {}
+    for name in names or apps.APPS:
+        hosts[host_for(name, domain)] = apps.wsgi_app(apps.load_app(name))
+    return HostDispatcher(hosts)
+
+
+def warm_up(reload=False, domain=apps.DOMAIN):
+    """Import and warm up every app, then build the dispatcher (see labkit.server)"""
+    for name in apps.APPS:
+        if reload:
+            apps.load_module(name, reload=True)
+        apps.warm_up(name)
+    return build(domain)
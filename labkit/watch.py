@@ -0,0 +1,180 @@
+"""
+TechCorp CTF Lab - Content Hot Reload
+
+Template edits made between exercises are picked up by the running workers,
+without restarting them or dropping anyone's connection:
+
+    from labkit import watch
+    watch.init_app(app, 'main-app')
+    watch.on_change(app, refresh)    # refresh(paths) for the app's own caches
+
+Every worker process runs a daemon thread that polls the app's templates/
+directory (stat only, no inotify dependency). Nothing else needs it: static/
+is served from disk on every request and main-app's file cache re-checks the
+mtime of public/, backup/ and .git/ files itself, so a scan stays a few
+dozen stat calls however large those trees grow. For each batch of changed
+templates:
+
+- they are compiled first, then swapped into the Jinja cache (only those
+  entries; pages extending or including them get the new version at render
+  time); a template with a syntax error keeps serving its previous version
+- the callbacks registered with on_change() refresh the app's caches
+- the process-wide `generation` counter is incremented
+
+Settings (environment):
+    LAB_WATCH            '0' disables watching (edits then need a restart)
+    LAB_WATCH_INTERVAL   seconds between scans (default 1.0)
+"""
+import os
+import threading
+import time
+import weakref
+
+from jinja2 import TemplateNotFound, TemplateSyntaxError
+
+ENABLED = os.environ.get('LAB_WATCH', '1') != '0'
+INTERVAL = float(os.environ.get('LAB_WATCH_INTERVAL', 1.0))
+
+# Incremented once per batch of changes applied in this process
+generation = 0
+_generation_lock = threading.Lock()
+
+# app -> Watcher
+_watchers = weakref.WeakKeyDictionary()
+
+
+def scan(directories):
+    """path -> (mtime_ns, size, inode) of every file below `directories`"""
+    files = {}
+    stack = [directory for directory in directories if os.path.isdir(directory)]
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file():
+                        st = entry.stat()
+                        files[entry.path] = (st.st_mtime_ns, st.st_size, st.st_ino)
+                except OSError:
+                    pass
+    return files
+
+
+def changes(old, new):
+    """Paths added, removed or modified between two scans"""
+    return sorted(path for path in old.keys() | new.keys() if old.get(path) != new.get(path))
+
+
+class Watcher:
+    """Polls the template directories of one app and applies changes"""
+
+    def __init__(self, app, name, directories, interval=INTERVAL):
+        self.app = app
+        self.name = name
+        self.directories = directories
+        self.interval = interval
+        self.callbacks = []
+        self.template_dir = os.path.join(app.root_path, app.template_folder or 'templates')
+        self.files = scan(directories)
+        self._reset()
+        # The thread is started by the first request of each worker, never before fork
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, daemon=True,
+                                            name='lab-watch-{}'.format(self.name))
+        # Catch up with edits made since the app was loaded, before serving
+        self._check()
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self._check()
+
+    def _check(self):
+        try:
+            self.check()
+        except Exception:
+            self.app.logger.exception('Content reload failed')
+
+    def check(self):
+        """Scan once and apply what changed; returns the changed paths"""
+        with self._lock:
+            files = scan(self.directories)
+            changed = changes(self.files, files)
+            if changed:
+                self.files = files
+                self.apply(changed)
+        return changed
+
+    def apply(self, changed):
+        global generation
+        self.swap_templates(changed)
+        for callback in self.callbacks:
+            callback(changed)
+        with _generation_lock:
+            generation += 1
+            current = generation
+        print("[{}] reloaded {} (generation {})".format(
+            self.name, ', '.join(os.path.relpath(path, self.app.root_path) for path in changed),
+            current), flush=True)
+
+    def swap_templates(self, changed):
+        env = self.app.jinja_env
+        if env.cache is None:
+            return
+        prefix = self.template_dir + os.sep
+        for path in changed:
+            if not path.startswith(prefix):
+                continue
+            name = path[len(prefix):].replace(os.sep, '/')
+            # Same key as Environment._load_template
+            key = (weakref.ref(env.loader), name)
+            try:
+                template = env.loader.load(env, name, env.make_globals(None))
+            except TemplateNotFound:
+                try:
+                    del env.cache[key]
+                except KeyError:
+                    pass
+                continue
+            except TemplateSyntaxError as e:
+                self.app.logger.error('Keeping the previous %s: %s', name, e)
+                continue
+            env.cache[key] = template
+
+
+def on_change(app, callback):
+    """Call `callback(paths)` after each batch of changed files of `app`"""
+    watcher = _watchers.get(app)
+    if watcher is not None:
+        watcher.callbacks.append(callback)
+    return callback
+
+
+def init_app(app, name):
+    """Watch the templates/ directory of `app`"""
+    if not ENABLED:
+        return app
+    directories = [os.path.join(app.root_path, app.template_folder or 'templates')]
+    watcher = _watchers[app] = Watcher(app, name, directories)
+
+    @app.before_request
+    def start_watcher():
+        if watcher._thread is None:
+            watcher.start()
+
+    return app
@@ -0,0 +1,368 @@
+"""
+TechCorp CTF Lab - Wordlist Engine
+
+Builds large fuzzing wordlists from the small hand-written ones (and any
+others) without shell pipelines or loading everything in memory:
+
+- merge: many lists are read as one stream, every word is kept once, in the
+  order it was first seen; past `--memory` distinct words the de-duplication
+  spills to hash partitions on disk, so memory stays bounded
+- mutate: extensions (.bak, .old, .sql.old), case variants and numeric
+  suffixes are applied lazily, one word at a time
+- index: next to LIST goes LIST.idx, the start offset of every entry, which
+  Wordlist memory-maps along with the list, so bench/validation tools can
+  take word N or a slice without reading or parsing the whole list
+
+Usage:
+    python3 -m labkit.wordlist merge wordlists/*.txt extra.txt -o merged.txt
+    python3 -m labkit.wordlist merge wordlists/directories.txt --ext .bak,.old,.sql.old \\
+        --case --numbers 1-99 --limit 1000000 -o directories-1m.txt
+    python3 -m labkit.wordlist index big.txt
+    python3 -m labkit.wordlist get directories-1m.txt 0 500000 -1
+"""
+from array import array
+import argparse
+import heapq
+import itertools
+import mmap
+import os
+import shutil
+import struct
+import sys
+import tempfile
+
+ENCODING = 'utf-8'
+ERRORS = 'surrogateescape'   # odd bytes in downloaded lists survive a round trip
+
+MAX_IN_MEMORY = 1000000      # distinct words kept in a set before spilling
+PARTITIONS = 64
+
+INDEX_SUFFIX = '.idx'
+INDEX_MAGIC = b'LABWLIX1'
+INDEX_HEADER = struct.Struct('<8sQQ')   # magic, entries, size of the indexed list
+
+
+# Reading
+
+def read(path):
+    """Words of one list ('-' for stdin): stripped, blank lines and #comments skipped"""
+    f = sys.stdin if path == '-' else open(path, encoding=ENCODING, errors=ERRORS)
+    try:
+        for line in f:
+            word = line.strip()
+            if word and not word.startswith('#'):
+                yield word
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def read_all(paths):
+    return itertools.chain.from_iterable(read(path) for path in paths)
+
+
+# Mutation rules (each yields the word itself first)
+
+def with_extensions(words, extensions):
+    for word in words:
+        yield word
+        for extension in extensions:
+            yield word + extension
+
+
+def with_case_variants(words):
+    for word in words:
+        yield word
+        for variant in (word.lower(), word.upper(), word.capitalize()):
+            if variant != word:
+                yield variant
+
+
+def with_numbers(words, numbers):
+    for word in words:
+        yield word
+        for number in numbers:
+            yield word + number
+
+
+def parse_numbers(spec):
+    """'1-20,2023' -> ['1', ..., '20', '2023']; '01-12' keeps the zero padding"""
+    numbers = []
+    for part in spec.split(','):
+        start, _, stop = part.partition('-')
+        width = len(start) if start.startswith('0') and len(start) > 1 else 0
+        for n in range(int(start), int(stop or start) + 1):
+            numbers.append(str(n).zfill(width))
+    return numbers
+
+
+def mutate(words, extensions=(), case=False, numbers=()):
+    """Apply the rules lazily: numbers, then case variants, then extensions"""
+    if numbers:
+        words = with_numbers(words, numbers)
+    if case:
+        words = with_case_variants(words)
+    if extensions:
+        words = with_extensions(words, extensions)
+    return words
+
+
+# De-duplication
+
+def unique(words, max_in_memory=MAX_IN_MEMORY, tmpdir=None):
+    """
+    Yield every word once, in first-seen order
+    Words stream straight through while fewer than `max_in_memory` distinct
+    ones were seen; after that the rest is spread over PARTITIONS files by
+    hash, each partition is de-duplicated on its own and the survivors are
+    merged back by position
+    """
+    seen = set()
+    words = iter(words)
+    for word in words:
+        if word not in seen:
+            seen.add(word)
+            yield word
+            if len(seen) >= max_in_memory:
+                break
+    else:
+        return
+    yield from _unique_spilled(seen, words, tmpdir)
+
+
+def _unique_spilled(emitted, words, tmpdir):
+    directory = tempfile.mkdtemp(prefix='lab-wordlist-', dir=tmpdir)
+    try:
+        parts = [open(os.path.join(directory, str(n)), 'w', encoding=ENCODING, errors=ERRORS)
+                 for n in range(PARTITIONS)]
+        # Words already yielded go in first (position -1) so later copies are dropped
+        for word in emitted:
+            parts[hash(word) % PARTITIONS].write('-1\t{}\n'.format(word))
+        emitted.clear()
+        for position, word in enumerate(words):
+            parts[hash(word) % PARTITIONS].write('{}\t{}\n'.format(position, word))
+        for f in parts:
+            f.close()
+
+        outputs = []
+        for n in range(PARTITIONS):
+            source = os.path.join(directory, str(n))
+            output = source + '.out'
+            seen = set()
+            with open(source, encoding=ENCODING, errors=ERRORS) as f, \
+                    open(output, 'w', encoding=ENCODING, errors=ERRORS) as out:
+                for line in f:
+                    position, word = line.rstrip('\n').split('\t', 1)
+                    if word not in seen:
+                        seen.add(word)
+                        if position != '-1':
+                            out.write(line)
+            os.unlink(source)
+            outputs.append(output)
+
+        streams = [_positioned(path) for path in outputs]
+        for _, word in heapq.merge(*streams):
+            yield word
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def _positioned(path):
+    with open(path, encoding=ENCODING, errors=ERRORS) as f:
+        for line in f:
+            position, word = line.rstrip('\n').split('\t', 1)
+            yield int(position), word
+
+
+# Writing and indexing
+
+def index_path(path):
+    return path + INDEX_SUFFIX
+
+
+def write(words, path, index=True):
+    """Write one word per line to `path` (and index it); returns the count"""
+    count = 0
+    tmp = path + '.tmp'
+    try:
+        with open(tmp, 'w', encoding=ENCODING, errors=ERRORS) as out:
+            for word in words:
+                out.write(word + '\n')
+                count += 1
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+    if index:
+        build_index(path)
+    return count
+
+
+def _starts(f):
+    """Offsets of the lines of `f` holding a word (same rules as read())"""
+    offset = 0
+    for line in f:
+        word = line.strip()
+        if word and not word.startswith(b'#'):
+            yield offset
+        offset += len(line)
+
+
+def build_index(path):
+    """
+    Write path.idx: header, then the start offset (uint64) of every entry
+    The list itself is not modified; returns the number of entries
+    """
+    count = 0
+    tmp = index_path(path) + '.tmp'
+    try:
+        with open(path, 'rb') as f, open(tmp, 'wb') as idx:
+            idx.write(INDEX_HEADER.pack(INDEX_MAGIC, 0, 0))
+            offsets = array('Q')
+            for offset in _starts(f):
+                offsets.append(offset)
+                if len(offsets) >= 65536:
+                    count += len(offsets)
+                    offsets.tofile(idx)
+                    del offsets[:]
+            count += len(offsets)
+            offsets.tofile(idx)
+            idx.seek(0)
+            idx.write(INDEX_HEADER.pack(INDEX_MAGIC, count, os.fstat(f.fileno()).st_size))
+        os.replace(tmp, index_path(path))
+    finally:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+    return count
+
+
+class Wordlist:
+    """
+    Read-only random access to an indexed list, backed by two memory maps
+    Behaves like a sequence of str: len(), [n], [a:b], iteration
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        with open(index_path(path), 'rb') as f:
+            self._index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count, indexed_size = INDEX_HEADER.unpack_from(self._index)
+        if magic != INDEX_MAGIC or indexed_size != size:
+            self.close()
+            raise ValueError("{} is not a current index of {}".format(index_path(path), path))
+        self._offsets = memoryview(self._index)[INDEX_HEADER.size:].cast('Q')
+        self._count = count
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, n):
+        if isinstance(n, slice):
+            return [self[i] for i in range(*n.indices(self._count))]
+        if n < 0:
+            n += self._count
+        if not 0 <= n < self._count:
+            raise IndexError('wordlist index out of range')
+        data = self._data
+        start = self._offsets[n]
+        end = data.find(b'\n', start)
+        return data[start:end if end >= 0 else len(data)].strip().decode(ENCODING, ERRORS)
+
+    def __iter__(self):
+        for n in range(self._count):
+            yield self[n]
+
+    def close(self):
+        offsets = getattr(self, '_offsets', None)
+        if offsets is not None:
+            offsets.release()
+        self._index.close()
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+
+
+def load(path):
+    """The words of a list: a Wordlist when it has a current index, else a list"""
+    if os.path.exists(index_path(path)):
+        try:
+            return Wordlist(path)
+        except ValueError:
+            pass
+    return list(read(path))
+
+
+# Command line
+
+def merge(options):
+    words = read_all(options.lists)
+    words = mutate(words, options.ext, options.case, options.numbers)
+    words = unique(words, options.memory)
+    if options.limit:
+        words = itertools.islice(words, options.limit)
+    if options.output == '-':
+        out = sys.stdout
+        for word in words:
+            out.write(word + '\n')
+        return 0
+    count = write(words, options.output, index=not options.no_index)
+    print("{} words written to {}".format(count, options.output), file=sys.stderr)
+    return 0
+
+
+def index(options):
+    for path in options.lists:
+        print("{}: {} words indexed".format(path, build_index(path)))
+    return 0
+
+
+def get(options):
+    wordlist = Wordlist(options.list)
+    for n in options.positions:
+        print(wordlist[n])
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Merge, mutate and index wordlists')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    merge_parser = commands.add_parser('merge', help='merge lists into one de-duplicated list')
+    merge_parser.add_argument('lists', nargs='+', help="input lists ('-' for stdin)")
+    merge_parser.add_argument('-o', '--output', default='-',
+                              help='output list, indexed unless --no-index (default stdout)')
+    merge_parser.add_argument('--ext', type=lambda spec: [e for e in spec.split(',') if e], default=[],
+                              help='extensions to append, e.g. .bak,.old,.sql.old')
+    merge_parser.add_argument('--case', action='store_true', help='add lower/UPPER/Capitalized variants')
+    merge_parser.add_argument('--numbers', type=parse_numbers, default=[],
+                              help='numeric suffixes, e.g. 1-99,2023,2024 (01-12 keeps zero padding)')
+    merge_parser.add_argument('--limit', type=int, default=0, help='stop after N words')
+    merge_parser.add_argument('--memory', type=int, default=MAX_IN_MEMORY,
+                              help='distinct words held in memory before spilling to disk')
+    merge_parser.add_argument('--no-index', action='store_true', help='do not write OUTPUT.idx')
+    merge_parser.set_defaults(run=merge)
+
+    index_parser = commands.add_parser('index', help='write LIST.idx for existing lists')
+    index_parser.add_argument('lists', nargs='+')
+    index_parser.set_defaults(run=index)
+
+    get_parser = commands.add_parser('get', help='print words of an indexed list by position')
+    get_parser.add_argument('list')
+    get_parser.add_argument('positions', nargs='+', type=int)
+    get_parser.set_defaults(run=get)
+    return parser
+
+
+def main(argv=None):
+    options = build_parser().parse_args(argv)
+    try:
+        return options.run(options)
+    except (OSError, ValueError, IndexError) as e:
+        print("Error: {}".format(e), file=sys.stderr)
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,13 +1,73 @@
-from flask import Flask, render_template, jsonify, send_from_directory, request
+from flask import Flask, render_template, jsonify, send_from_directory, request, Response, stream_with_context, url_for
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from werkzeug.exceptions import NotFound
+from werkzeug.security import safe_join
+from collections import OrderedDict, namedtuple
+from urllib.parse import quote
+from zlib import adler32
+import click
+import itertools
+import mimetypes
 import os
+import random
+import stat
+import sys
+import threading
+import time
+import unicodedata
+
+# Shared lab tooling (labkit/) lives one directory up
+LAB_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if LAB_ROOT not in sys.path:
+    sys.path.insert(0, LAB_ROOT)
+
+from labkit import compress, database, metrics, profiler, requestlog, scoreboard, startup, watch
+from labkit.prebuilt import static_json
+
+startup.mark('main-app', 'imports')
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'dev-key-do-not-use-in-production'
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///database.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Read cache for the seeded tables (entries expire after QUERY_CACHE_TTL seconds)
+app.config['QUERY_CACHE_TTL'] = 300
+app.config['QUERY_CACHE_MAX_ENTRIES'] = 64
+# In-memory cache for the small public/backup/.git files
+app.config['FILE_CACHE_MAX_BYTES'] = 16 * 1024 * 1024
+app.config['FILE_CACHE_MAX_FILE_SIZE'] = 1024 * 1024  # larger files are streamed from disk
+# Serve the 404 page from a pre-rendered copy (set to False to render per request)
+app.config['NOT_FOUND_CACHE'] = True
+# Large datasets (see `flask seed`): HTML pages list at most PAGE_MAX_ROWS rows,
+# /api/v2/admin/users streams tables bigger than API_USERS_INLINE_MAX rows
+app.config['PAGE_MAX_ROWS'] = 100
+app.config['API_USERS_INLINE_MAX'] = 1000
+app.config['API_USERS_MAX_LIMIT'] = 1000
+# Seeded database file that new instances start from (see labkit/database.py)
+app.config['DATABASE_SNAPSHOT'] = os.environ.get(
+    'LAB_DB_SNAPSHOT', os.path.join(app.instance_path, 'database.seed.db'))
 
 db = SQLAlchemy(app)
+metrics.init_app(app, 'main-app')
+requestlog.init_app(app, 'main-app')
+startup.init_app(app)
+compress.init_app(app)
+scoreboard.init_app(app, 'main-app')
+watch.init_app(app, 'main-app')
+profiler.init_app(app, 'main-app')
+
+# SQLite in WAL mode with tuned pragmas; the read paths use a pooled
+# read-only engine so workers never queue behind the write lock
+with app.app_context():
+    database.tune(db.engine)
+    DATABASE_PATH = database.database_path(db.engine)
+read_engine = database.readonly_engine(DATABASE_PATH)
+
+def read_rows(query):
+    """Run a SELECT on a read-only pooled connection"""
+    with read_engine.connect() as connection:
+        return connection.execute(query).all()
 
 # Database Models
 class User(db.Model):
@@ -21,8 +81,110 @@ class Service(db.Model):
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text)
 
+# Model read cache
+# The seeded rows never change during a session, so the hot pages read plain
+# row tuples from memory instead of querying SQLite and building ORM objects.
+# Committed writes through the session invalidate the affected tables; writes
+# from another worker process are picked up once the TTL expires.
+class QueryCache:
+    """
+    Thread-safe read-through cache keyed by (table, query name)
+    Entries expire after `ttl` seconds and the oldest are evicted past `max_entries`
+    """
+
+    def __init__(self, ttl=300, max_entries=64):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, table, name, loader):
+        key = (table, name)
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+
+        value = loader()
+        with self._lock:
+            self._entries[key] = (now + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, *tables):
+        """Drop cached queries for the given tables (all tables if none given)"""
+        with self._lock:
+            if not tables:
+                self._entries.clear()
+                return
+            for key in [k for k in self._entries if k[0] in tables]:
+                del self._entries[key]
+
+query_cache = QueryCache(app.config['QUERY_CACHE_TTL'],
+                         app.config['QUERY_CACHE_MAX_ENTRIES'])
+
+_row_types = {}
+
+def _row_type(model):
+    table = model.__table__
+    if table.name not in _row_types:
+        _row_types[table.name] = namedtuple(model.__name__ + 'Row', table.columns.keys())
+    return _row_types[table.name]
+
+def cached_all(model, limit=None):
+    """
+    Cached equivalent of Model.query.all() returning read-only row tuples
+    With `limit`, only the first `limit` rows by primary key
+    """
+    table = model.__table__
+
+    def load():
+        row_type = _row_type(model)
+        query = db.select(*table.columns).order_by(*table.primary_key)
+        if limit is not None:
+            query = query.limit(limit)
+        return tuple(row_type(*row) for row in read_rows(query))
+
+    return query_cache.get(table.name, 'all' if limit is None else ('first', limit), load)
+
+def cached_count(model):
+    """Cached row count of a model's table"""
+    table = model.__table__
+    return query_cache.get(table.name, 'count', lambda: read_rows(
+        db.select(db.func.count()).select_from(table))[0][0])
+
+@event.listens_for(db.session, 'after_flush')
+def _track_written_tables(session, flush_context):
+    tables = session.info.setdefault('written_tables', set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        table = getattr(obj, '__table__', None)
+        if table is not None:
+            tables.add(table.name)
+
+@event.listens_for(db.session, 'after_commit')
+def _invalidate_written_tables(session):
+    tables = session.info.pop('written_tables', None)
+    if tables:
+        query_cache.invalidate(*tables)
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_written_tables(session):
+    session.info.pop('written_tables', None)
+
 # Initialize database
 def init_db():
+    """
+    Create and seed the database if needed
+    A new instance starts from a copy of the seeded snapshot when there is one;
+    otherwise the database is seeded here and becomes the snapshot
+    """
+    snapshot = app.config['DATABASE_SNAPSHOT']
+    if not os.path.exists(DATABASE_PATH) and database.restore(snapshot, DATABASE_PATH):
+        print("Database restored from snapshot {}".format(snapshot))
+        return
+
     with app.app_context():
         db.create_all()
 
@@ -44,6 +206,78 @@ def init_db():
             db.session.commit()
             print("Database initialized with seed data")
 
+    if not os.path.exists(snapshot):
+        database.snapshot(DATABASE_PATH, snapshot)
+
+# Bulk seeding - hundreds of thousands of realistic rows for data-exfiltration
+# exercises, inserted with batched executemany in a single transaction
+SEED_FIRST_NAMES = ('james', 'mary', 'john', 'patricia', 'robert', 'jennifer', 'michael', 'linda',
+                    'david', 'elizabeth', 'william', 'susan', 'richard', 'jessica', 'joseph', 'sarah',
+                    'thomas', 'karen', 'chris', 'nancy', 'daniel', 'lisa', 'matthew', 'betty',
+                    'anthony', 'sandra', 'mark', 'ashley', 'steven', 'emily', 'paul', 'michelle')
+SEED_LAST_NAMES = ('smith', 'johnson', 'williams', 'brown', 'jones', 'garcia', 'miller', 'davis',
+                   'rodriguez', 'martinez', 'hernandez', 'lopez', 'gonzalez', 'wilson', 'anderson',
+                   'thomas', 'taylor', 'moore', 'jackson', 'martin', 'lee', 'perez', 'thompson',
+                   'white', 'harris', 'sanchez', 'clark', 'ramirez', 'lewis', 'robinson')
+SEED_EMAIL_DOMAINS = ('techcorp.local', 'techcorp.local', 'techcorp.local', 'contractors.techcorp.local',
+                      'gmail.com', 'outlook.com')
+SEED_ROLES = ('user',) * 80 + ('developer',) * 10 + ('support',) * 5 + ('auditor',) * 4 + ('admin',)
+SEED_SERVICE_AREAS = ('Cloud', 'Network', 'Application', 'Mobile', 'Wireless', 'Container', 'API',
+                      'Identity', 'Endpoint', 'OT/ICS', 'Email', 'Database')
+SEED_SERVICE_KINDS = ('Penetration Testing', 'Security Assessment', 'Hardening', 'Monitoring',
+                      'Incident Response', 'Threat Hunting', 'Compliance Review', 'Red Teaming')
+
+def _generate_users(count, first_id, rng):
+    for n in range(first_id, first_id + count):
+        username = '{}.{}{}'.format(rng.choice(SEED_FIRST_NAMES), rng.choice(SEED_LAST_NAMES), n)
+        yield {'username': username,
+               'email': '{}@{}'.format(username, rng.choice(SEED_EMAIL_DOMAINS)),
+               'role': rng.choice(SEED_ROLES)}
+
+def _generate_services(count, first_id, rng):
+    for n in range(first_id, first_id + count):
+        area, kind = rng.choice(SEED_SERVICE_AREAS), rng.choice(SEED_SERVICE_KINDS)
+        yield {'name': '{} {} #{}'.format(area, kind, n),
+               'description': '{} {} for {} environments, tier {}'.format(
+                   area, kind.lower(), rng.choice(('small', 'mid-size', 'enterprise')), rng.randint(1, 3))}
+
+def seed_bulk(users=0, services=0, batch_size=10000, seed=1337):
+    """Append generated users and services to the database in one transaction"""
+    init_db()
+    rng = random.Random(seed)
+    with app.app_context():
+        for model, generate, count in ((User, _generate_users, users),
+                                       (Service, _generate_services, services)):
+            table = model.__table__
+            first_id = (db.session.execute(db.select(db.func.max(table.c.id))).scalar() or 0) + 1
+            rows = generate(count, first_id, rng)
+            while True:
+                batch = list(itertools.islice(rows, batch_size))
+                if not batch:
+                    break
+                db.session.execute(table.insert(), batch)
+        db.session.commit()
+    # Core inserts skip the ORM flush events that invalidate the read cache
+    query_cache.invalidate(User.__table__.name, Service.__table__.name)
+
+@app.cli.command('seed')
+@click.option('--users', default=100000, show_default=True, help='users to add')
+@click.option('--services', default=1000, show_default=True, help='services to add')
+@click.option('--batch-size', default=10000, show_default=True)
+def seed_command(users, services, batch_size):
+    """Bulk-insert generated users and services (flask --app main-app/app.py seed)"""
+    start = time.perf_counter()
+    seed_bulk(users, services, batch_size)
+    print("Inserted {} users and {} services in {:.1f}s".format(
+        users, services, time.perf_counter() - start))
+
+@app.cli.command('snapshot')
+def snapshot_command():
+    """Make the current database the snapshot new instances start from"""
+    init_db()
+    print("Snapshot written to {}".format(
+        database.snapshot(DATABASE_PATH, app.config['DATABASE_SNAPSHOT'])))
+
 # Middleware - Add custom headers
 @app.after_request
 def add_security_headers(response):
@@ -52,15 +286,129 @@ def add_security_headers(response):
     response.headers['Server'] = 'nginx/1.24.0'
     return response
 
+# Static file cache
+# git-dumper style tools fetch .git/ objects aggressively and in parallel, so
+# small files are kept in memory instead of stat+open+read on every hit.
+# Responses carry the same headers as send_from_directory (ETag,
+# Last-Modified, no-cache) and still honour conditional and Range requests.
+CachedFile = namedtuple('CachedFile', 'data mtime size mimetype etag disposition')
+
+def _content_disposition(filename):
+    """Same inline Content-Disposition parameters as send_file"""
+    try:
+        filename.encode('ascii')
+        return {'filename': filename}
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize('NFKD', filename).encode('ascii', 'ignore').decode('ascii')
+        return {'filename': simple, 'filename*': "UTF-8''" + quote(filename, safe="!#$&+^`|~")}
+
+class FileCache:
+    """
+    LRU cache of file contents keyed by absolute path
+    Files are re-validated against their mtime at most every `recheck_interval` seconds
+    """
+
+    def __init__(self, max_bytes, max_file_size, recheck_interval=1.0):
+        self.max_bytes = max_bytes
+        self.max_file_size = max_file_size
+        self.recheck_interval = recheck_interval
+        self.total_bytes = 0
+        self._entries = OrderedDict()  # path -> (CachedFile, checked_at)
+        self._lock = threading.Lock()
+
+    def _load(self, path, st):
+        with open(path, 'rb') as f:
+            data = f.read()
+        mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        check = adler32(path.encode('utf-8')) & 0xFFFFFFFF
+        etag = '{}-{}-{}'.format(st.st_mtime, len(data), check)
+        disposition = _content_disposition(os.path.basename(path))
+        return CachedFile(data, st.st_mtime, len(data), mimetype, etag, disposition)
+
+    def _store(self, path, entry, now):
+        with self._lock:
+            old = self._entries.pop(path, None)
+            if old is not None:
+                self.total_bytes -= old[0].size
+            self._entries[path] = (entry, now)
+            self.total_bytes += entry.size
+            while self.total_bytes > self.max_bytes and self._entries:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self.total_bytes -= evicted.size
+
+    def invalidate(self, path=None):
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+                self.total_bytes = 0
+            else:
+                old = self._entries.pop(path, None)
+                if old is not None:
+                    self.total_bytes -= old[0].size
+
+    def get(self, path):
+        """Return the CachedFile for path, None if too large, or raise NotFound"""
+        now = time.monotonic()
+        cached = self._entries.get(path)
+        if cached is not None and now - cached[1] < self.recheck_interval:
+            return cached[0]
+
+        try:
+            st = os.stat(path)
+        except OSError:
+            self.invalidate(path)
+            raise NotFound()
+        if not stat.S_ISREG(st.st_mode):
+            self.invalidate(path)
+            raise NotFound()
+        if st.st_size > self.max_file_size:
+            self.invalidate(path)
+            return None
+
+        if cached is not None and cached[0].mtime == st.st_mtime and cached[0].size == st.st_size:
+            entry = cached[0]
+        else:
+            entry = self._load(path, st)
+        self._store(path, entry, now)
+        return entry
+
+    def send(self, directory, filename):
+        """Cached equivalent of send_from_directory(directory, filename)"""
+        path = safe_join(os.path.join(app.root_path, directory), filename)
+        if path is None:
+            raise NotFound()
+        entry = self.get(path)
+        if entry is None:
+            return send_from_directory(directory, filename)
+
+        response = Response(entry.data, mimetype=entry.mimetype)
+        response.headers.set('Content-Disposition', 'inline', **entry.disposition)
+        response.last_modified = entry.mtime
+        response.cache_control.no_cache = True
+        response.set_etag(entry.etag)
+        return response.make_conditional(request.environ, accept_ranges=True,
+                                          complete_length=entry.size)
+
+file_cache = FileCache(app.config['FILE_CACHE_MAX_BYTES'],
+                       app.config['FILE_CACHE_MAX_FILE_SIZE'])
+
+def refresh_content(paths):
+    """Re-render the cached 404 page after template edits (see labkit/watch.py)"""
+    if _not_found_page is not None and any(
+            os.path.basename(path) in NOT_FOUND_TEMPLATES for path in paths):
+        render_not_found_page()
+
+watch.on_change(app, refresh_content)
+
 # Main Routes
 @app.route('/')
 def index():
-    services = Service.query.all()
+    services = cached_all(Service, limit=app.config['PAGE_MAX_ROWS'])
     return render_template('index.html', services=services)
 
 @app.route('/about')
 def about():
-    users = User.query.all()
+    users = cached_all(User, limit=app.config['PAGE_MAX_ROWS'])
     return render_template('about.html', users=users)
 
 @app.route('/contact')
@@ -69,41 +417,42 @@ def contact():
 
 @app.route('/services')
 def services():
-    services = Service.query.all()
+    services = cached_all(Service, limit=app.config['PAGE_MAX_ROWS'])
     return render_template('services.html', services=services)
 
 # Public files - FLAG 1
 @app.route('/robots.txt')
 def robots():
-    return send_from_directory('public', 'robots.txt')
+    return file_cache.send('public', 'robots.txt')
 
 @app.route('/sitemap.xml')
 def sitemap():
-    return send_from_directory('public', 'sitemap.xml')
+    return file_cache.send('public', 'sitemap.xml')
 
 @app.route('/humans.txt')
 def humans():
-    return send_from_directory('public', 'humans.txt')
+    return file_cache.send('public', 'humans.txt')
 
 # Vulnerable endpoints - FLAG 2 (Backup files)
 @app.route('/backup/<path:filename>')
 def backup_files(filename):
     """Intentionally vulnerable - serves backup files"""
-    return send_from_directory('backup', filename)
+    return file_cache.send('backup', filename)
 
 # Vulnerable endpoints - FLAG 3 (Exposed .git)
 @app.route('/.git/<path:filename>')
 def git_files(filename):
     """Intentionally vulnerable - serves .git files"""
     try:
-        return send_from_directory('.git', filename)
+        return file_cache.send('.git', filename)
     except:
         return "File not found", 404
 
 # API v1 - Documented
 @app.route('/api/v1/info')
+@static_json(app)
 def api_v1_info():
-    return jsonify({
+    return {
         'version': '1.0',
         'name': 'TechCorp API',
         'endpoints': [
@@ -111,36 +460,107 @@ def api_v1_info():
             '/api/v1/status'
         ],
         'documentation': '/api/v1/docs'
-    })
+    }
 
 @app.route('/api/v1/status')
+@static_json(app)
 def api_v1_status():
-    return jsonify({
+    return {
         'status': 'operational',
         'uptime': '99.9%',
         'services': ['web', 'api', 'database'],
         'version': '2.1.4'
-    })
+    }
 
 # API v2 - Undocumented - FLAG 4
+API_USERS_FIELDS = {
+    'flag': 'FLAG{api_v2_discovered_1e9f}',
+    'message': 'Congratulations! You found the undocumented API endpoint.',
+    'hint': 'Try enumerating subdomains: dev, staging, admin'
+}
+API_USERS_CHUNK = 1000  # rows per keyset query while streaming
+
+def _user_dict(u):
+    return {'id': u.id, 'username': u.username, 'email': u.email, 'role': u.role}
+
+def _user_chunks(after=0, limit=None):
+    """
+    Users with id > after in id order, as lists of rows
+    Keyset pagination: every chunk is an indexed `id > last_id` range scan
+    """
+    table = User.__table__
+    while limit is None or limit > 0:
+        size = API_USERS_CHUNK if limit is None else min(API_USERS_CHUNK, limit)
+        rows = read_rows(
+            db.select(*table.columns).where(table.c.id > after).order_by(table.c.id).limit(size))
+        if rows:
+            yield rows
+        if len(rows) < size:
+            return
+        after = rows[-1].id
+        if limit is not None:
+            limit -= len(rows)
+
+def _dumps(obj):
+    """Same encoding as jsonify() outside debug mode"""
+    return app.json.dumps(obj, separators=(',', ':'))
+
+def _stream_users_document():
+    """The full jsonify() document, produced chunk by chunk"""
+    dumps = _dumps
+    # Sorted keys put "users" last, so the rows go between this prefix and "]}"
+    yield dumps(dict(API_USERS_FIELDS, users=[]))[:-2]
+    separator = ''
+    for rows in _user_chunks():
+        yield separator + ','.join(dumps(_user_dict(u)) for u in rows)
+        separator = ','
+    yield ']}\n'
+
+def _stream_users_ndjson(after, limit):
+    dumps = _dumps
+    for rows in _user_chunks(after, limit):
+        yield ''.join(dumps(_user_dict(u)) + '\n' for u in rows)
+
 @app.route('/api/v2/admin/users')
 def api_v2_admin_users():
-    """Intentionally undocumented endpoint - FLAG 4"""
-    users = User.query.all()
-    return jsonify({
-        'flag': 'FLAG{api_v2_discovered_1e9f}',
-        'message': 'Congratulations! You found the undocumented API endpoint.',
-        'users': [
-            {'id': u.id, 'username': u.username, 'email': u.email, 'role': u.role}
-            for u in users
-        ],
-        'hint': 'Try enumerating subdomains: dev, staging, admin'
-    })
+    """
+    Intentionally undocumented endpoint - FLAG 4
+    ?after=<id>&limit=<n> returns one page (keyset pagination, see `next`),
+    ?format=ndjson streams one user per line
+    """
+    max_limit = app.config['API_USERS_MAX_LIMIT']
+    try:
+        after = int(request.args.get('after', 0))
+        limit = request.args.get('limit')
+        limit = int(limit) if limit is not None else None
+    except ValueError:
+        return jsonify({'error': 'after and limit must be integers'}), 400
+    if after < 0 or (limit is not None and not 1 <= limit <= max_limit):
+        return jsonify({'error': 'after must be >= 0, limit between 1 and {}'.format(max_limit)}), 400
+
+    if request.args.get('format') == 'ndjson':
+        return Response(stream_with_context(_stream_users_ndjson(after, limit)),
+                        mimetype='application/x-ndjson')
+
+    if limit is not None or 'after' in request.args:
+        limit = limit or max_limit
+        users = [_user_dict(u) for rows in _user_chunks(after, limit) for u in rows]
+        next_page = None
+        if len(users) == limit:
+            next_page = url_for('api_v2_admin_users', after=users[-1]['id'], limit=limit)
+        return jsonify(dict(API_USERS_FIELDS, users=users, next=next_page))
+
+    if cached_count(User) <= app.config['API_USERS_INLINE_MAX']:
+        users = cached_all(User)
+        return jsonify(dict(API_USERS_FIELDS, users=[_user_dict(u) for u in users]))
+    # Big tables: same document, streamed so memory stays flat
+    return Response(stream_with_context(_stream_users_document()), mimetype='application/json')
 
 @app.route('/api/v2/config')
+@static_json(app, status=403)  # Forbidden but still reveals info
 def api_v2_config():
     """Another hidden endpoint that reveals environment info"""
-    return jsonify({
+    return {
         'environments': {
             'production': 'techcorp.local',
             'development': 'dev.techcorp.local',
@@ -149,7 +569,7 @@ def api_v2_config():
         },
         'database': 'sqlite:///database.db',
         'secret_key': 'REDACTED'
-    }), 403  # Forbidden but still reveals info
+    }
 
 # Protected routes (return 401/403)
 @app.route('/admin/')
@@ -160,14 +580,97 @@ def admin_route():
 def secret_route():
     return "Forbidden - Access denied", 403
 
+# Pre-rendered 404 page
+# Almost all traffic during a class is gobuster/ffuf misses, so the 404 page is
+# rendered once and served as ready-made bytes. The body and status must stay
+# identical to a regular render because fuzzers filter on size and status.
+# Edits to the templates re-render it through refresh_content(); without the
+# watcher (LAB_WATCH=0) a template mtime check, at most once per
+# NOT_FOUND_RECHECK_INTERVAL, still picks them up.
+# No ETag: preconditions do not apply to a 404, so it could never earn a 304.
+NOT_FOUND_TEMPLATES = ('404.html', 'base.html')
+NOT_FOUND_RECHECK_INTERVAL = 1.0
+
+_not_found_lock = threading.Lock()
+_not_found_page = None    # (body, template mtimes)
+_not_found_checked = 0.0
+
+def _not_found_mtimes():
+    folder = os.path.join(app.root_path, app.template_folder)
+    mtimes = []
+    for name in NOT_FOUND_TEMPLATES:
+        try:
+            mtimes.append(os.stat(os.path.join(folder, name)).st_mtime_ns)
+        except OSError:
+            mtimes.append(None)
+    return tuple(mtimes)
+
+def render_not_found_page():
+    """
+    Render 404.html into bytes
+    Called at startup and again whenever one of the templates changes
+    """
+    global _not_found_page, _not_found_checked
+    with _not_found_lock:
+        mtimes = _not_found_mtimes()
+        with app.test_request_context():
+            body = render_template('404.html').encode('utf-8')
+        _not_found_page = (body, mtimes)
+        _not_found_checked = time.monotonic()
+    return _not_found_page
+
+def get_not_found_page():
+    """Return the cached body, re-rendered if a template changed on disk"""
+    global _not_found_checked
+    page = _not_found_page
+    if page is None:
+        return render_not_found_page()[0]
+    now = time.monotonic()
+    if now - _not_found_checked >= NOT_FOUND_RECHECK_INTERVAL:
+        _not_found_checked = now
+        if _not_found_mtimes() != page[1]:
+            # Jinja does not re-check compiled templates outside debug mode
+            app.jinja_env.cache.clear()
+            page = render_not_found_page()
+    return page[0]
+
 # Error handlers
 @app.errorhandler(404)
 def not_found(e):
-    return render_template('404.html'), 404
+    if not app.config['NOT_FOUND_CACHE']:
+        return render_template('404.html'), 404
+    return Response(get_not_found_page(), 404, mimetype='text/html')
+
+def warm_up():
+    """Prepare the database and caches before serving (see labkit.server)"""
+    init_db()
+    startup.mark('main-app', 'db')
+    render_not_found_page()
+    with app.app_context():
+        # Workers are forked after this, they must not share SQLite connections
+        db.engine.dispose()
+    read_engine.dispose()
+
+def isolate(directory):
+    """
+    Serve a lab-farm instance (labkit.farm) from its own copy of the seeded
+    database in `directory`; runs in the forked instance before it serves
+    """
+    global DATABASE_PATH
+    path = os.path.join(directory, 'database.db')
+    if not database.restore(app.config['DATABASE_SNAPSHOT'], path):
+        database.snapshot(DATABASE_PATH, path)
+    database.relocate(DATABASE_PATH, path)
+    DATABASE_PATH = path
+    query_cache.invalidate()
+
+startup.mark('main-app', 'app')
 
 if __name__ == '__main__':
-    # Initialize database on first run
-    if not os.path.exists('database.db'):
-        init_db()
+    # Initialize database on first run (restored from the snapshot if there is one)
+    init_db()
+    startup.mark('main-app', 'db')
 
+    render_not_found_page()
+    startup.warm_up(app, 'main-app')
     app.run(host='127.0.0.1', port=5000, debug=False)
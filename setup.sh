@@ -123,6 +123,8 @@ echo "    sudo cp nginx.conf /etc/nginx/sites-available/techcorp-lab"
 echo "    sudo ln -s /etc/nginx/sites-available/techcorp-lab /etc/nginx/sites-enabled/"
 echo "    sudo nginx -t"
 echo "    sudo systemctl reload nginx"
+echo "  start_all_services.sh then trusts the client addresses nginx forwards"
+echo "  (X-Real-IP); set LAB_TRUST_PROXY=1 if nginx is configured elsewhere"
 echo ""
 echo "Happy hacking! 🚩"
 echo ""
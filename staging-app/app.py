@@ -1,7 +1,18 @@
-from flask import Flask, render_template, jsonify
+from flask import Flask, render_template
+import os
 import platform
 import sys
 
+# Shared lab tooling (labkit/) lives one directory up
+LAB_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if LAB_ROOT not in sys.path:
+    sys.path.insert(0, LAB_ROOT)
+
+from labkit import compress, metrics, profiler, requestlog, scoreboard, startup, watch
+from labkit.prebuilt import PrebuiltResponse, static_json
+
+startup.mark('staging-app', 'imports')
+
 app = Flask(__name__)
 
 # Staging configuration
@@ -9,6 +20,14 @@ app.config['ENV'] = 'staging'
 app.config['DEBUG'] = False
 app.config['SECRET_KEY'] = 'staging-secret-key-2024'
 
+metrics.init_app(app, 'staging-app')
+requestlog.init_app(app, 'staging-app')
+startup.init_app(app)
+compress.init_app(app)
+scoreboard.init_app(app, 'staging-app')
+watch.init_app(app, 'staging-app')
+profiler.init_app(app, 'staging-app')
+
 # FLAG 6 - Staging Environment
 FLAG = 'FLAG{staging_env_exposed_8g3b}'
 
@@ -23,6 +42,10 @@ def phpinfo():
     Simulated phpinfo page - FLAG 6
     This mimics a common misconfiguration where phpinfo() is left accessible
     """
+    return PHPINFO_PAGE.response()
+
+def render_phpinfo():
+    """Build the phpinfo() HTML (called once at startup)"""
     php_info = {
         'version': '8.2.0-dev',
         'system': platform.system() + ' ' + platform.release(),
@@ -133,9 +156,13 @@ def phpinfo():
     return html
 
 @app.route('/info')
+@static_json(app)
 def info():
     """Additional staging environment information"""
-    return jsonify({
+    return info_payload()
+
+def info_payload():
+    return {
         'environment': 'staging',
         'version': '2.1.4-staging',
         'flag': FLAG,
@@ -163,11 +190,14 @@ def info():
             'Try the admin portal: admin.techcorp.local',
             'Admin authentication might be weak'
         ]
-    })
+    }
 
 @app.route('/test.php')
 def test():
     """Another test page often left behind"""
+    return TEST_PAGE.response()
+
+def render_test_page():
     return '''
     <html>
     <head><title>Staging Test Page</title></head>
@@ -183,6 +213,10 @@ def test():
     </html>
     '''
 
+# Build the constant pages once at startup
+PHPINFO_PAGE = PrebuiltResponse(render_phpinfo(), 'text/html')
+TEST_PAGE = PrebuiltResponse(render_test_page(), 'text/html')
+
 # Add staging-specific headers
 @app.after_request
 def add_staging_headers(response):
@@ -192,6 +226,8 @@ def add_staging_headers(response):
     response.headers['X-Debug-Info'] = 'enabled'
     return response
 
+startup.mark('staging-app', 'app')
+
 if __name__ == '__main__':
     print("=" * 60)
     print("TechCorp Staging Environment")
@@ -207,4 +243,5 @@ if __name__ == '__main__':
     print("Access: http://staging.techcorp.local:8082")
     print("=" * 60)
 
+    startup.warm_up(app, 'staging-app')
     app.run(host='127.0.0.1', port=5002, debug=False)
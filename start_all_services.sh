@@ -9,6 +9,7 @@ set -e  # Exit on error
 GREEN='\033[0;32m'
 YELLOW='\033[1;33m'
 CYAN='\033[0;36m'
+RED='\033[0;31m'
 NC='\033[0m' # No Color
 
 echo "=========================================="
@@ -25,49 +26,28 @@ fi
 # Create logs directory if it doesn't exist
 mkdir -p logs
 
-# Function to start a service
-start_service() {
-    local service_name=$1
-    local service_dir=$2
-    local port=$3
-    local log_file="logs/${service_name}.log"
-    local pid_file="logs/${service_name}.pid"
+# Worker pool settings (override from the environment)
+LAB_WORKERS=${LAB_WORKERS:-4}
+LAB_THREADS=${LAB_THREADS:-8}
+LAB_MAX_REQUESTS=${LAB_MAX_REQUESTS:-10000}
 
-    echo -e "${YELLOW}[${4}/4]${NC} Starting ${service_name} (port ${port})..."
-
-    # Check if already running
-    if [ -f "$pid_file" ]; then
-        local old_pid=$(cat "$pid_file")
-        if ps -p $old_pid > /dev/null 2>&1; then
-            echo -e "${GREEN}   ℹ${NC}  ${service_name} already running (PID: ${old_pid})"
-            return
-        else
-            rm "$pid_file"
-        fi
-    fi
-
-    # Start the service
-    cd "$service_dir"
-    ../.venv/bin/python3 app.py > "../${log_file}" 2>&1 &
-    local pid=$!
-    echo $pid > "../${pid_file}"
-    cd ..
-
-    # Wait a moment and check if it's running
-    sleep 1
-    if ps -p $pid > /dev/null 2>&1; then
-        echo -e "${GREEN}   ✓${NC} ${service_name} started (PID: ${pid})"
-    else
-        echo -e "${RED}   ✗${NC} Failed to start ${service_name}"
-        echo "   Check logs: ${log_file}"
-    fi
-}
+# Behind the nginx proxy (nginx.conf installed as in setup.sh) every request
+# comes from 127.0.0.1: trust the X-Real-IP it sets, so per-client rate
+# limits, request logs and the scoreboard see the students' addresses.
+# LAB_TRUST_PROXY=0 opts out, LAB_TRUST_PROXY=1 forces it on.
+if [ -z "${LAB_TRUST_PROXY:-}" ] && [ -e /etc/nginx/sites-enabled/techcorp-lab ]; then
+    LAB_TRUST_PROXY=1
+fi
+export LAB_TRUST_PROXY=${LAB_TRUST_PROXY:-0}
 
-# Start all services
-start_service "main-app" "main-app" "5000" "1"
-start_service "dev-app" "dev-app" "5001" "2"
-start_service "staging-app" "staging-app" "5002" "3"
-start_service "admin-app" "admin-app" "5003" "4"
+# Start every app at once and wait until each answers its health check
+# (labkit/supervisor.py keeps them running and restarts crashed apps)
+if ! .venv/bin/python3 -m labkit.supervisor start \
+        --workers "$LAB_WORKERS" --threads "$LAB_THREADS" \
+        --max-requests "$LAB_MAX_REQUESTS"; then
+    echo -e "${RED}✗${NC} Not every service started, check logs: ./logs/"
+    exit 1
+fi
 
 echo ""
 echo "=========================================="